@@ -0,0 +1,98 @@
+"""
+Database profiles selected by environment.
+
+SQLite remains the default for small deployments and is tuned for
+concurrent access with the pragmas in ``SQLITE_PRAGMAS``, applied to every
+new connection. Setting ``DB_ENGINE`` to ``postgresql`` switches to
+PostgreSQL with persistent, health-checked connections;
+``DB_POOLER=pgbouncer`` adapts the profile to a transaction-pooling proxy
+in front of the database.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+import os
+
+POSTGRES_ENGINES = ('postgres', 'postgresql')
+
+
+def _flag(environ, name: str, default: str) -> bool:
+    return environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+def database_config(base_dir, environ=None) -> dict:
+    """Build the ``default`` database settings from environment variables."""
+    environ = os.environ if environ is None else environ
+    engine = environ.get('DB_ENGINE', 'sqlite').lower()
+
+    if engine in POSTGRES_ENGINES:
+        return _postgres_config(environ)
+    if engine not in ('sqlite', 'sqlite3'):
+        raise ImproperlyConfigured(f"Unsupported DB_ENGINE '{engine}'")
+
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': environ.get('DB_NAME') or base_dir / 'db.sqlite3',
+    }
+
+
+def sqlite_pragmas(environ=None) -> dict:
+    """
+    Pragmas for new SQLite connections; empty when ``DB_SQLITE_TUNING`` is off.
+
+    WAL lets readers (the django_q ORM broker polling, page views) run
+    alongside a writer, and the busy timeout makes writers queue for the
+    lock instead of failing with "database is locked".
+    """
+    environ = os.environ if environ is None else environ
+    if not _flag(environ, 'DB_SQLITE_TUNING', 'true'):
+        return {}
+    return {
+        'journal_mode': 'WAL',
+        # Durable across application crashes; only an OS crash can lose
+        # the most recent commits in WAL mode.
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(environ.get('DB_SQLITE_BUSY_TIMEOUT', '5000')),  # Milliseconds
+        'mmap_size': int(environ.get('DB_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'cache_size': -int(environ.get('DB_SQLITE_CACHE_KB', '65536')),  # Negative means KiB
+        'temp_store': 'MEMORY',
+    }
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """``connection_created`` receiver applying ``settings.SQLITE_PRAGMAS``."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def _postgres_config(environ) -> dict:
+    pooler = environ.get('DB_POOLER', '').lower()
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': environ.get('DB_NAME', 'anything'),
+        'USER': environ.get('DB_USER', 'anything'),
+        'PASSWORD': environ.get('DB_PASSWORD', ''),
+        'HOST': environ.get('DB_HOST', 'localhost'),
+        'PORT': environ.get('DB_PORT', '5432'),
+        # Reuse connections across requests and django_q tasks instead of
+        # reconnecting every time; stale ones are checked before reuse.
+        'CONN_MAX_AGE': int(environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': _flag(environ, 'DB_CONN_HEALTH_CHECKS', 'true'),
+        'OPTIONS': {
+            'connect_timeout': int(environ.get('DB_CONNECT_TIMEOUT', '5')),
+            'application_name': environ.get('DB_APPLICATION_NAME', 'anything'),
+        },
+    }
+    if environ.get('DB_SSLMODE'):
+        config['OPTIONS']['sslmode'] = environ['DB_SSLMODE']
+
+    if pooler == 'pgbouncer':
+        # Transaction pooling hands each transaction a different server
+        # connection, which breaks server-side cursors.
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+    elif pooler:
+        raise ImproperlyConfigured(f"Unsupported DB_POOLER '{pooler}'")
+
+    return config
@@ -13,6 +13,12 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 import anthropic
+from .database import database_config, sqlite_pragmas
+
+try:
+    import whitenoise
+except ImportError:
+    whitenoise = None
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -54,6 +60,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Compression must wrap everything that produces response bodies;
+    # brotli runs first on the way out and gzip skips what it encoded
+    'django.middleware.gzip.GZipMiddleware',
+    'anything.middleware.BrotliMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,6 +74,10 @@ MIDDLEWARE = [
     'allauth.account.middleware.AccountMiddleware',
 ]
 
+if whitenoise:
+    # Serve collected static files with their precompressed variants
+    MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+
 ROOT_URLCONF = 'anything.urls'
 
 TEMPLATES = [
@@ -88,13 +102,15 @@ WSGI_APPLICATION = 'anything.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite by default; set DB_ENGINE=postgresql plus DB_NAME, DB_USER,
+# DB_PASSWORD, DB_HOST and DB_PORT for production (see anything/database.py).
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR)
 }
 
+# Applied to every new SQLite connection; DB_SQLITE_TUNING=false disables them
+SQLITE_PRAGMAS = sqlite_pragmas()
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,6 +152,13 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+if whitenoise:
+    # collectstatic writes .gz (and .br with brotli installed) next to each file
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage'},
+    }
+
 # Media files (User uploaded files)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -147,7 +170,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Django Q Configuration
 Q_CLUSTER = {
-    'name': 'anything_app',
+    'name': os.getenv('Q_CLUSTER_NAME', 'anything_app'),
     'workers': 4,
     'recycle': 500,
     'timeout': 600,
@@ -157,7 +180,56 @@ Q_CLUSTER = {
     'queue_limit': 500,
     'cpu_affinity': 1,
     'label': 'Django Q',
-    'orm': 'default'  # Use Django ORM with the default database
+}
+
+# Cache backend: 'locmem' (default, per process), 'file' or 'redis'.
+# CACHE_LOCATION overrides the directory (file) or URL (redis, defaults to REDIS_URL).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'anything'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', os.getenv('REDIS_URL', 'redis://localhost:6379/1')),
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv('CACHE_LOCATION') or CACHE_BACKENDS[CACHE_BACKEND][1],
+        'KEY_PREFIX': 'anything',
+        'TIMEOUT': 300,
+    }
+}
+
+# Timeouts in seconds per kind of cached entry (see utils/cache.py)
+CACHE_TTLS = {
+    'page': 300,
+    'data_store_list': 60,
+    'memberships': 60,
+    'status': 5,
+}
+
+# Task broker: 'orm' (polls the default database), 'redis' (REDIS_URL) or
+# 'local' (in-process stand-in for tests and benchmarks, see utils/brokers.py)
+Q_BROKER = os.getenv('Q_BROKER', 'orm')
+if Q_BROKER == 'redis':
+    Q_CLUSTER['redis'] = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+elif Q_BROKER == 'local':
+    Q_CLUSTER['broker_class'] = 'utils.brokers.LocalBroker'
+else:
+    Q_CLUSTER['orm'] = 'default'
+
+# Generation scheduling (see utils/scheduler.py)
+# Jobs are only handed to django_q while slots are free, so priorities and
+# per-organization caps are enforced before the FIFO broker queue.
+GENERATION_SCHEDULER = {
+    'max_running': Q_CLUSTER['workers'],
+    'org_max_running': int(os.getenv('GENERATION_ORG_MAX_RUNNING', '2')),
+    'priorities': {'UPDATE': 0, 'GENERATE': 10},  # Lower runs first
+    # Optional dedicated broker queues; run an extra cluster with
+    # Q_CLUSTER_NAME set to the queue name to consume one.
+    'queues': {
+        'GENERATE': os.getenv('GENERATION_QUEUE') or None,
+        'UPDATE': os.getenv('UPDATE_QUEUE') or None,
+    },
 }
 
 # Rest Framework Settings
@@ -173,6 +245,57 @@ REST_FRAMEWORK = {
 # Anthropic API Configuration
 ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY', '')
 
+# LLM Backend Configuration
+# 'anthropic' calls the live API, 'replay' serves recorded responses from
+# LLM_REPLAY_PATH (for offline tests and load tests).
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'anthropic')
+LLM_FAST_MODEL = os.getenv('LLM_FAST_MODEL', 'claude-3-haiku-20240307')
+LLM_MODELS = {
+    'default': os.getenv('LLM_DEFAULT_MODEL', 'claude-3-sonnet-20240229'),
+    # Short structured steps go to the faster, cheaper model
+    'name_description': LLM_FAST_MODEL,
+    'data_tables': LLM_FAST_MODEL,
+    'page_list': LLM_FAST_MODEL,
+    'app_skeleton': LLM_FAST_MODEL,
+    'update_plan': LLM_FAST_MODEL,
+}
+# Ask for name, description, tables and pages in one call instead of three;
+# generation falls back to the separate steps if the fused one fails
+LLM_FUSED_SKELETON = os.getenv('LLM_FUSED_SKELETON', 'true').lower() == 'true'
+# 'eager' generates every page before an app is usable. 'background' and
+# 'on_visit' generate only the landing page up front and store the others
+# as stubs, generated right after the app or when first opened
+PAGE_GENERATION = os.getenv('PAGE_GENERATION', 'eager')
+LLM_REPLAY_PATH = os.getenv('LLM_REPLAY_PATH', '')
+LLM_REPLAY_LATENCY = float(os.getenv('LLM_REPLAY_LATENCY', '0'))  # Seconds per replayed call
+
+# Batch generation (see utils/batches.py): 'anthropic' submits each stage to
+# the Message Batches API, 'local' answers in process from LLM_REPLAY_PATH
+LLM_BATCH = {
+    'backend': os.getenv('LLM_BATCH_BACKEND', 'anthropic'),
+    'base_url': os.getenv('ANTHROPIC_BASE_URL', 'https://api.anthropic.com'),
+    'poll_interval': int(os.getenv('LLM_BATCH_POLL_INTERVAL', '60')),  # Seconds between status checks
+}
+
+# Near-duplicate prompts (see utils/similarity.py): before generating, users
+# are offered a copy of an app whose prompt is at least `threshold` similar,
+# from their organization or the gallery organization. Off by default: run
+# `manage.py index_prompts` before turning it on
+PROMPT_MATCHING = {
+    'enabled': os.getenv('PROMPT_MATCHING_ENABLED', 'false').lower() == 'true',
+    'threshold': float(os.getenv('PROMPT_MATCHING_THRESHOLD', '0.5')),
+    'gallery_organization': int(os.getenv('GALLERY_ORGANIZATION_ID')) if os.getenv('GALLERY_ORGANIZATION_ID') else None,
+}
+
+# Cluster-wide LLM rate limit shared by all django_q workers
+LLM_RATE_LIMIT = {
+    'enabled': os.getenv('LLM_RATE_LIMIT_ENABLED', 'true').lower() == 'true',
+    'requests_per_minute': int(os.getenv('LLM_REQUESTS_PER_MINUTE', '50')),
+    'tokens_per_minute': int(os.getenv('LLM_TOKENS_PER_MINUTE', '80000')),
+    'max_wait': 300,  # Seconds a call may wait for capacity; must stay below Q_CLUSTER timeout
+    'fair_share': True,  # Split capacity evenly between active organizations
+}
+
 # Authentication settings
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
@@ -17,12 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
-from django.contrib.auth.decorators import login_required
+from anything_apps.views import dashboard
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', TemplateView.as_view(template_name='landing.html'), name='landing'),
-    path('dashboard/', login_required(TemplateView.as_view(template_name='dashboard/index.html')), name='dashboard'),
+    path('dashboard/', dashboard, name='dashboard'),
     path('organizations/', include('anything_org.urls')),
     path('apps/', include('anything_apps.urls')),
     path('accounts/', include('allauth.urls')),
@@ -1,97 +1,128 @@
 from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import App, DataStore
+from anything_org.access import app_member_required
+from django.db.models import Count, Max
+from utils.cache import app_namespace, get_or_set
+from utils.http import make_etag
+from utils.rollups import record_data_write
+from .models import DataStore
+from urllib.parse import urlencode
 import json
 import math
 
+def _data_store_version(request, app) -> tuple:
+    """
+    Latest ``updated_at`` and row count of the app's data, looked up once per
+    request. Read from the database so writes made by other processes count
+    too, which a per-process cache namespace version would miss.
+    """
+    if not hasattr(request, '_data_store_version'):
+        version = app.data_store.aggregate(latest=Max('updated_at'), count=Count('id'))
+        request._data_store_version = (version['latest'], version['count'])
+    return request._data_store_version
+
+def _data_store_list_etag(request, app):
+    return make_etag(app.id, *_data_store_version(request, app), urlencode(sorted(request.GET.items())))
+
+def _data_store_item_updated_at(request, app, item_id):
+    """The item's updated_at, looked up once per request; None if missing."""
+    if not hasattr(request, '_data_store_item_updated_at'):
+        request._data_store_item_updated_at = (
+            app.data_store.filter(id=item_id).values_list('updated_at', flat=True).first()
+        )
+    return request._data_store_item_updated_at
+
+def _data_store_detail_etag(request, app, item_id):
+    updated_at = _data_store_item_updated_at(request, app, item_id)
+    return make_etag(item_id, updated_at) if updated_at else None
+
 @login_required
 @require_http_methods(["GET"])
-def data_store_list(request, app_id):
+@app_member_required(api=True)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_data_store_list_etag)
+def data_store_list(request, app):
     """API endpoint to list and filter DataStore items."""
     try:
-        app = App.objects.get(id=app_id)
-        
-        # Check if user has access to the app
-        if not app.organization.organizationmember_set.filter(user=request.user).exists():
-            return JsonResponse({'error': 'Permission denied'}, status=403)
-        
-        # Get query parameters
-        page = int(request.GET.get('page', 1))
-        per_page = int(request.GET.get('per_page', 10))
-        sort_column = request.GET.get('sort_column', 'id')
-        sort_direction = request.GET.get('sort_direction', 'asc')
-        filter_value = request.GET.get('filter', '')
-        search_query = request.GET.get('search', '')
-        table_name = request.GET.get('table_name', '')
-        
-        # Start with all items for this app
-        query = app.data_store.all()
-        
-        # Filter by table_name if provided
-        if table_name:
-            query = query.filter(table_name=table_name)
-        
-        # Apply search if provided
-        if search_query:
-            query = query.filter(
-                Q(table_name__icontains=search_query) |
-                Q(key__icontains=search_query) |
-                Q(value__icontains=search_query)
-            )
-        
-        # Apply filters if provided
-        if filter_value:
-            query = query.filter(value_type=filter_value)
-        
-        # Get total count before pagination
-        total_count = query.count()
-        
-        # Apply sorting
-        sort_prefix = "-" if sort_direction == "desc" else ""
-        query = query.order_by(f"{sort_prefix}{sort_column}")
-        
-        # Apply pagination
-        paginator = Paginator(query, per_page)
-        items = paginator.get_page(page)
-        
-        # Format results
-        return JsonResponse({
-            "items": [
-                {
-                    "id": item.id,
-                    "table_name": item.table_name,
-                    "key": item.key,
-                    "value": item.get_typed_value(),
-                    "value_type": item.value_type,
-                    "updated_at": item.updated_at.isoformat()
-                }
-                for item in items
-            ],
-            "total": total_count,
-            "page": page,
-            "per_page": per_page,
-            "total_pages": math.ceil(total_count / per_page)
-        })
+        # Identical list requests are served from cache until the app's data changes
+        latest, count = _data_store_version(request, app)
+        payload = get_or_set(
+            app_namespace(app.id), 'data_store_list', latest.isoformat() if latest else '', count,
+            urlencode(sorted(request.GET.items())),
+            producer=lambda: _data_store_page(app, request.GET)
+        )
+        return JsonResponse(payload)
         
-    except App.DoesNotExist:
-        return JsonResponse({'error': 'App not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def _data_store_page(app, params) -> dict:
+    """Filter, sort and paginate an app's DataStore items for the list API."""
+    # Get query parameters
+    page = int(params.get('page', 1))
+    per_page = int(params.get('per_page', 10))
+    sort_column = params.get('sort_column', 'id')
+    sort_direction = params.get('sort_direction', 'asc')
+    filter_value = params.get('filter', '')
+    search_query = params.get('search', '')
+    table_name = params.get('table_name', '')
+    
+    # Start with all items for this app
+    query = app.data_store.all()
+    
+    # Filter by table_name if provided
+    if table_name:
+        query = query.filter(table_name=table_name)
+    
+    # Apply search if provided
+    if search_query:
+        query = query.search(search_query)
+    
+    # Apply filters if provided
+    if filter_value:
+        query = query.filter(value_type=filter_value)
+    
+    # Apply sorting
+    sort_prefix = "-" if sort_direction == "desc" else ""
+    query = query.order_by(f"{sort_prefix}{sort_column}")
+    
+    # Fetch the page together with the total count
+    page = max(page, 1)
+    items, total_count = query.page_with_total((page - 1) * per_page, per_page)
+    if not items and total_count:
+        # Out-of-range pages show the last page
+        page = math.ceil(total_count / per_page)
+        items, total_count = query.page_with_total((page - 1) * per_page, per_page)
+    
+    # Format results
+    return {
+        "items": [
+            {
+                "id": item.id,
+                "table_name": item.table_name,
+                "key": item.key,
+                "value": item.get_typed_value(),
+                "value_type": item.value_type,
+                "updated_at": item.updated_at.isoformat()
+            }
+            for item in items
+        ],
+        "total": total_count,
+        "page": page,
+        "per_page": per_page,
+        "total_pages": math.ceil(total_count / per_page)
+    }
+
 @login_required
 @require_http_methods(["GET"])
-def data_store_detail(request, app_id, item_id):
+@app_member_required(api=True)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_data_store_detail_etag, last_modified_func=_data_store_item_updated_at)
+def data_store_detail(request, app, item_id):
     """API endpoint to get a single DataStore item."""
     try:
-        app = App.objects.get(id=app_id)
-        
-        # Check if user has access to the app
-        if not app.organization.organizationmember_set.filter(user=request.user).exists():
-            return JsonResponse({'error': 'Permission denied'}, status=403)
-        
         item = app.data_store.get(id=item_id)
         
         return JsonResponse({
@@ -103,8 +134,6 @@ def data_store_detail(request, app_id, item_id):
             "updated_at": item.updated_at.isoformat()
         })
         
-    except App.DoesNotExist:
-        return JsonResponse({'error': 'App not found'}, status=404)
     except DataStore.DoesNotExist:
         return JsonResponse({'error': 'Item not found'}, status=404)
     except Exception as e:
@@ -112,15 +141,10 @@ def data_store_detail(request, app_id, item_id):
 
 @login_required
 @require_http_methods(["POST"])
-def data_store_create(request, app_id):
+@app_member_required(api=True)
+def data_store_create(request, app):
     """API endpoint to create a new DataStore item."""
     try:
-        app = App.objects.get(id=app_id)
-        
-        # Check if user has access to the app
-        if not app.organization.organizationmember_set.filter(user=request.user).exists():
-            return JsonResponse({'error': 'Permission denied'}, status=403)
-        
         data = json.loads(request.body)
         
         # Validate required fields
@@ -135,6 +159,7 @@ def data_store_create(request, app_id):
             value=str(data['value']),  # Convert to string for storage
             value_type=data['value_type']
         )
+        record_data_write(request.user.id)
         
         return JsonResponse({
             "id": item.id,
@@ -145,22 +170,15 @@ def data_store_create(request, app_id):
             "updated_at": item.updated_at.isoformat()
         }, status=201)
         
-    except App.DoesNotExist:
-        return JsonResponse({'error': 'App not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 @login_required
 @require_http_methods(["PUT", "PATCH"])
-def data_store_update(request, app_id, item_id):
+@app_member_required(api=True)
+def data_store_update(request, app, item_id):
     """API endpoint to update a DataStore item."""
     try:
-        app = App.objects.get(id=app_id)
-        
-        # Check if user has access to the app
-        if not app.organization.organizationmember_set.filter(user=request.user).exists():
-            return JsonResponse({'error': 'Permission denied'}, status=403)
-        
         item = app.data_store.get(id=item_id)
         data = json.loads(request.body)
         
@@ -175,6 +193,7 @@ def data_store_update(request, app_id, item_id):
             item.value_type = data['value_type']
             
         item.save()
+        record_data_write(request.user.id)
         
         return JsonResponse({
             "id": item.id,
@@ -185,8 +204,6 @@ def data_store_update(request, app_id, item_id):
             "updated_at": item.updated_at.isoformat()
         })
         
-    except App.DoesNotExist:
-        return JsonResponse({'error': 'App not found'}, status=404)
     except DataStore.DoesNotExist:
         return JsonResponse({'error': 'Item not found'}, status=404)
     except Exception as e:
@@ -194,22 +211,16 @@ def data_store_update(request, app_id, item_id):
 
 @login_required
 @require_http_methods(["DELETE"])
-def data_store_delete(request, app_id, item_id):
+@app_member_required(api=True)
+def data_store_delete(request, app, item_id):
     """API endpoint to delete a DataStore item."""
     try:
-        app = App.objects.get(id=app_id)
-        
-        # Check if user has access to the app
-        if not app.organization.organizationmember_set.filter(user=request.user).exists():
-            return JsonResponse({'error': 'Permission denied'}, status=403)
-        
         item = app.data_store.get(id=item_id)
         item.delete()
+        record_data_write(request.user.id)
         
         return JsonResponse({'message': 'Item deleted successfully'})
         
-    except App.DoesNotExist:
-        return JsonResponse({'error': 'App not found'}, status=404)
     except DataStore.DoesNotExist:
         return JsonResponse({'error': 'Item not found'}, status=404)
     except Exception as e:
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class AnythingAppsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'anything_apps'
+
+    def ready(self):
+        from anything.database import apply_sqlite_pragmas
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='apply_sqlite_pragmas')
+        # Registers the dashboard rollup receivers
+        import utils.rollups  # noqa: F401
+        # Registers the receiver that indexes completed prompts
+        import utils.similarity  # noqa: F401
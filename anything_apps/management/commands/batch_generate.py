@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from anything_apps.models import App, GenerationBatch
+from anything_org.models import Organization
+from utils.batches import BatchError, poll_generation_batch, start_batch_generation
+import sys
+import time
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = (
+        'Generates apps through the Message Batches API, at lower cost and outside the interactive '
+        'rate limit: new apps from prompts listed in a file, or regenerations of existing apps'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="File with one prompt per line, or '-' for standard input")
+        parser.add_argument('--organization', type=int, required=True, help='Organization id the apps belong to')
+        parser.add_argument('--user', required=True, help='Username the generation is run and charged as')
+        parser.add_argument(
+            '--regenerate', action='store_true',
+            help="Also regenerate every app of the organization in place from its initial prompt"
+        )
+        parser.add_argument('--wait', action='store_true', help='Poll here until the batch has finished')
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(id=options['organization'])
+            user = User.objects.get(username=options['user'])
+        except (Organization.DoesNotExist, User.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        contents = []
+        if options['path'] == '-':
+            contents = sys.stdin.read().splitlines()
+        elif options['path']:
+            try:
+                with open(options['path'], encoding='utf-8') as f:
+                    contents = f.read().splitlines()
+            except OSError as e:
+                raise CommandError(f"Cannot read {options['path']}: {e}")
+        apps = list(App.objects.filter(organization=organization)) if options['regenerate'] else []
+        if not any(content.strip() for content in contents) and not apps:
+            raise CommandError('Nothing to generate: give a prompts file or --regenerate')
+
+        try:
+            batch = start_batch_generation(organization, user, contents=contents, apps=apps)
+        except (ValueError, BatchError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Started generation batch {batch.id} with {batch.items.count()} apps.")
+        if not options['wait']:
+            return
+
+        while batch.status == 'RUNNING':
+            time.sleep(settings.LLM_BATCH.get('poll_interval', 60))
+            poll_generation_batch(batch.id)
+            batch = GenerationBatch.objects.get(id=batch.id)
+            self.stdout.write(f"Batch {batch.id}: {batch.get_stage_display()}...")
+
+        done = batch.items.filter(status='DONE').count()
+        failed = batch.items.filter(status='FAILED').count()
+        if batch.status == 'FAILED':
+            raise CommandError(f"Batch {batch.id} failed: {batch.error_message}")
+        self.stdout.write(self.style.SUCCESS(f"Batch {batch.id} finished: {done} apps generated, {failed} failed."))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from utils.benchmark import OPT_IN_SCENARIOS, SCENARIOS, isolated_database, run_benchmarks
+import json
+import logging
+
+
+def _cell(value) -> str:
+    return '-' if value is None else str(value)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks app generation and request paths offline against recorded LLM responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*',
+            help=f"Scenarios to run (default: all except {', '.join(sorted(OPT_IN_SCENARIOS))}). "
+                 f"Available: {', '.join(SCENARIOS)}"
+        )
+        parser.add_argument('--rows', type=int, default=1000, help='DataStore rows to seed')
+        parser.add_argument('--iterations', type=int, default=5, help='Measured runs per scenario')
+        parser.add_argument('--recordings', help='Recorded responses JSON (default: utils/recordings/generation.json)')
+        parser.add_argument('--latency', type=float, default=0, help='Simulated seconds per LLM call')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        # Keep generator logging out of the report
+        logging.disable(logging.INFO)
+        try:
+            with isolated_database():
+                results = run_benchmarks(
+                    names=options['scenarios'] or None,
+                    rows=options['rows'],
+                    iterations=options['iterations'],
+                    recordings_path=options['recordings'],
+                    latency=options['latency']
+                )
+        finally:
+            logging.disable(logging.NOTSET)
+
+        rows = [result.as_dict() for result in results]
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'scenario':<20}{'mean ms':>10}{'median ms':>11}{'max ms':>10}"
+            f"{'llm calls':>11}{'in tokens':>11}{'queries':>9}{'peak KB':>10}"
+        )
+        for row in rows:
+            wall = row['wall_time_ms'] or {}
+            self.stdout.write(
+                f"{row['name']:<20}{_cell(wall.get('mean')):>10}{_cell(wall.get('median')):>11}"
+                f"{_cell(wall.get('max')):>10}{_cell(row['llm_calls']):>11}{_cell(row['llm_input_tokens']):>11}"
+                f"{_cell(row['db_queries']):>9}"
+                f"{row['peak_memory_kb']:>10}"
+            )
+            for label, stats in row.items():
+                if isinstance(stats, dict) and label != 'wall_time_ms':
+                    self.stdout.write(f"  {label}: " + ', '.join(f"{key}={value}" for key, value in stats.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f"Ran {len(rows)} scenarios with {options['rows']} seeded rows, {options['iterations']} iterations each."
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from utils.similarity import index_prompts
+
+class Command(BaseCommand):
+    help = 'Indexes completed prompts that have no similarity signature yet, e.g. those from before matching existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Prompts indexed per transaction')
+
+    def handle(self, *args, **options):
+        indexed = index_prompts(
+            batch_size=options['batch_size'],
+            progress=lambda done: self.stdout.write(f'Indexed {done} prompts...')
+        )
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} prompts.'))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_apps', '0005_alter_datastore_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text="'global' or 'org:<organization id>'", max_length=100, unique=True)),
+                ('requests', models.FloatField(help_text='Requests currently available in the bucket')),
+                ('tokens', models.FloatField(help_text='LLM tokens currently available in the bucket')),
+                ('updated_at', models.DateTimeField(help_text='When the bucket was last refilled')),
+            ],
+        ),
+    ]
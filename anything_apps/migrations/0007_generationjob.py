@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_org', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('anything_apps', '0006_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('GENERATE', 'Generate'), ('UPDATE', 'Update')], max_length=20)),
+                ('priority', models.IntegerField(default=0, help_text='Lower values are dispatched first')),
+                ('content_hash', models.CharField(help_text='Hash of the normalized prompt, used to deduplicate pending jobs', max_length=64)),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='QUEUED', max_length=20)),
+                ('task_id', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('app', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='anything_apps.app')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generation_jobs', to='anything_org.organization')),
+                ('prompt', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='anything_apps.prompt')),
+                ('prompt_update', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='anything_apps.promptupdate')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['priority', 'created_at'],
+                'indexes': [models.Index(fields=['status', 'priority', 'created_at'], name='anything_ap_status_8297f2_idx'), models.Index(fields=['organization', 'status'], name='anything_ap_organiz_e044c3_idx'), models.Index(fields=['content_hash', 'status'], name='anything_ap_content_9addf3_idx')],
+            },
+        ),
+    ]
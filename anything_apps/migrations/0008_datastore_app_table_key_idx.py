@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_apps', '0007_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='datastore',
+            index=models.Index(fields=['app', 'table_name', 'key'], name='datastore_app_table_key_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:27
+
+from django.db import migrations, models
+from utils import assets
+
+
+def publish_existing_assets(apps, schema_editor):
+    """Give existing apps and pages asset digests for their CSS and JS."""
+    AppAsset = apps.get_model('anything_apps', 'AppAsset')
+    App = apps.get_model('anything_apps', 'App')
+    AppPage = apps.get_model('anything_apps', 'AppPage')
+
+    def publish(kind, content):
+        minified = assets.MINIFIERS[kind](content)
+        digest = assets.digest(minified)
+        gzipped, brotlied = assets.compress(minified)
+        AppAsset.objects.get_or_create(digest=digest, defaults={
+            'kind': kind,
+            'content': minified,
+            'gzip_content': gzipped,
+            'brotli_content': brotlied,
+        })
+        return digest
+
+    for app in App.objects.exclude(css_content='').only('id', 'css_content'):
+        App.objects.filter(id=app.id).update(css_digest=publish('css', app.css_content))
+    for page in AppPage.objects.exclude(js_content='').only('id', 'js_content'):
+        AppPage.objects.filter(id=page.id).update(js_digest=publish('js', page.js_content))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_apps', '0008_datastore_app_table_key_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('kind', models.CharField(choices=[('css', 'CSS'), ('js', 'JavaScript')], max_length=10)),
+                ('content', models.TextField()),
+                ('gzip_content', models.BinaryField()),
+                ('brotli_content', models.BinaryField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='css_digest',
+            field=models.CharField(blank=True, help_text='AppAsset digest of the minified CSS', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='apppage',
+            name='js_digest',
+            field=models.CharField(blank=True, help_text='AppAsset digest of the minified JavaScript', max_length=64),
+        ),
+        migrations.RunPython(publish_existing_assets, migrations.RunPython.noop),
+    ]
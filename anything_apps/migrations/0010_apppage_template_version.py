@@ -0,0 +1,32 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:32
+
+from django.db import migrations, models
+from django.template import Template, TemplateSyntaxError
+from utils import assets
+
+
+def validate_existing_templates(apps, schema_editor):
+    """Give existing pages whose templates compile a template version."""
+    AppPage = apps.get_model('anything_apps', 'AppPage')
+    for page in AppPage.objects.only('id', 'template_content'):
+        try:
+            Template(page.template_content)
+        except TemplateSyntaxError:
+            continue
+        AppPage.objects.filter(id=page.id).update(template_version=assets.digest(page.template_content))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_apps', '0009_appasset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apppage',
+            name='template_version',
+            field=models.CharField(blank=True, help_text='Digest of the template content when it last compiled cleanly', max_length=64),
+        ),
+        migrations.RunPython(validate_existing_templates, migrations.RunPython.noop),
+    ]
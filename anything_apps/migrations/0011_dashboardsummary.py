@@ -0,0 +1,32 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('anything_apps', '0010_apppage_template_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('organization_count', models.IntegerField(default=0)),
+                ('app_count', models.IntegerField(default=0)),
+                ('recent_apps', models.JSONField(default=list, help_text='Most recently created apps the user can see')),
+                ('period_start', models.DateField(help_text='First day of the period the counters below cover')),
+                ('tokens_used', models.IntegerField(default=0)),
+                ('data_writes', models.IntegerField(default=0, help_text='DataStore items the user created, changed or deleted')),
+                ('running_generations', models.IntegerField(default=0, help_text='Queued or running generations and updates')),
+                ('stale', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_apps', '0011_dashboardsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apppage',
+            name='description',
+            field=models.TextField(blank=True, help_text='Purpose of the page, used when generating it'),
+        ),
+        migrations.AddField(
+            model_name='apppage',
+            name='status',
+            field=models.CharField(choices=[('READY', 'Ready'), ('PENDING', 'Pending'), ('QUEUED', 'Queued'), ('GENERATING', 'Generating'), ('FAILED', 'Failed')], default='READY', max_length=20),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_org', '0002_organizationmember_role_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('anything_apps', '0012_apppage_lazy_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('SKELETON', 'Skeleton'), ('TEMPLATES', 'Page templates'), ('PAGES', 'Page scripts and queries'), ('DONE', 'Done')], default='SKELETON', max_length=20)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='RUNNING', max_length=20)),
+                ('provider_batch_id', models.CharField(blank=True, help_text='Provider batch of the current stage', max_length=100)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generation_batches', to='anything_org.organization')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GenerationBatchItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('skeleton', models.JSONField(blank=True, null=True)),
+                ('pages', models.JSONField(default=list, help_text='Skeleton pages with the content generated for them')),
+                ('error_message', models.TextField(blank=True)),
+                ('app', models.ForeignKey(blank=True, help_text='App regenerated in place, or the app created once the item is done', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='batch_items', to='anything_apps.app')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='anything_apps.generationbatch')),
+                ('prompt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_items', to='anything_apps.prompt')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_org', '0002_organizationmember_role_idx'),
+        ('anything_apps', '0013_generationbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromptSignature',
+            fields=[
+                ('prompt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='anything_apps.prompt')),
+                ('signature', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='anything_org.organization')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PromptSignatureBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.CharField(max_length=40)),
+                ('signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='anything_apps.promptsignature')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band'], name='anything_ap_band_f48439_idx')],
+            },
+        ),
+    ]
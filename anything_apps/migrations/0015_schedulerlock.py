@@ -0,0 +1,28 @@
+# Generated by Django 4.2.11 on 2026-10-19 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_apps', '0014_promptsignature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='generationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'GENERATE'), ('status__in', ['QUEUED', 'RUNNING'])), fields=('organization', 'content_hash'), name='unique_active_generation'),
+        ),
+        migrations.AddConstraint(
+            model_name='generationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'UPDATE'), ('status__in', ['QUEUED', 'RUNNING'])), fields=('app', 'content_hash'), name='unique_active_update'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-19 00:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_apps', '0015_schedulerlock'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='generationjob',
+            name='unique_active_generation',
+        ),
+        migrations.AddConstraint(
+            model_name='generationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'GENERATE'), ('status__in', ['QUEUED', 'RUNNING'])), fields=('organization', 'user', 'content_hash'), name='unique_active_generation'),
+        ),
+    ]
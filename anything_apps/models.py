@@ -1,13 +1,23 @@
-from django.db import models
+from django.db import connections, models
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Window
 from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError
-from django.template import Template, Context
+from django.http import HttpRequest
+from django.template import Template, Context, TemplateSyntaxError
+from django.urls import reverse
+import functools
 import json
 from datetime import datetime
+from utils import assets
+from utils.cache import app_namespace, get_or_set, invalidate
+from utils.models import DirtyFieldsMixin
+from utils.queries import count_subquery
 
 # Create your models here.
 
-class Prompt(models.Model):
+class Prompt(DirtyFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
         ('PROCESSING', 'Processing'),
@@ -26,7 +36,7 @@ class Prompt(models.Model):
     def __str__(self):
         return f"Prompt by {self.user.username} - {self.created_at}"
 
-class PromptUpdate(models.Model):
+class PromptUpdate(DirtyFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
         ('PROCESSING', 'Processing'),
@@ -44,7 +54,30 @@ class PromptUpdate(models.Model):
     def __str__(self):
         return f"Update to {self.original_prompt} - {self.created_at}"
 
-class App(models.Model):
+class AppQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """
+        Apps in organizations ``user`` belongs to, annotated with their
+        ``role`` there and ``page_count``.
+        """
+        from anything_org.models import OrganizationMember
+
+        membership = OrganizationMember.objects.filter(organization=OuterRef('organization'), user=user)
+        return self.filter(Exists(membership)).annotate(
+            role=Subquery(membership.values('role')[:1]),
+            page_count=count_subquery(AppPage.objects.filter(app=OuterRef('pk'))),
+        ).select_related('organization')
+
+    def search(self, term: str):
+        """Apps whose name, description or organization name contains ``term``."""
+        return self.filter(
+            Q(name__icontains=term) |
+            Q(description__icontains=term) |
+            Q(organization__name__icontains=term)
+        )
+
+
+class App(DirtyFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('ACTIVE', 'Active'),
         ('UPDATING', 'Updating'),
@@ -56,23 +89,47 @@ class App(models.Model):
     description = models.TextField()
     initial_prompt = models.ForeignKey(Prompt, on_delete=models.CASCADE, related_name='created_apps')
     css_content = models.TextField(blank=True, help_text="Custom CSS for the entire app")
+    css_digest = models.CharField(max_length=64, blank=True, help_text="AppAsset digest of the minified CSS")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     version = models.IntegerField(default=1)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ACTIVE')
 
+    objects = AppQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        _publish_asset(self, 'css', kwargs)
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
 
 class AppPage(models.Model):
+    # Pages other than the landing page can be stored as stubs and generated
+    # later, in the background or on first visit (PAGE_GENERATION setting)
+    STATUS_CHOICES = [
+        ('READY', 'Ready'),
+        ('PENDING', 'Pending'),
+        ('QUEUED', 'Queued'),
+        ('GENERATING', 'Generating'),
+        ('FAILED', 'Failed')
+    ]
+
     app = models.ForeignKey(App, on_delete=models.CASCADE, related_name='pages')
     name = models.CharField(max_length=100)
     slug = models.SlugField()
+    description = models.TextField(blank=True, help_text="Purpose of the page, used when generating it")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='READY')
     template_content = models.TextField(help_text="Django template content for this page")
     js_content = models.TextField(blank=True, help_text="Custom JavaScript for this page")
+    js_digest = models.CharField(max_length=64, blank=True, help_text="AppAsset digest of the minified JavaScript")
+    template_version = models.CharField(
+        max_length=64, blank=True,
+        help_text="Digest of the template content when it last compiled cleanly"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -82,6 +139,11 @@ class AppPage(models.Model):
     def __str__(self):
         return f"{self.app.name} - {self.name}"
 
+    def save(self, *args, **kwargs):
+        _publish_asset(self, 'js', kwargs)
+        _check_template(self, kwargs)
+        super().save(*args, **kwargs)
+
     def render(self, request):
         """Renders the page with all its contexts"""
         context_data = {}
@@ -99,9 +161,106 @@ class AppPage(models.Model):
         context_data['app'] = self.app
         context_data['page'] = self
         
-        template = Template(self.template_content)
+        template = compile_template(self.template_content)
         return template.render(Context(context_data))
 
+    def render_cached(self, request):
+        """
+        Render through the app's cache; per user and query string since
+        templates can read the request. ``updated_at`` is part of the key, so
+        a page saved by another process is not served from a stale entry
+        even when that process's invalidation never reaches this cache.
+        """
+        return get_or_set(
+            app_namespace(self.app_id), 'page', *self.render_cache_parts(request),
+            producer=lambda: self.render(request)
+        )
+
+    def render_cache_parts(self, request) -> tuple:
+        return self.id, self.updated_at.isoformat(), request.user.id, request.META.get('QUERY_STRING', '')
+
+    def warm(self, user):
+        """Fill the render cache for ``user`` so their first view is a cache hit."""
+        request = HttpRequest()
+        request.method = 'GET'
+        request.path = reverse('apps:render_page', args=[self.app_id, self.slug])
+        request.user = user
+        self.render_cached(request)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_template(template_content: str) -> Template:
+    """Parse a page template once per process; raises ``TemplateSyntaxError``."""
+    return Template(template_content)
+
+
+def _check_template(page, save_kwargs: dict):
+    """Refresh ``template_version`` before an AppPage is saved, compiling the template."""
+    version = assets.digest(page.template_content)
+    if version == page.template_version:
+        return
+    try:
+        compile_template(page.template_content)
+    except TemplateSyntaxError:
+        # Saved anyway (e.g. from the admin); the error surfaces on render
+        version = ''
+    page.template_version = version
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None:
+        save_kwargs['update_fields'] = {*update_fields, 'template_version'}
+
+class AppAsset(models.Model):
+    """
+    Minified, precompressed CSS or JS, stored once per distinct content.
+
+    Assets are addressed by the hash of their content, so their URLs never
+    change meaning and can be cached by browsers indefinitely.
+    """
+    KIND_CHOICES = [
+        ('css', 'CSS'),
+        ('js', 'JavaScript')
+    ]
+
+    digest = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    content = models.TextField()
+    gzip_content = models.BinaryField()
+    brotli_content = models.BinaryField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} asset {self.digest}"
+
+    @classmethod
+    def publish(cls, kind: str, content: str) -> str:
+        """Minify and store ``content`` unless already stored; return its digest."""
+        minified = assets.MINIFIERS[kind](content)
+        digest = assets.digest(minified)
+        if not cls.objects.filter(digest=digest).exists():
+            gzipped, brotlied = assets.compress(minified)
+            cls.objects.get_or_create(digest=digest, defaults={
+                'kind': kind,
+                'content': minified,
+                'gzip_content': gzipped,
+                'brotli_content': brotlied,
+            })
+        return digest
+
+
+def _publish_asset(instance, kind: str, save_kwargs: dict):
+    """Refresh the ``<kind>_digest`` of an App or AppPage before it is saved."""
+    content = getattr(instance, f'{kind}_content')
+    digest = assets.digest(assets.MINIFIERS[kind](content)) if content else ''
+    if digest == getattr(instance, f'{kind}_digest'):
+        return
+    if content:
+        AppAsset.publish(kind, content)
+    setattr(instance, f'{kind}_digest', digest)
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None:
+        save_kwargs['update_fields'] = {*update_fields, f'{kind}_digest'}
+
+
 class AppModel(models.Model):
     app = models.ForeignKey(App, on_delete=models.CASCADE, related_name='models')
     name = models.CharField(max_length=100)
@@ -128,7 +287,50 @@ class Permission(models.Model):
     class Meta:
         unique_together = ('app', 'codename')
 
-class DataStore(models.Model):
+class DataStoreQuerySet(models.QuerySet):
+    """Query helpers for DataStore, tuned per database backend."""
+
+    def search(self, term: str):
+        """Rows whose table name, key or value contains ``term``."""
+        return self.filter(
+            Q(table_name__icontains=term) |
+            Q(key__icontains=term) |
+            Q(value__icontains=term)
+        )
+
+    def columns(self):
+        """
+        One ``(table_name, key, value_type)`` tuple per column.
+
+        PostgreSQL picks one row per column with ``DISTINCT ON``; other
+        backends fall back to a plain ``DISTINCT`` over all three fields.
+        """
+        features = connections[self.db].features
+        columns = self.order_by('table_name', 'key')
+        if features.can_distinct_on_fields:
+            columns = columns.distinct('table_name', 'key')
+        else:
+            columns = columns.distinct()
+        return columns.values_list('table_name', 'key', 'value_type')
+
+    def page_with_total(self, offset: int, limit: int) -> tuple[list, int]:
+        """
+        Return one page of rows and the total row count.
+
+        Where window functions are supported the total is fetched with the
+        page in a single query instead of a separate ``COUNT``.
+        """
+        if not connections[self.db].features.supports_over_clause:
+            return list(self[offset:offset + limit]), self.count()
+
+        rows = list(self.annotate(total_count=Window(Count('id')))[offset:offset + limit])
+        if rows:
+            return rows, rows[0].total_count
+        # Past the last page there is no row to carry the total
+        return rows, self.count()
+
+
+class DataStore(DirtyFieldsMixin, models.Model):
     VALUE_TYPES = [
         ('str', 'String'),
         ('int', 'Integer'),
@@ -147,8 +349,13 @@ class DataStore(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DataStoreQuerySet.as_manager()
+
     class Meta:
         unique_together = ['app', 'id']
+        indexes = [
+            models.Index(fields=['app', 'table_name', 'key'], name='datastore_app_table_key_idx'),
+        ]
 
     def __str__(self):
         return f"{self.app.name} - {self.table_name} - {self.key}"
@@ -204,3 +411,218 @@ class ContextQuery(models.Model):
         except Exception as e:
             # Log the error
             return None
+
+class RateLimitBucket(models.Model):
+    """Shared token bucket state used to throttle LLM calls across all workers."""
+    name = models.CharField(max_length=100, unique=True, help_text="'global' or 'org:<organization id>'")
+    requests = models.FloatField(help_text="Requests currently available in the bucket")
+    tokens = models.FloatField(help_text="LLM tokens currently available in the bucket")
+    updated_at = models.DateTimeField(help_text="When the bucket was last refilled")
+
+    def __str__(self):
+        return f"{self.name} ({self.requests:.1f} requests, {self.tokens:.0f} tokens)"
+
+
+class SchedulerLock(models.Model):
+    """Row locked while the scheduler counts slots and claims jobs, so dispatches never overlap."""
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class GenerationJob(models.Model):
+    """A generation or update waiting for, or holding, a worker slot."""
+    KIND_CHOICES = [
+        ('GENERATE', 'Generate'),
+        ('UPDATE', 'Update')
+    ]
+
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed')
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    organization = models.ForeignKey('anything_org.Organization', on_delete=models.CASCADE, related_name='generation_jobs')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    prompt = models.ForeignKey(Prompt, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    prompt_update = models.ForeignKey(PromptUpdate, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    app = models.ForeignKey(App, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    priority = models.IntegerField(default=0, help_text="Lower values are dispatched first")
+    content_hash = models.CharField(max_length=64, help_text="Hash of the normalized prompt, used to deduplicate pending jobs")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    task_id = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['priority', 'created_at']
+        indexes = [
+            models.Index(fields=['status', 'priority', 'created_at']),
+            models.Index(fields=['organization', 'status']),
+            models.Index(fields=['content_hash', 'status']),
+        ]
+        constraints = [
+            # At most one queued or running job per prompt, so concurrent enqueues collapse onto it
+            models.UniqueConstraint(
+                fields=['organization', 'user', 'content_hash'],
+                condition=Q(kind='GENERATE', status__in=['QUEUED', 'RUNNING']),
+                name='unique_active_generation'
+            ),
+            models.UniqueConstraint(
+                fields=['app', 'content_hash'],
+                condition=Q(kind='UPDATE', status__in=['QUEUED', 'RUNNING']),
+                name='unique_active_update'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} job {self.id} ({self.status})"
+
+
+class GenerationBatch(models.Model):
+    """
+    Apps generated together through the Message Batches API.
+
+    Every pipeline stage is one provider batch holding that stage's requests
+    for all items; ``utils.batches`` polls it and submits the next stage
+    once it has ended.
+    """
+    STAGE_CHOICES = [
+        ('SKELETON', 'Skeleton'),
+        ('TEMPLATES', 'Page templates'),
+        ('PAGES', 'Page scripts and queries'),
+        ('DONE', 'Done')
+    ]
+
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed')
+    ]
+
+    organization = models.ForeignKey('anything_org.Organization', on_delete=models.CASCADE, related_name='generation_batches')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default='SKELETON')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    provider_batch_id = models.CharField(max_length=100, blank=True, help_text="Provider batch of the current stage")
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Generation batch {self.id} ({self.get_stage_display()}, {self.status})"
+
+
+class GenerationBatchItem(models.Model):
+    """One prompt of a generation batch and what its stages produced so far."""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed')
+    ]
+
+    batch = models.ForeignKey(GenerationBatch, on_delete=models.CASCADE, related_name='items')
+    prompt = models.ForeignKey(Prompt, on_delete=models.CASCADE, related_name='batch_items')
+    app = models.ForeignKey(
+        App, on_delete=models.SET_NULL, null=True, blank=True, related_name='batch_items',
+        help_text="App regenerated in place, or the app created once the item is done"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    skeleton = models.JSONField(null=True, blank=True)
+    pages = models.JSONField(default=list, help_text="Skeleton pages with the content generated for them")
+    error_message = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Batch {self.batch_id} item {self.id} ({self.status})"
+
+
+class PromptSignature(models.Model):
+    """MinHash signature of a completed prompt, for near-duplicate lookups (see ``utils.similarity``)."""
+    prompt = models.OneToOneField(Prompt, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    organization = models.ForeignKey('anything_org.Organization', on_delete=models.CASCADE, related_name='+')
+    signature = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Signature of prompt {self.prompt_id}"
+
+
+class PromptSignatureBand(models.Model):
+    """One locality-sensitive hash band of a signature; prompts sharing a band are match candidates."""
+    signature = models.ForeignKey(PromptSignature, on_delete=models.CASCADE, related_name='bands')
+    band = models.CharField(max_length=40)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band']),
+        ]
+
+
+class DashboardSummary(models.Model):
+    """
+    Everything the dashboard shows for one user, kept in a single row.
+
+    Maintained by ``utils.rollups``: counters are adjusted in place as work
+    happens, and changes affecting whole organizations mark rows stale so
+    they are rebuilt on the next read.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='dashboard_summary')
+    organization_count = models.IntegerField(default=0)
+    app_count = models.IntegerField(default=0)
+    recent_apps = models.JSONField(default=list, help_text="Most recently created apps the user can see")
+    period_start = models.DateField(help_text="First day of the period the counters below cover")
+    tokens_used = models.IntegerField(default=0)
+    data_writes = models.IntegerField(default=0, help_text="DataStore items the user created, changed or deleted")
+    running_generations = models.IntegerField(default=0, help_text="Queued or running generations and updates")
+    stale = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dashboard summary for {self.user}"
+
+
+def prompt_namespace(prompt_id: int) -> str:
+    return f'prompt:{prompt_id}'
+
+
+def prompt_update_namespace(update_id: int) -> str:
+    return f'prompt-update:{update_id}'
+
+
+@receiver(post_save, sender=App)
+@receiver(post_delete, sender=App)
+def invalidate_app_cache(sender, instance, **kwargs):
+    invalidate(app_namespace(instance.id), prompt_namespace(instance.initial_prompt_id))
+
+
+@receiver(post_save, sender=AppPage)
+@receiver(post_delete, sender=AppPage)
+@receiver(post_save, sender=DataStore)
+@receiver(post_delete, sender=DataStore)
+def invalidate_app_content_cache(sender, instance, **kwargs):
+    invalidate(app_namespace(instance.app_id))
+
+
+@receiver(post_save, sender=ContextQuery)
+@receiver(post_delete, sender=ContextQuery)
+def invalidate_context_query_cache(sender, instance, **kwargs):
+    invalidate(app_namespace(instance.page.app_id))
+
+
+@receiver(post_save, sender=Prompt)
+def invalidate_prompt_cache(sender, instance, **kwargs):
+    invalidate(prompt_namespace(instance.id))
+
+
+@receiver(post_save, sender=PromptUpdate)
+def invalidate_prompt_update_cache(sender, instance, **kwargs):
+    invalidate(prompt_update_namespace(instance.id))
@@ -1,3 +1,891 @@
-from django.test import TestCase
+import gzip
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from anything.database import database_config, sqlite_pragmas
+from anything.middleware import BrotliMiddleware
+from anything_org.models import Organization, OrganizationMember
+from utils.app_generator import AppGenerator
+from utils.assets import minify_html
+from utils.benchmark import RECORDINGS_PATH, run_benchmarks
+from utils.batches import BatchClient, BatchError, LocalBatchTransport, poll_generation_batch, start_batch_generation
+from utils.brokers import LocalBroker
+from utils.cloning import clone_app
+from utils.cache import app_namespace, get as cache_get, get_or_set, invalidate, stats as cache_stats
+from utils.llm import AnthropicBackend, LLMBackendError, ReplayBackend, get_llm_backend
+from utils.rate_limiter import RateLimiter, RateLimitExceeded
+from utils.schemas import STEP_SCHEMAS, SchemaValidationError, validate
+from utils.similarity import find_similar, index_prompts, similarity, minhash
+from utils.scheduler import dispatch, enqueue_generation, enqueue_update, queue_metrics
+from utils.tasks import generate_app_async
+from users.models import UserProfile
+from .models import (
+    App, AppAsset, AppPage, ContextQuery, DataStore, GenerationBatch, GenerationJob, Prompt, PromptSignature,
+    RateLimitBucket
+)
+
+
+class AppFixtureMixin:
+    """Creates a user, organization and a small generated app."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.organization = Organization.objects.create(name='Acme', owner=self.user)
+        OrganizationMember.objects.create(organization=self.organization, user=self.user, role='ADMIN')
+        self.prompt = Prompt.objects.create(
+            content='A simple todo app',
+            user=self.user,
+            organization=self.organization,
+            tokens_used=0
+        )
+        self.app = App.objects.create(
+            organization=self.organization,
+            name='Todo',
+            description='Track tasks',
+            initial_prompt=self.prompt
+        )
+        for key, value_type in [('title', 'str'), ('done', 'bool')]:
+            DataStore.objects.create(app=self.app, table_name='tasks', key=key, value='', value_type=value_type)
+        self.home = AppPage.objects.create(app=self.app, name='Home', slug='home', template_content='<h1>Home</h1>')
+        self.stats = AppPage.objects.create(app=self.app, name='Stats', slug='stats', template_content='<h1>Stats</h1>')
+        ContextQuery.objects.create(page=self.home, context_key='tasks', query_content='[]')
+
+
+class GeneratorMixin(AppFixtureMixin):
+    """Builds generators for the fixture app that replay the given responses."""
+
+    def _generator(self, recordings, **kwargs):
+        self.llm = ReplayBackend(recordings=recordings)
+        return AppGenerator(self.organization, self.prompt, llm=self.llm, **kwargs)
+
+
+class ReplayBackendTests(TestCase):
+    @override_settings(LLM_MODELS={'default': 'big-model', 'name_description': 'small-model'})
+    def test_model_selection_per_step(self):
+        backend = ReplayBackend(recordings={})
+
+        self.assertEqual(backend.model('name_description'), 'small-model')
+        self.assertEqual(backend.model('page_template'), 'big-model')
+
+    def test_replays_step_responses_in_order(self):
+        backend = ReplayBackend(recordings={'page_list': ['first', 'second']})
+
+        texts = [backend.call('page_list', 'prompt', max_tokens=10).text for _ in range(3)]
+
+        self.assertEqual(texts, ['first', 'second', 'first'])
+        self.assertEqual(backend.usage['calls'], 3)
+        self.assertEqual(''.join(backend.stream('page_list', 'prompt', max_tokens=10)), 'second')
+
+    def test_missing_step_raises(self):
+        backend = get_llm_backend('replay', recordings={})
+
+        with self.assertRaises(LLMBackendError):
+            backend.call('page_list', 'prompt', max_tokens=10)
+
+
+class RateLimiterTests(TestCase):
+    def test_waits_are_bounded_by_max_wait(self):
+        limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1000, max_wait=0)
+        limiter.acquire(1, estimated_tokens=100)
+        limiter.acquire(1, estimated_tokens=100)
+
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire(1, estimated_tokens=100)
+
+    def test_active_organizations_share_capacity(self):
+        limiter = RateLimiter(requests_per_minute=4, tokens_per_minute=1000, max_wait=0)
+        limiter.acquire(2, estimated_tokens=10)
+
+        # Two active organizations: organization 1 is capped at half the rate
+        limiter.acquire(1, estimated_tokens=10)
+        limiter.acquire(1, estimated_tokens=10)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire(1, estimated_tokens=10)
+
+    def test_reconcile_charges_actual_usage(self):
+        limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=1000, max_wait=0)
+        reservation = limiter.acquire(None, estimated_tokens=500)
+        limiter.reconcile(reservation, actual_tokens=200)
+
+        self.assertAlmostEqual(RateLimitBucket.objects.get(name='global').tokens, 800, delta=1)
+
+
+class RateLimitedCallTests(GeneratorMixin, TestCase):
+    def test_failed_call_returns_its_reservation(self):
+        limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=1000, max_wait=0)
+        generator = self._generator({'page_list': []}, rate_limiter=limiter)
+
+        with self.assertRaises(LLMBackendError):
+            generator._call_llm('page_list', 'List the pages', max_tokens=400)
+
+        self.assertAlmostEqual(RateLimitBucket.objects.get(name='global').tokens, 1000, delta=1)
+
+
+class UpdateAppTests(GeneratorMixin, TestCase):
+    def test_schema_diff_skips_existing_columns(self):
+        generator = self._generator({})
+        generator._setup_data_structure(self.app, [
+            {'table_name': 'tasks', 'key': 'title', 'value_type': 'str'},
+            {'table_name': 'tasks', 'key': 'due', 'value_type': 'date'},
+        ])
+        generator._setup_data_structure(self.app, [
+            {'table_name': 'tasks', 'key': 'due', 'value_type': 'date'},
+        ])
+
+        keys = sorted(self.app.data_store.values_list('key', flat=True))
+        self.assertEqual(keys, ['done', 'due', 'title'])
+
+    def test_update_only_regenerates_planned_page(self):
+        plan = {
+            'name': None,
+            'description': None,
+            'tables': {
+                'add': [{'table_name': 'tasks', 'key': 'priority', 'value_type': 'int'}],
+                'remove': [{'table_name': 'tasks', 'key': 'done'}],
+            },
+            'pages': {'update': ['home'], 'queries': [], 'create': [], 'remove': []},
+        }
+        page_update = {
+            'template': '<h1>Home</h1><button>Add</button>',
+            'js': '',
+            'contexts': [{'key': 'tasks', 'query': 'list()'}],
+        }
+        generator = self._generator({
+            'update_plan': [json.dumps(plan)],
+            'page_update': [json.dumps(page_update)],
+        })
+
+        generator.update_app(self.app, 'Add a button to the home page')
+
+        self.assertEqual(self.llm.usage['calls'], 2)
+        self.home.refresh_from_db()
+        self.stats.refresh_from_db()
+        self.assertIn('<button>', self.home.template_content)
+        self.assertEqual(self.stats.template_content, '<h1>Stats</h1>')
+        self.assertEqual(self.home.context_queries.get().query_content, 'list()')
+        self.assertEqual(
+            sorted(self.app.data_store.values_list('key', flat=True)),
+            ['priority', 'title']
+        )
+        # Validated at write time and rendered ahead of the first view
+        self.assertTrue(self.home.template_version)
+        request = SimpleNamespace(user=self.user, META={})
+        self.assertIn('<button>', cache_get(app_namespace(self.app.id), 'page', *self.home.render_cache_parts(request)))
+
+    def test_broken_template_fails_update_and_keeps_page(self):
+        plan = {'pages': {'update': ['home'], 'queries': [], 'create': [], 'remove': []}}
+        page_update = {'template': '<h1>{% if %}</h1>', 'js': '', 'contexts': []}
+        generator = self._generator({
+            'update_plan': [json.dumps(plan)],
+            'page_update': [json.dumps(page_update)],
+        })
+
+        with self.assertRaisesMessage(ValueError, "Generated template for page 'Home' is invalid"):
+            generator.update_app(self.app, 'Break the home page')
+
+        self.home.refresh_from_db()
+        self.prompt.refresh_from_db()
+        self.assertEqual(self.home.template_content, '<h1>Home</h1>')
+        self.assertEqual(self.prompt.status, 'FAILED')
+
+    def test_plan_ignores_unknown_pages(self):
+        generator = self._generator({})
+        plan = generator._normalize_update_plan(
+            {'pages': {'update': ['home', 'missing'], 'remove': ['stats'], 'queries': ['stats']}},
+            {'home', 'stats'}
+        )
+
+        self.assertEqual(plan['pages']['update'], ['home'])
+        self.assertEqual(plan['pages']['queries'], [])
+        self.assertEqual(plan['pages']['remove'], ['stats'])
+
+
+class StructuredOutputTests(GeneratorMixin, TestCase):
+    def test_mismatch_gets_one_repair_call(self):
+        generator = self._generator({'name_description': [
+            '{"name": "Todo"}',
+            '{"name": "Todo", "description": "Track tasks"}',
+        ]})
+
+        self.assertEqual(generator._get_app_name_and_description(), ('Todo', 'Track tasks'))
+        self.assertEqual(self.llm.usage['calls'], 2)
+
+    def test_unrepairable_output_raises(self):
+        generator = self._generator({'page_list': ['PAGE: Home', '{"pages": []}']})
+
+        with self.assertRaisesMessage(SchemaValidationError, '$.pages needs at least 1 item(s)'):
+            generator._get_page_list()
+        self.assertEqual(self.llm.usage['calls'], 2)
+
+    def test_skeleton_falls_back_to_separate_steps(self):
+        generator = self._generator({
+            'app_skeleton': ['{"name": "Todo"}'],
+            'name_description': ['{"name": "Todo", "description": "Track tasks"}'],
+            'data_tables': ['{"tables": []}'],
+            'page_list': ['{"pages": [{"name": "Home", "slug": "home", "description": "Start"}]}'],
+        })
+
+        name, description, tables, pages = generator._get_skeleton()
+
+        self.assertEqual((name, description, tables), ('Todo', 'Track tasks', []))
+        self.assertEqual(pages[0]['slug'], 'home')
+        # Fused call and its repair, then the three separate steps
+        self.assertEqual(self.llm.usage['calls'], 5)
+
+    def test_validate_reports_paths(self):
+        errors = validate(
+            {'tables': [{'table_name': 'tasks', 'columns': [{'key': 'done', 'value_type': 'boolean'}]}]},
+            STEP_SCHEMAS['data_tables']
+        )
+
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith('$.tables[0].columns[0].value_type should be one of'))
+        self.assertEqual(validate({'name': True}, {'properties': {'name': {'type': 'integer'}}}),
+                         ['$.name should be integer, not true'])
+
+    def test_anthropic_backend_forces_the_step_tool(self):
+        backend = AnthropicBackend(api_key='test')
+        backend.client = mock.Mock()
+        backend.client.beta.tools.messages.create.return_value = SimpleNamespace(
+            content=[SimpleNamespace(type='tool_use', input={'name': 'Todo', 'description': 'Track tasks'})],
+            usage=SimpleNamespace(input_tokens=40, output_tokens=12)
+        )
+
+        response = backend.call_structured('name_description', 'prompt', STEP_SCHEMAS['name_description'], max_tokens=100)
+
+        self.assertEqual(response.data, {'name': 'Todo', 'description': 'Track tasks'})
+        self.assertEqual(json.loads(response.text), response.data)
+        kwargs = backend.client.beta.tools.messages.create.call_args.kwargs
+        self.assertEqual(kwargs['tools'][0]['input_schema'], STEP_SCHEMAS['name_description'])
+        self.assertEqual(kwargs['extra_body'], {'tool_choice': {'type': 'tool', 'name': 'name_description'}})
+
+
+class LazyPageTests(AppFixtureMixin, TestCase):
+    def _generate(self):
+        self.llm = ReplayBackend(path=RECORDINGS_PATH)
+        generator = AppGenerator(self.organization, self.prompt, llm=self.llm, lazy_pages=True)
+        return generator, generator.generate_app()
+
+    def test_only_landing_page_is_generated_up_front(self):
+        generator, app = self._generate()
+
+        statuses = dict(app.pages.values_list('slug', 'status'))
+        self.assertEqual(statuses, {'tasks': 'READY', 'summary': 'PENDING'})
+        # Skeleton plus template, JavaScript and queries of one page
+        self.assertEqual(self.llm.usage['calls'], 4)
+
+        stub = app.pages.get(slug='summary')
+        self.assertEqual(stub.description, 'Overview of open work')
+        self.assertTrue(generator.generate_page(stub))
+        self.assertFalse(generator.generate_page(stub))
+        stub.refresh_from_db()
+        self.assertEqual(stub.status, 'READY')
+        self.assertTrue(stub.template_content)
+        self.assertEqual(self.llm.usage['calls'], 7)
+
+    def test_first_visit_queues_generation_once(self):
+        _, app = self._generate()
+        stub = app.pages.get(slug='summary')
+        self.client.force_login(self.user)
+        url = reverse('apps:render_page', args=[app.id, 'summary'])
+
+        with mock.patch('utils.scheduler.async_task') as async_task:
+            response = self.client.get(url)
+            self.client.get(url)
+
+        self.assertContains(response, 'This page is being generated')
+        self.assertContains(response, '1 of 2 pages')
+        async_task.assert_called_once_with(
+            'utils.tasks.generate_page_async', stub.id, self.user.id, q_options={'task_name': f'page-{stub.id}'}
+        )
+        status = self.client.get(reverse('apps:page_status', args=[stub.id])).json()
+        self.assertEqual(status, {'status': 'QUEUED', 'ready': 1, 'total': 2})
+
+
+class BatchGenerationTests(AppFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        UserProfile.get_or_create_profile(self.user).add_tokens(100)
+
+    def _client(self, recordings=None, polls=0):
+        if recordings is None:
+            with open(RECORDINGS_PATH, encoding='utf-8') as f:
+                recordings = json.load(f)
+        self.transport = LocalBatchTransport(ReplayBackend(recordings=recordings), polls=polls)
+        return BatchClient(api_key='test', base_url='http://batches.test', transport=self.transport)
+
+    def _run(self, client, **kwargs):
+        with mock.patch('utils.batches.schedule') as schedule:
+            batch = start_batch_generation(self.organization, self.user, client=client, **kwargs)
+            for _ in range(10):
+                if poll_generation_batch(batch.id, client=client).get('status') == 'DONE':
+                    break
+        batch.refresh_from_db()
+        return batch, schedule
+
+    def test_each_stage_is_one_batch_across_apps(self):
+        batch, schedule = self._run(self._client(polls=1), contents=['A todo app', 'A habit tracker'])
+
+        self.assertEqual((batch.stage, batch.status), ('DONE', 'DONE'))
+        # Skeletons, then templates, then scripts and queries of every page
+        self.assertEqual(len(self.transport.batches), 3)
+        self.assertEqual(self.transport.backend.usage['calls'], 2 + 2 * 2 + 2 * 2 * 2)
+        # Each stage is polled once while in progress and once after it ended
+        self.assertEqual(schedule.call_count, 6)
+
+        for item in batch.items.select_related('app', 'prompt'):
+            self.assertEqual((item.status, item.prompt.status, item.prompt.tokens_used), ('DONE', 'COMPLETED', 10))
+            self.assertEqual(set(item.app.pages.values_list('slug', 'status')), {('tasks', 'READY'), ('summary', 'READY')})
+            self.assertTrue(item.app.pages.get(slug='tasks').context_queries.exists())
+        self.assertEqual(UserProfile.objects.get(user=self.user).token_count, 80)
+
+    def test_invalid_output_fails_only_its_item(self):
+        with open(RECORDINGS_PATH, encoding='utf-8') as f:
+            recordings = json.load(f)
+        recordings['app_skeleton'].append('{"name": "Broken"}')
+
+        batch, _ = self._run(self._client(recordings), contents=['A todo app', 'A broken app'])
+
+        self.assertEqual(batch.status, 'DONE')
+        done, failed = batch.items.select_related('prompt')
+        self.assertEqual(done.status, 'DONE')
+        self.assertEqual((failed.status, failed.prompt.status, failed.app), ('FAILED', 'FAILED', None))
+        self.assertIn('app_skeleton', failed.error_message)
+
+    def test_failed_submit_fails_batch_and_refunds(self):
+        client = self._client()
+        with mock.patch.object(client, 'create', side_effect=BatchError('unavailable')), \
+                self.assertRaises(BatchError):
+            start_batch_generation(self.organization, self.user, contents=['A todo app'], apps=[self.app], client=client)
+
+        batch = GenerationBatch.objects.get()
+        self.assertEqual(batch.status, 'FAILED')
+        self.assertEqual(set(batch.items.values_list('status', flat=True)), {'FAILED'})
+        self.assertEqual(UserProfile.objects.get(user=self.user).token_count, 100)
+        # The regenerated app's own prompt is left alone
+        self.prompt.refresh_from_db()
+        self.assertNotEqual(self.prompt.status, 'FAILED')
+
+    def test_regenerates_existing_apps_in_place(self):
+        DataStore.objects.create(app=self.app, table_name='tasks', key='title', value='Keep me', value_type='str')
+
+        batch, _ = self._run(self._client(), apps=[self.app])
+
+        self.assertEqual(batch.items.get().status, 'DONE')
+        self.app.refresh_from_db()
+        self.assertEqual(self.app.version, 2)
+        self.assertEqual(set(self.app.pages.values_list('slug', flat=True)), {'tasks', 'summary'})
+        self.assertTrue(self.app.data_store.filter(value='Keep me').exists())
+        # Regenerations are not charged
+        self.assertEqual(UserProfile.objects.get(user=self.user).token_count, 100)
+        self.assertEqual(GenerationBatch.objects.count(), 1)
+
+
+@override_settings(PROMPT_MATCHING={'enabled': True, 'threshold': 0.5, 'gallery_organization': None})
+class PromptMatchingTests(AppFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.prompt.status = 'COMPLETED'
+        self.prompt.save()
+
+    def test_completed_prompts_are_indexed_and_matched(self):
+        self.assertTrue(PromptSignature.objects.filter(prompt=self.prompt).exists())
+        self.assertGreater(similarity(minhash('A simple todo app'), minhash('simple TODO application!')), 0.9)
+
+        [(app, score)] = find_similar(self.organization, 'a simple todo list')
+        self.assertEqual(app, self.app)
+        self.assertGreaterEqual(score, 0.5)
+        self.assertEqual(find_similar(self.organization, 'A recipe book'), [])
+
+        other = Organization.objects.create(name='Other', owner=self.user)
+        self.assertEqual(find_similar(other, 'a simple todo list'), [])
+        with override_settings(PROMPT_MATCHING={'threshold': 0.5, 'gallery_organization': self.organization.id}):
+            self.assertEqual(find_similar(other, 'a simple todo list')[0][0], self.app)
+
+    def test_backfill_indexes_older_prompts(self):
+        # update() sends no post_save, like prompts completed before matching existed
+        old = Prompt.objects.create(content='Habit tracker', user=self.user, organization=self.organization, tokens_used=0)
+        Prompt.objects.filter(id=old.id).update(status='COMPLETED')
+
+        self.assertEqual(index_prompts(), 1)
+        self.assertEqual(index_prompts(), 0)
+
+    def test_clone_copies_app_in_constant_queries(self):
+        DataStore.objects.create(app=self.app, table_name='tasks', key='title', value='Private', value_type='str')
+        with CaptureQueriesContext(connection) as first:
+            clone = clone_app(self.app, self.organization, self.user, 'todo app')
+
+        self.assertEqual((clone.name, clone.initial_prompt.status), ('Todo', 'COMPLETED'))
+        self.assertEqual(set(clone.pages.values_list('slug', flat=True)), {'home', 'stats'})
+        self.assertEqual(list(clone.pages.get(slug='home').context_queries.values_list('context_key', flat=True)), ['tasks'])
+        self.assertEqual(
+            set(clone.data_store.values_list('table_name', 'key', 'value')),
+            {('tasks', 'title', ''), ('tasks', 'done', '')}
+        )
+
+        for index in range(5):
+            page = AppPage.objects.create(app=self.app, name=f'Extra {index}', slug=f'extra-{index}', template_content='<p></p>')
+            ContextQuery.objects.create(page=page, context_key='tasks', query_content='[]')
+        with CaptureQueriesContext(connection) as second:
+            clone_app(self.app, self.organization, self.user, 'todo app')
+        self.assertEqual(len(first), len(second))
+
+    def test_generate_offers_match_before_generating(self):
+        self.client.force_login(self.user)
+        data = {'prompt': 'simple todo', 'organization_id': self.organization.id}
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+        with override_settings(LLM_BACKEND='replay'), mock.patch('utils.scheduler.async_task', return_value='task-id'):
+            offered = self.client.post(reverse('apps:generate'), data, **headers).json()
+            self.assertEqual(GenerationJob.objects.count(), 0)
+            self.assertEqual(offered['matches'][0]['app_id'], self.app.id)
+
+            cloned = self.client.post(offered['clone_url'], {**data, 'app_id': self.app.id}, **headers).json()
+            self.assertNotEqual(cloned['app_id'], self.app.id)
+            self.assertEqual(App.objects.get(id=cloned['app_id']).pages.count(), 2)
+
+            self.client.post(reverse('apps:generate'), {**data, 'skip_matches': '1'}, **headers)
+            self.assertEqual(GenerationJob.objects.count(), 1)
+
+        stranger = User.objects.create_user('stranger', 'stranger@example.com', 'password')
+        self.client.force_login(stranger)
+        response = self.client.post(reverse('apps:clone'), {**data, 'app_id': self.app.id}, **headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_cannot_match_or_clone_into_foreign_organization(self):
+        stranger = User.objects.create_user('stranger', 'stranger@example.com', 'password')
+        foreign = Organization.objects.create(name='Foreign', owner=stranger)
+        OrganizationMember.objects.create(organization=foreign, user=stranger, role='ADMIN')
+        self.client.force_login(self.user)
+        data = {'prompt': 'simple todo', 'organization_id': foreign.id}
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+        with override_settings(LLM_BACKEND='replay'):
+            response = self.client.post(reverse('apps:generate'), data, **headers)
+            self.assertEqual(response.status_code, 403)
+            response = self.client.post(reverse('apps:clone'), {**data, 'app_id': self.app.id}, **headers)
+            self.assertEqual(response.status_code, 403)
+        self.assertFalse(App.objects.filter(organization=foreign).exists())
+
+
+class BenchmarkHarnessTests(TestCase):
+    def test_scenarios_run_offline(self):
+        results = {result.name: result.as_dict() for result in run_benchmarks(rows=20, iterations=1)}
+
+        # The fused skeleton step replaces three calls
+        self.assertEqual(results['generate_app']['llm_calls'], 7)
+        self.assertEqual(results['generate_app_split']['llm_calls'], 9)
+        self.assertEqual(results['generate_app_lazy']['llm_calls'], 4)
+        self.assertLess(results['generate_app']['llm_input_tokens'], results['generate_app_split']['llm_input_tokens'])
+        self.assertIn('first_page_ms', results['generate_app'])
+        self.assertEqual(results['update_app']['llm_calls'], 2)
+        self.assertEqual(results['render_app_page']['llm_calls'], 0)
+        self.assertGreater(results['data_store_list']['db_queries'], 0)
+
+
+class LocalBrokerTests(TestCase):
+    def test_enqueue_dequeue_round_trip(self):
+        broker = LocalBroker(list_key='local-broker-test')
+        broker.enqueue('payload')
+
+        self.assertEqual(broker.dequeue(), [(None, 'payload')])
+        broker.enqueue('stale')
+        broker.purge_queue()
+        self.assertIsNone(broker.dequeue())
+
+
+@mock.patch('utils.scheduler.async_task', return_value='task-id')
+class SchedulerTests(AppFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user('other', 'other@example.com', 'password')
+        self.other_organization = Organization.objects.create(name='Globex', owner=self.other_user)
+
+    def test_identical_pending_prompts_are_deduplicated(self, async_task):
+        job, created = enqueue_generation(self.organization, self.user, 'A todo app')
+        duplicate, duplicate_created = enqueue_generation(self.organization, self.user, '  a TODO   app ')
+
+        self.assertTrue(created)
+        self.assertFalse(duplicate_created)
+        self.assertEqual(duplicate.id, job.id)
+        self.assertEqual(async_task.call_count, 1)
+
+    @mock.patch.dict('django.conf.settings.GENERATION_SCHEDULER', {'max_running': 3, 'org_max_running': 2})
+    def test_organization_cap_leaves_room_for_others(self, async_task):
+        jobs = [enqueue_generation(self.organization, self.user, f'App {i}')[0] for i in range(3)]
+        other_job, _ = enqueue_generation(self.other_organization, self.other_user, 'Other app')
+
+        statuses = [GenerationJob.objects.get(id=job.id).status for job in jobs]
+        self.assertEqual(statuses, ['RUNNING', 'RUNNING', 'QUEUED'])
+        self.assertEqual(GenerationJob.objects.get(id=other_job.id).status, 'RUNNING')
+
+    @mock.patch.dict('django.conf.settings.GENERATION_SCHEDULER', {'max_running': 1})
+    def test_updates_are_dispatched_before_generations(self, async_task):
+        first, _ = enqueue_generation(self.organization, self.user, 'First app')
+        generation, _ = enqueue_generation(self.other_organization, self.other_user, 'Second app')
+        update, _ = enqueue_update(self.app, self.user, 'Add a button')
+
+        GenerationJob.objects.filter(id=first.id).update(status='DONE')
+        dispatch()
+
+        self.assertEqual(GenerationJob.objects.get(id=update.id).status, 'RUNNING')
+        self.assertEqual(GenerationJob.objects.get(id=generation.id).status, 'QUEUED')
+        self.assertEqual(queue_metrics()['generate']['queued'], 1)
+
+    @mock.patch.dict('django.conf.settings.GENERATION_SCHEDULER', {'max_running': 4, 'org_max_running': 2})
+    def test_long_queue_does_not_hide_other_organizations(self, async_task):
+        GenerationJob.objects.bulk_create([
+            GenerationJob(
+                kind='UPDATE', organization=self.organization, user=self.user, app=self.app, content_hash=f'{i}'
+            )
+            for i in range(600)
+        ])
+        other_job, _ = enqueue_generation(self.other_organization, self.other_user, 'Other app')
+
+        self.assertEqual(GenerationJob.objects.get(id=other_job.id).status, 'RUNNING')
+        self.assertEqual(GenerationJob.objects.filter(organization=self.organization, status='RUNNING').count(), 2)
+
+    def test_concurrent_duplicate_cannot_be_queued(self, async_task):
+        job, _ = enqueue_generation(self.organization, self.user, 'A todo app')
+
+        # What a concurrent enqueue that missed the existing job would insert
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            GenerationJob.objects.create(
+                kind='GENERATE', organization=self.organization, user=self.user, content_hash=job.content_hash
+            )
+
+        GenerationJob.objects.filter(id=job.id).update(status='DONE')
+        _, created = enqueue_generation(self.organization, self.user, 'A todo app')
+        self.assertTrue(created)
+
+    def test_members_with_the_same_prompt_get_their_own_jobs(self, async_task):
+        member = User.objects.create_user('member', 'member@example.com', 'password')
+        OrganizationMember.objects.create(organization=self.organization, user=member, role='MEMBER')
+        job, _ = enqueue_generation(self.organization, self.user, 'A todo app')
+        member_job, created = enqueue_generation(self.organization, member, 'A todo app')
+
+        self.assertTrue(created)
+        self.assertNotEqual(member_job.prompt_id, job.prompt_id)
+        self.client.force_login(member)
+        response = self.client.get(reverse('apps:check_generation', args=[member_job.prompt_id]))
+        self.assertEqual(response.status_code, 200)
+
+
+class ListingTests(AppFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def _add_organizations(self, count):
+        for i in range(count):
+            organization = Organization.objects.create(name=f'Org {i}', owner=self.user)
+            OrganizationMember.objects.create(organization=organization, user=self.user, role='ADMIN')
+            member = User.objects.create(username=f'member{i}')
+            OrganizationMember.objects.create(organization=organization, user=member, role='VIEWER')
+            app = App.objects.create(
+                organization=organization, name=f'App {i}', description='', initial_prompt=self.prompt
+            )
+            AppPage.objects.create(app=app, name='Home', slug='home', template_content='<h1>Home</h1>')
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_independent_of_listing_size(self):
+        urls = [reverse('organizations:list'), reverse('apps:list')]
+        before = [self._count_queries(url)[0] for url in urls]
+
+        self._add_organizations(5)
+        after = [self._count_queries(url) for url in urls]
+
+        self.assertEqual([count for count, _ in after], before)
+        self.assertContains(after[0][1], '2 members')
+        self.assertContains(after[1][1], '1 page')
+
+    def test_app_list_search_and_pagination(self):
+        self._add_organizations(30)
+        url = reverse('apps:list')
+
+        self.assertEqual(len(self.client.get(url, {'page': 2}).context['page_obj']), 7)
+        page = self.client.get(url, {'q': 'Org 1'}).context['page_obj']
+        self.assertEqual(sorted(app.name for app in page), ['App 1'] + [f'App {i}' for i in range(10, 20)])
+        self.assertEqual(page[0].role, 'ADMIN')
+
+
+class DirtyFieldsTests(AppFixtureMixin, TestCase):
+    def _writes(self, queries, table):
+        return [q['sql'] for q in queries.captured_queries if q['sql'].startswith(f'UPDATE "{table}"')]
+
+    def test_login_leaves_profile_alone(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.client.login(username='owner', password='password'))
+
+        self.assertFalse([q for q in queries.captured_queries if 'users_userprofile' in q['sql']])
+        self.assertEqual(len(self._writes(queries, 'auth_user')), 1)
+
+    def test_only_changed_fields_are_written(self):
+        prompt = Prompt.objects.get(id=self.prompt.id)
+        with CaptureQueriesContext(connection) as queries:
+            prompt.save()
+            prompt.status = 'PROCESSING'
+            prompt.save()
+            prompt.save()
+
+        writes = self._writes(queries, 'anything_apps_prompt')
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"status"', writes[0])
+        self.assertNotIn('"content"', writes[0])
+        self.assertEqual(Prompt.objects.get(id=prompt.id).status, 'PROCESSING')
+
+    def test_generation_status_flips_are_narrow(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = generate_app_async(self.organization.id, self.prompt.id, self.user.id)
+
+        self.assertEqual(result, {'error': 'Insufficient tokens'})
+        writes = self._writes(queries, 'anything_apps_prompt')
+        self.assertEqual(len(writes), 2)
+        for sql in writes:
+            self.assertNotIn('"content"', sql)
+            self.assertNotIn('"tokens_used"', sql)
+
+        # Fields set by the save() override are written too
+        app = App.objects.get(id=self.app.id)
+        app.css_content = 'body { color: red; }'
+        with CaptureQueriesContext(connection) as queries:
+            app.save()
+        writes = self._writes(queries, 'anything_apps_app')
+        self.assertIn('"css_digest"', writes[0])
+        self.assertNotIn('"description"', writes[0])
+
+
+class DashboardTests(AppFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse('apps:dashboard_summary')
+
+    def test_fresh_summary_is_one_row_lookup(self):
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+
+        self.assertContains(response, 'Todo')
+        app_queries = [q['sql'] for q in queries.captured_queries if 'anything_' in q['sql']]
+        self.assertEqual(len(app_queries), 1)
+        self.assertIn('anything_apps_dashboardsummary', app_queries[0])
+
+    def test_writes_adjust_counters_and_new_apps_mark_stale(self):
+        self.assertEqual(self.client.get(self.url).json()['app_count'], 1)
+
+        self.client.post(
+            reverse('apps:data_store_create', args=[self.app.id]),
+            json.dumps({'table_name': 'tasks', 'key': 'title', 'value': 'Buy milk', 'value_type': 'str'}),
+            content_type='application/json'
+        )
+        with mock.patch('utils.scheduler.dispatch'):
+            enqueue_update(self.app, self.user, 'Add a button')
+        App.objects.create(organization=self.organization, name='Notes', description='', initial_prompt=self.prompt)
+
+        summary = self.client.get(self.url).json()
+        self.assertEqual(summary['data_writes'], 1)
+        self.assertEqual(summary['running_generations'], 1)
+        self.assertEqual(summary['app_count'], 2)
+        self.assertEqual(summary['recent_apps'][0]['name'], 'Notes')
+
+
+class CacheTests(AppFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_invalidate_drops_namespace(self):
+        get_or_set('test-namespace', 'entry', producer=lambda: 'first')
+        self.assertEqual(get_or_set('test-namespace', 'entry', producer=lambda: 'second'), 'first')
+
+        invalidate('test-namespace')
+
+        self.assertEqual(get_or_set('test-namespace', 'entry', producer=lambda: 'third'), 'third')
+        self.assertGreater(cache_stats()['entry']['hits'], 0)
+
+    def test_data_store_list_cached_until_data_changes(self):
+        url = reverse('apps:data_store_list', args=[self.app.id])
+        self.client.get(url, {'table_name': 'tasks'})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'table_name': 'tasks'})
+        # Only the version aggregate; the page itself comes from the cache
+        data_queries = [q['sql'] for q in queries.captured_queries if 'anything_apps_datastore' in q['sql']]
+        self.assertEqual(len(data_queries), 1)
+        self.assertIn('MAX', data_queries[0])
+
+        DataStore.objects.create(app=self.app, table_name='tasks', key='title', value='New task', value_type='str')
+
+        self.assertEqual(self.client.get(url, {'table_name': 'tasks'}).json()['total'], 3)
+
+    def test_rendered_page_keyed_by_query_string_and_page_version(self):
+        self.home.template_content = 'Page {{ request.GET.page }}'
+        self.home.save()
+        url = reverse('apps:render_page', args=[self.app.id, 'home'])
+
+        self.assertContains(self.client.get(url, {'page': 1}), 'Page 1')
+        self.assertContains(self.client.get(url, {'page': 2}), 'Page 2')
+
+        # Saved elsewhere: no invalidation reaches this process's cache
+        AppPage.objects.filter(id=self.home.id).update(
+            template_content='Changed {{ request.GET.page }}', updated_at=timezone.now()
+        )
+        self.assertContains(self.client.get(url, {'page': 1}), 'Changed 1')
+
+class ConditionalRequestTests(AppFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_page_revalidates_until_data_changes(self):
+        url = reverse('apps:render_page', args=[self.app.id, 'home'])
+        etag = self.client.get(url)['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        DataStore.objects.create(app=self.app, table_name='tasks', key='title', value='New task', value_type='str')
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_data_store_detail_honors_last_modified(self):
+        item = DataStore.objects.create(app=self.app, table_name='tasks', key='title', value='Task', value_type='str')
+        url = reverse('apps:data_store_detail', args=[self.app.id, item.id])
+        response = self.client.get(url)
+
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_data_store_list_revalidates_after_write_from_another_process(self):
+        url = reverse('apps:data_store_list', args=[self.app.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # update() sends no signals, like a write whose invalidation stayed in another process
+        DataStore.objects.filter(app=self.app, key='title').update(value='Renamed', updated_at=timezone.now())
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed', [item['value'] for item in response.json()['items']])
+
+class AppAssetTests(AppFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.app.css_content = '/* theme */\nbody {\n    color : red;\n}\n'
+        self.app.save(update_fields=['css_content'])
+
+    def test_css_published_once_and_linked_from_page(self):
+        self.app.refresh_from_db()
+        asset = AppAsset.objects.get(digest=self.app.css_digest)
+        self.assertEqual(asset.content, 'body{color:red}')
+
+        self.app.save()
+        self.assertEqual(AppAsset.objects.count(), 1)
+
+        response = self.client.get(reverse('apps:render_page', args=[self.app.id, 'home']))
+        self.assertContains(response, reverse('apps:asset', args=[self.app.css_digest, 'css']))
+        self.assertNotContains(response, 'color:red')
+
+    def test_asset_served_precompressed_and_immutable(self):
+        self.app.refresh_from_db()
+        url = reverse('apps:asset', args=[self.app.css_digest, 'css'])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(gzip.decompress(response.content), b'body{color:red}')
+
+
+class CompressionTests(AppFixtureMixin, TestCase):
+    def test_minify_html_keeps_whitespace_sensitive_blocks(self):
+        html = '<div>\n    <!-- note -->\n    <b>a</b>   <i>b</i>\n    <pre>  x\n  y</pre>\n</div>\n'
+
+        self.assertEqual(minify_html(html), '<div>\n<b>a</b> <i>b</i>\n<pre>  x\n  y</pre>\n</div>')
+
+    def test_page_gzipped_when_accepted(self):
+        self.client.force_login(self.user)
+        url = reverse('apps:render_page', args=[self.app.id, 'home'])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'<h1>Home</h1>', gzip.decompress(response.content))
+        self.assertNotIn('Content-Encoding', self.client.get(url))
+
+    def test_brotli_middleware_skipped_without_package(self):
+        with mock.patch('anything.middleware.brotli', None):
+            with self.assertRaises(MiddlewareNotUsed):
+                BrotliMiddleware(lambda request: None)
+
+
+class DatabaseProfileTests(AppFixtureMixin, TestCase):
+    postgres_env = {'DB_ENGINE': 'postgresql', 'DB_NAME': 'anything', 'DB_POOLER': 'pgbouncer'}
+
+    def _postgres_sql(self, queryset):
+        # An unconnected PostgreSQL backend compiles the queries without a server
+        postgres = PostgresDatabaseWrapper(database_config(Path('/tmp'), self.postgres_env), alias='default')
+        with mock.patch('anything_apps.models.connections', {'default': postgres}):
+            queryset = queryset()
+        return queryset.query.get_compiler(connection=postgres).as_sql()[0]
+
+    def test_postgres_profile_from_environment(self):
+        config = database_config(Path('/tmp'), self.postgres_env)
+
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(database_config(Path('/tmp'), {})['ENGINE'], 'django.db.backends.sqlite3')
+        with self.assertRaises(ImproperlyConfigured):
+            database_config(Path('/tmp'), {'DB_ENGINE': 'oracle'})
+
+    def test_sqlite_pragmas_applied_on_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout = cursor.fetchone()[0]
+            cursor.execute('PRAGMA synchronous')
+            synchronous = cursor.fetchone()[0]
+
+        self.assertEqual(busy_timeout, 5000)
+        self.assertEqual(synchronous, 1)  # NORMAL
+        self.assertEqual(sqlite_pragmas({'DB_SQLITE_TUNING': 'false'}), {})
+
+    def test_postgres_uses_distinct_on_for_columns(self):
+        sql = self._postgres_sql(lambda: self.app.data_store.columns())
+
+        self.assertIn('DISTINCT ON', sql)
+        self.assertEqual(list(self.app.data_store.columns()), [('tasks', 'done', 'bool'), ('tasks', 'title', 'str')])
+
+    def test_page_with_total_uses_one_query(self):
+        for i in range(5):
+            DataStore.objects.create(app=self.app, table_name='tasks', key='title', value=f'Task {i}', value_type='str')
+
+        with self.assertNumQueries(1):
+            rows, total = self.app.data_store.exclude(value='').order_by('id').page_with_total(2, 2)
+
+        self.assertEqual(total, 5)
+        self.assertEqual([row.value for row in rows], ['Task 2', 'Task 3'])
+        self.assertEqual(self.app.data_store.page_with_total(50, 2), ([], 7))
@@ -7,11 +7,17 @@ urlpatterns = [
     path('', views.app_list, name='list'),
     path('<int:app_id>/', views.app_detail, name='detail'),
     path('generate/', views.generate_app, name='generate'),
+    path('clone/', views.clone_app_view, name='clone'),
     path('<int:app_id>/update/', views.app_update, name='update'),
     path('status/generation/<int:prompt_id>/', views.check_generation_status, name='check_generation'),
     path('status/update/<int:update_id>/', views.check_update_status, name='check_update'),
+    path('status/queue/', views.queue_status, name='queue_status'),
+    path('status/cache/', views.cache_status, name='cache_status'),
+    path('api/dashboard/', views.dashboard_summary, name='dashboard_summary'),
     path('<int:app_id>/pages/<slug:page_slug>/', views.render_app_page, name='render_page'),
     path('api/pages/<int:page_id>/', views.page_details_api, name='page_details_api'),
+    path('api/pages/<int:page_id>/status/', views.page_status, name='page_status'),
+    path('assets/<str:digest>.<str:kind>', views.app_asset, name='asset'),
     
     # DataStore API endpoints
     path('api/<int:app_id>/data-store/', api.data_store_list, name='data_store_list'),
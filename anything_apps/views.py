@@ -1,37 +1,58 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
-from django_q.tasks import async_task
-from .models import App, Prompt, PromptUpdate, AppPage
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
+from .models import App, AppAsset, Prompt, PromptUpdate, AppPage, prompt_namespace, prompt_update_namespace
 from anything_org.models import Organization, OrganizationMember
-from utils.tasks import generate_app_async
+from anything_org.access import CREATOR_ROLES, MANAGER_ROLES, app_member_required, get_role, page_member_required
+from utils.assets import CONTENT_TYPES, negotiate_encoding
+from utils.cache import app_namespace, get_or_set, namespace_version
+from utils.cache import stats as cache_stats
+from utils.cloning import clone_app
+from utils.http import make_etag
+from utils.queries import paginate
+from utils.rollups import as_dict as summary_dict, summary_for
+from utils.similarity import find_similar
+from utils.scheduler import enqueue_generation, enqueue_page_generation, enqueue_update, queue_metrics
 from django.urls import reverse
 from django.conf import settings
 from django.core.exceptions import PermissionDenied
+from django.db.models import Count, Q
 import logging
 
+APPS_PER_PAGE = 24
+
 @login_required
 def app_list(request):
     """View to list user's apps across all organizations."""
-    user_orgs = request.user.organizations.all()
-    apps = App.objects.filter(organization__in=user_orgs).select_related('organization')
+    query = request.GET.get('q', '').strip()
+    apps = App.objects.for_user(request.user)
+    if query:
+        apps = apps.search(query)
     
     return render(request, 'apps/list.html', {
-        'apps': apps
+        **paginate(request, apps, APPS_PER_PAGE),
+        'query': query
     })
 
 @login_required
-def app_detail(request, app_id):
+def dashboard(request):
+    """Dashboard rendered from the user's precomputed summary row."""
+    return render(request, 'dashboard/index.html', {
+        'summary': summary_dict(summary_for(request.user))
+    })
+
+@login_required
+def dashboard_summary(request):
+    """JSON version of the dashboard summary, for polling."""
+    return JsonResponse(summary_dict(summary_for(request.user)))
+
+@login_required
+@app_member_required()
+def app_detail(request, app):
     """View to show app details."""
-    app = get_object_or_404(App, id=app_id)
-    
-    # Check if user has access to the app
-    if not app.organization.organizationmember_set.filter(user=request.user).exists():
-        messages.error(request, 'You do not have access to this app.')
-        return redirect('app_list')
-    
     return render(request, 'apps/detail.html', {
         'app': app,
         'pages': app.pages.all(),
@@ -46,7 +67,7 @@ def generate_app(request):
         return JsonResponse({'error': 'Invalid request'}, status=400)
     
     # Check for API key
-    if not settings.ANTHROPIC_API_KEY:
+    if settings.LLM_BACKEND == 'anthropic' and not settings.ANTHROPIC_API_KEY:
         return JsonResponse({
             'error': 'Anthropic API key not configured. Please set the ANTHROPIC_API_KEY environment variable.',
             'message': 'Server configuration error'
@@ -59,46 +80,34 @@ def generate_app(request):
         return JsonResponse({'error': 'Prompt is required'}, status=400)
     
     try:
-        # Get or use default organization
-        if org_id:
-            organization = get_object_or_404(Organization, id=org_id)
-        else:
-            organization = request.user.owned_organizations.first()
-            if not organization:
-                # Create a default organization for the user if none exists
-                organization = Organization.objects.create(
-                    name=f"{request.user.username}'s Organization",
-                    owner=request.user
-                )
-                OrganizationMember.objects.create(
-                    organization=organization,
-                    user=request.user,
-                    role='ADMIN'
-                )
-        
-        # Create prompt
-        prompt = Prompt.objects.create(
-            content=prompt_content,
-            user=request.user,
-            organization=organization,
-            tokens_used=0,
-            status='PENDING'
-        )
-        
-        # Start async task
-        task_id = async_task(
-            generate_app_async,
-            organization.id,
-            prompt.id,
-            request.user.id
-        )
+        organization = _target_organization(request, org_id)
+        if organization is None:
+            return JsonResponse({'error': 'Permission denied'}, status=403)
+
+        # Offer copies of similar existing apps first, unless declined
+        if settings.PROMPT_MATCHING.get('enabled') and not request.POST.get('skip_matches'):
+            matches = find_similar(organization, prompt_content)
+            if matches:
+                return JsonResponse({
+                    'success': True,
+                    'message': 'Similar apps already exist',
+                    'matches': [
+                        {'app_id': app.id, 'name': app.name, 'description': app.description, 'similarity': round(score, 2)}
+                        for app, score in matches
+                    ],
+                    'clone_url': reverse('apps:clone')
+                })
+
+        # Queue the generation; identical pending prompts share one job
+        job, created = enqueue_generation(organization, request.user, prompt_content)
         
         return JsonResponse({
             'success': True,
-            'message': 'App generation started',
-            'prompt_id': prompt.id,
-            'task_id': task_id,
-            'redirect_url': reverse('apps:check_generation', args=[prompt.id])
+            'message': 'App generation started' if created else 'An identical app generation is already in progress',
+            'prompt_id': job.prompt_id,
+            'task_id': job.task_id,
+            'queued': job.status == 'QUEUED',
+            'redirect_url': reverse('apps:check_generation', args=[job.prompt_id])
         })
         
     except Exception as e:
@@ -107,17 +116,64 @@ def generate_app(request):
             'message': 'Failed to start app generation'
         }, status=500)
 
+def _target_organization(request, org_id):
+    """
+    The organization a new app goes into: the given one, or the user's own
+    (created if missing). None if the user may not create apps in the given
+    organization.
+    """
+    if org_id:
+        if not str(org_id).isdigit() or get_role(request, int(org_id)) not in CREATOR_ROLES:
+            return None
+        return Organization.objects.filter(id=org_id).first()
+    organization = request.user.owned_organizations.first()
+    if not organization:
+        # Create a default organization for the user if none exists
+        organization = Organization.objects.create(
+            name=f"{request.user.username}'s Organization",
+            owner=request.user
+        )
+        OrganizationMember.objects.create(
+            organization=organization,
+            user=request.user,
+            role='ADMIN'
+        )
+    return organization
+
+@login_required
+@require_http_methods(['POST'])
+def clone_app_view(request):
+    """View to create an app as a copy of a similar one offered by ``generate_app``."""
+    if not request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+
+    prompt_content = request.POST.get('prompt')
+    app_id = request.POST.get('app_id')
+    if not prompt_content or not app_id:
+        return JsonResponse({'error': 'Prompt and app are required'}, status=400)
+
+    # Only apps of the user's organizations, or gallery apps, can be copied
+    source = App.objects.filter(id=app_id).first()
+    if source is None or (
+        source.organization_id != settings.PROMPT_MATCHING.get('gallery_organization')
+        and get_role(request, source.organization_id) is None
+    ):
+        return JsonResponse({'error': 'App not found'}, status=404)
+
+    organization = _target_organization(request, request.POST.get('organization_id'))
+    if organization is None:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    app = clone_app(source, organization, request.user, prompt_content)
+    return JsonResponse({
+        'success': True,
+        'app_id': app.id,
+        'redirect_url': reverse('apps:detail', args=[app.id])
+    })
+
 @login_required
-def app_update(request, app_id):
+@app_member_required(roles=MANAGER_ROLES, message='You do not have permission to update this app.')
+def app_update(request, app):
     """View to handle app updates."""
-    app = get_object_or_404(App, id=app_id)
-    
-    # Check if user has permission to update
-    member = app.organization.organizationmember_set.filter(user=request.user).first()
-    if not member or member.role not in ['ADMIN', 'OWNER']:
-        messages.error(request, 'You do not have permission to update this app.')
-        return redirect('app_detail', app_id=app_id)
-    
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         update_content = request.POST.get('prompt')
         
@@ -125,31 +181,19 @@ def app_update(request, app_id):
             return JsonResponse({'error': 'Update prompt is required'}, status=400)
         
         try:
-            # Create prompt update
-            prompt_update = PromptUpdate.objects.create(
-                original_prompt=app.initial_prompt,
-                update_content=update_content,
-                tokens_used=0,
-                status='PENDING'
-            )
-            
             # Update app status
             app.status = 'UPDATING'
             app.save()
             
-            # Start async task
-            task_id = async_task(
-                'utils.tasks.update_app_async',
-                app.id,
-                prompt_update.id,
-                request.user.id
-            )
+            # Queue the update; an identical pending update shares one job
+            job, created = enqueue_update(app, request.user, update_content)
             
             return JsonResponse({
                 'success': True,
-                'message': 'App update started',
-                'update_id': prompt_update.id,
-                'task_id': task_id
+                'message': 'App update started' if created else 'An identical app update is already in progress',
+                'update_id': job.prompt_update_id,
+                'task_id': job.task_id,
+                'queued': job.status == 'QUEUED'
             })
             
         except Exception as e:
@@ -163,70 +207,175 @@ def app_update(request, app_id):
 @login_required
 def check_generation_status(request, prompt_id):
     """View to check the status of app generation."""
-    prompt = get_object_or_404(Prompt, id=prompt_id)
+    def load_status():
+        prompt = get_object_or_404(Prompt, id=prompt_id)
+        return {
+            'user_id': prompt.user_id,
+            'status': {
+                'status': prompt.status,
+                'error_message': prompt.error_message,
+                'tokens_used': prompt.tokens_used,
+                'app_id': prompt.created_apps.first().id if prompt.status == 'COMPLETED' else None
+            }
+        }
     
-    if prompt.user != request.user:
+    # Polled frequently; cached until the prompt or its app changes
+    cached = get_or_set(prompt_namespace(prompt_id), 'status', producer=load_status)
+    if cached['user_id'] != request.user.id:
         return JsonResponse({'error': 'Permission denied'}, status=403)
     
-    return JsonResponse({
-        'status': prompt.status,
-        'error_message': prompt.error_message,
-        'tokens_used': prompt.tokens_used,
-        'app_id': prompt.created_apps.first().id if prompt.status == 'COMPLETED' else None
-    })
+    return JsonResponse(cached['status'])
 
 @login_required
 def check_update_status(request, update_id):
     """View to check the status of app update."""
-    update = get_object_or_404(PromptUpdate, id=update_id)
+    def load_status():
+        update = get_object_or_404(PromptUpdate.objects.select_related('original_prompt'), id=update_id)
+        return {
+            'user_id': update.original_prompt.user_id,
+            'status': {
+                'status': update.status,
+                'error_message': update.error_message,
+                'tokens_used': update.tokens_used
+            }
+        }
     
-    if update.original_prompt.user != request.user:
+    cached = get_or_set(prompt_update_namespace(update_id), 'status', producer=load_status)
+    if cached['user_id'] != request.user.id:
         return JsonResponse({'error': 'Permission denied'}, status=403)
     
-    return JsonResponse({
-        'status': update.status,
-        'error_message': update.error_message,
-        'tokens_used': update.tokens_used
-    })
+    return JsonResponse(cached['status'])
 
 @login_required
-def render_app_page(request, app_id, page_slug):
-    """View to render a specific app page."""
-    app = get_object_or_404(App, id=app_id)
-    page = get_object_or_404(AppPage, app=app, slug=page_slug)
+def queue_status(request):
+    """Staff-only view of generation queue depth and wait times."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
     
-    # Check if user has access to this app
-    if not app.organization.organizationmember_set.filter(user=request.user).exists():
-        messages.error(request, 'You do not have permission to view this app.')
-        return redirect('apps:list')
+    return JsonResponse(get_or_set('queue', 'status', producer=queue_metrics))
+
+@login_required
+def cache_status(request):
+    """Staff-only view of cache hit rates in this process."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    return JsonResponse(cache_stats())
+
+def _page_etag(request, page):
+    # Pending flash messages are part of the body, so never answer 304 then
+    if len(messages.get_messages(request)):
+        return None
+    return make_etag(
+        page.id, page.updated_at, page.app.updated_at,
+        namespace_version(app_namespace(page.app_id)), request.user.id
+    )
+
+@login_required
+@page_member_required(message='You do not have permission to view this app.')
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_page_etag)
+def render_app_page(request, page):
+    """View to render a specific app page."""
+    app = page.app
+
+    if page.status != 'READY':
+        # Stubbed by lazy generation: queue it and show a placeholder shell
+        enqueue_page_generation(page, request.user)
+        return render(request, 'apps/page_pending.html', {
+            'app': app,
+            'page': page,
+            'progress': _page_progress(page)
+        })
     
     try:
         # Render the page with its contexts
-        rendered_content = page.render(request)
+        rendered_content = page.render_cached(request)
         
         return render(request, 'apps/dynamic_page.html', {
             'app': app,
             'page': page,
-            'rendered_content': rendered_content,
-            'custom_js': page.js_content
+            'rendered_content': rendered_content
         })
         
     except Exception as e:
         messages.error(request, f'Error rendering page: {str(e)}')
-        return redirect('apps:detail', app_id=app_id)
+        return redirect('apps:detail', app_id=app.id)
+
+def _page_progress(page) -> dict:
+    counts = page.app.pages.aggregate(total=Count('id'), ready=Count('id', filter=Q(status='READY')))
+    return {'status': page.status, 'ready': counts['ready'], 'total': counts['total']}
+
+@login_required
+def page_status(request, page_id):
+    """Generation progress of a page and its app, polled by the placeholder shell."""
+    page = AppPage.objects.select_related('app').filter(id=page_id).first()
+    if page is None or get_role(request, page.app.organization_id) is None:
+        return JsonResponse({'error': 'Page not found'}, status=404)
+    return JsonResponse(_page_progress(page))
+
+@login_required
+@require_http_methods(['GET', 'HEAD'])
+def app_asset(request, digest, kind):
+    """Serve a generated CSS/JS asset; its URL changes whenever its content does."""
+    if kind not in CONTENT_TYPES:
+        raise Http404('Unknown asset type')
+    asset = AppAsset.objects.filter(digest=digest, kind=kind).values(
+        'content', 'gzip_content', 'brotli_content'
+    ).first()
+    if asset is None:
+        raise Http404('Asset not found')
+    
+    encoding = negotiate_encoding(
+        request.headers.get('Accept-Encoding', ''),
+        brotli_available=asset['brotli_content'] is not None
+    )
+    if encoding == 'br':
+        response = HttpResponse(bytes(asset['brotli_content']), content_type=CONTENT_TYPES[kind])
+    elif encoding == 'gzip':
+        response = HttpResponse(bytes(asset['gzip_content']), content_type=CONTENT_TYPES[kind])
+    else:
+        response = HttpResponse(asset['content'], content_type=CONTENT_TYPES[kind])
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+def _page_details_target(request, page_id):
+    """The page for page_details_api, loaded once per request; None if missing."""
+    if not hasattr(request, '_page_details_target'):
+        request._page_details_target = AppPage.objects.select_related('app').filter(id=page_id).first()
+    return request._page_details_target
+
+def _page_details_etag(request, page_id):
+    page = _page_details_target(request, page_id)
+    if not page or get_role(request, page.app.organization_id) is None:
+        return None
+    return make_etag(page.id, page.updated_at, page.app.updated_at, namespace_version(app_namespace(page.app_id)))
+
+def _page_details_last_modified(request, page_id):
+    page = _page_details_target(request, page_id)
+    if not page or get_role(request, page.app.organization_id) is None:
+        return None
+    return max(page.updated_at, page.app.updated_at)
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_page_details_etag, last_modified_func=_page_details_last_modified)
 def page_details_api(request, page_id):
     """API endpoint to get page details."""
     logger = logging.getLogger(__name__)
     logger.info(f"Fetching page details for page_id: {page_id}")
     
     try:
-        page = AppPage.objects.get(id=page_id)
+        page = _page_details_target(request, page_id)
+        if page is None:
+            raise AppPage.DoesNotExist
         logger.info(f"Found page: {page.name} (id: {page.id})")
         
         # Check if user has access to the app through organization membership
-        has_access = page.app.organization.organizationmember_set.filter(user=request.user).exists()
+        has_access = get_role(request, page.app.organization_id) is not None
         logger.info(f"User {request.user.username} has access to app: {has_access}")
         
         if not has_access:
@@ -0,0 +1,158 @@
+"""
+Cached organization membership lookups and access decorators.
+
+A user's memberships (organization id -> role) are loaded in one query,
+kept on the request for its lifetime and in the cache for a short TTL, so
+repeated authorization checks cost no queries. Cached entries are dropped
+whenever one of the user's memberships is saved or deleted.
+"""
+from functools import wraps
+from django.contrib import messages
+from django.db.models import OuterRef, Subquery
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect
+from anything_apps.models import App, AppPage
+from utils.cache import get_or_set, invalidate, user_namespace
+from .models import Organization, OrganizationMember
+
+MANAGER_ROLES = ['ADMIN', 'OWNER']
+# Roles that may create apps in an organization
+CREATOR_ROLES = MANAGER_ROLES + ['MEMBER']
+
+
+def get_memberships(request) -> dict:
+    """Return ``{organization_id: role}`` for the request's user."""
+    memberships = getattr(request, '_org_memberships', None)
+    if memberships is not None:
+        return memberships
+
+    memberships = get_or_set(
+        user_namespace(request.user.id), 'memberships',
+        producer=lambda: dict(
+            OrganizationMember.objects.filter(user_id=request.user.id)
+            .values_list('organization_id', 'role')
+        )
+    )
+
+    request._org_memberships = memberships
+    return memberships
+
+
+def get_role(request, organization_id: int):
+    """Return the user's role in the organization, or None if not a member."""
+    return get_memberships(request).get(organization_id)
+
+
+def invalidate_memberships(*user_ids):
+    """Drop cached memberships for the given users."""
+    invalidate(*(user_namespace(user_id) for user_id in user_ids))
+
+
+def _deny(request, api: bool, message: str, redirect_to: str, status: int = 403):
+    if api:
+        return JsonResponse({'error': 'Permission denied'}, status=status)
+    messages.error(request, message)
+    return redirect(redirect_to)
+
+
+def app_member_required(roles: list = None, api: bool = False, message: str = 'You do not have access to this app.'):
+    """
+    Resolve ``app_id`` to an ``App`` the user may access.
+
+    The view is called with ``app`` instead of ``app_id``, and the user's
+    role is available as ``request.membership_role``. ``roles`` restricts
+    access to specific roles; ``api`` returns JSON errors instead of
+    redirecting with a message.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, app_id, *args, **kwargs):
+            try:
+                app = App.objects.get(id=app_id)
+            except App.DoesNotExist:
+                if api:
+                    return JsonResponse({'error': 'App not found'}, status=404)
+                raise Http404('App not found')
+
+            role = get_role(request, app.organization_id)
+            if role is None or (roles and role not in roles):
+                return _deny(request, api, message, 'apps:list')
+
+            request.membership_role = role
+            return view_func(request, app, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def resolve_app_page(request, app_id: int, page_slug: str):
+    """
+    Load a page, its app, the user's role and ordered context queries.
+
+    The page, app and role come back in one query (the role as a subquery
+    annotation, ``page.membership_role``) and the context queries in a
+    second, prefetched one. Raises ``AppPage.DoesNotExist``.
+    """
+    role = OrganizationMember.objects.filter(
+        organization_id=OuterRef('app__organization_id'),
+        user_id=request.user.id
+    ).values('role')[:1]
+    return (
+        AppPage.objects
+        .select_related('app')
+        .prefetch_related('context_queries')
+        .annotate(membership_role=Subquery(role))
+        .get(app_id=app_id, slug=page_slug)
+    )
+
+
+def page_member_required(roles: list = None, message: str = 'You do not have access to this app.'):
+    """
+    Resolve ``app_id`` and ``page_slug`` with ``resolve_app_page``.
+
+    The view is called with ``page`` (its ``app`` already loaded) instead of
+    ``app_id`` and ``page_slug``.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, app_id, page_slug, *args, **kwargs):
+            try:
+                page = resolve_app_page(request, app_id, page_slug)
+            except AppPage.DoesNotExist:
+                raise Http404('Page not found')
+
+            role = page.membership_role
+            if role is None or (roles and role not in roles):
+                return _deny(request, False, message, 'apps:list')
+
+            request.membership_role = role
+            return view_func(request, page, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def org_member_required(roles: list = None, api: bool = False,
+                        message: str = 'You do not have access to this organization.'):
+    """
+    Resolve ``org_id`` to an ``Organization`` the user belongs to.
+
+    The view is called with ``organization`` instead of ``org_id``, and the
+    user's role is available as ``request.membership_role``.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, org_id, *args, **kwargs):
+            role = get_role(request, org_id)
+            if role is None or (roles and role not in roles):
+                return _deny(request, api, message, 'organizations:list')
+
+            try:
+                organization = Organization.objects.get(id=org_id)
+            except Organization.DoesNotExist:
+                if api:
+                    return JsonResponse({'error': 'Organization not found'}, status=404)
+                raise Http404('Organization not found')
+
+            request.membership_role = role
+            return view_func(request, organization, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,80 @@
+"""
+Bulk membership changes.
+
+Each operation runs in one transaction with set-based queries, whatever
+the number of members involved. ``update`` and ``bulk_create`` send no
+model signals, so for those the membership cache and dashboard rollups of
+the affected users are refreshed explicitly once the transaction commits.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from utils import rollups
+from .access import invalidate_memberships
+from .models import OrganizationMember
+
+User = get_user_model()
+
+ROLES = [role for role, _ in OrganizationMember.ROLE_CHOICES]
+
+
+def _members(organization, member_ids):
+    # The owner's membership is never changed or removed in bulk
+    return OrganizationMember.objects.filter(
+        organization=organization, id__in=member_ids
+    ).exclude(user_id=organization.owner_id)
+
+
+def memberships_changed(user_ids):
+    """Refresh cached memberships and dashboard rollups after set-based changes."""
+    if user_ids:
+        invalidate_memberships(*user_ids)
+        rollups.mark_stale(user_ids=user_ids)
+
+
+def change_roles(organization, member_ids, role: str) -> int:
+    """Give the selected members ``role``; returns how many changed."""
+    if role not in ROLES:
+        raise ValueError(f"Unknown role '{role}'")
+    with transaction.atomic():
+        members = _members(organization, member_ids).exclude(role=role)
+        user_ids = list(members.values_list('user_id', flat=True))
+        changed = members.update(role=role)
+        transaction.on_commit(lambda: memberships_changed(user_ids))
+    return changed
+
+
+def remove(organization, member_ids) -> int:
+    """Remove the selected members; returns how many were removed."""
+    # delete() sends post_delete per member, which refreshes their caches
+    with transaction.atomic():
+        removed, _ = _members(organization, member_ids).delete()
+    return removed
+
+
+def invite(organization, emails, role: str) -> dict:
+    """
+    Add existing users with the given emails as members.
+
+    Returns the emails that were ``added``, were already members
+    (``existing``) or have no account yet (``pending``).
+    """
+    if role not in ROLES:
+        raise ValueError(f"Unknown role '{role}'")
+    emails = sorted({email.strip() for email in emails if email.strip()})
+    with transaction.atomic():
+        users = dict(User.objects.filter(email__in=emails).values_list('email', 'id'))
+        existing = set(
+            OrganizationMember.objects.filter(organization=organization, user_id__in=users.values())
+            .values_list('user_id', flat=True)
+        )
+        new_user_ids = [user_id for user_id in users.values() if user_id not in existing]
+        OrganizationMember.objects.bulk_create(
+            [OrganizationMember(organization=organization, user_id=user_id, role=role) for user_id in new_user_ids],
+            ignore_conflicts=True
+        )
+        transaction.on_commit(lambda: memberships_changed(new_user_ids))
+    return {
+        'added': [email for email in emails if users.get(email) in new_user_ids],
+        'existing': [email for email in emails if users.get(email) in existing],
+        'pending': [email for email in emails if email not in users],
+    }
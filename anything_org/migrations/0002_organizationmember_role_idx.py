@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anything_org', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='organizationmember',
+            index=models.Index(fields=['organization', 'role', 'user'], name='orgmember_org_role_user_idx'),
+        ),
+    ]
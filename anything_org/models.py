@@ -1,5 +1,31 @@
 from django.db import models
 from django.conf import settings
+from django.db.models import BooleanField, Case, Exists, OuterRef, Q, Subquery, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from utils.queries import count_subquery
+
+class OrganizationQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """
+        Organizations ``user`` owns or belongs to, annotated with ``role``,
+        ``is_owner``, ``member_count`` and ``app_count``.
+        """
+        from anything_apps.models import App
+
+        members = OrganizationMember.objects.filter(organization=OuterRef('pk'))
+        return self.filter(
+            Q(owner=user) | Exists(members.filter(user=user))
+        ).annotate(
+            role=Subquery(members.filter(user=user).values('role')[:1]),
+            is_owner=Case(When(owner=user, then=True), default=False, output_field=BooleanField()),
+            member_count=count_subquery(members),
+            app_count=count_subquery(App.objects.filter(organization=OuterRef('pk'))),
+        )
+
+    def search(self, term: str):
+        return self.filter(name__icontains=term)
+
 
 class Organization(models.Model):
     name = models.CharField(max_length=100)
@@ -16,12 +42,24 @@ class Organization(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrganizationQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['-created_at']
 
+class OrganizationMemberQuerySet(models.QuerySet):
+    def search(self, term: str):
+        """Members whose username or email contains ``term``, or whose role is ``term``."""
+        return self.filter(
+            Q(user__username__icontains=term) |
+            Q(user__email__icontains=term) |
+            Q(role=term.upper())
+        )
+
+
 class OrganizationMember(models.Model):
     ROLE_CHOICES = [
         ('ADMIN', 'Admin'),
@@ -35,9 +73,21 @@ class OrganizationMember(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrganizationMemberQuerySet.as_manager()
+
     class Meta:
         unique_together = ('organization', 'user')
         ordering = ['organization', 'user']
+        indexes = [
+            # Role filters on the members page
+            models.Index(fields=['organization', 'role', 'user'], name='orgmember_org_role_user_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.organization.name} ({self.role})"
+
+@receiver(post_save, sender=OrganizationMember)
+@receiver(post_delete, sender=OrganizationMember)
+def invalidate_member_cache(sender, instance, **kwargs):
+    from .access import invalidate_memberships
+    invalidate_memberships(instance.user_id)
@@ -1,3 +1,95 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from anything_apps.models import DataStore
+from anything_apps.tests import AppFixtureMixin
+from .models import OrganizationMember
+
+
+class AccessTests(AppFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.item = DataStore.objects.create(app=self.app, table_name='tasks', key='title', value='Buy milk')
+        self.url = reverse('apps:data_store_detail', args=[self.app.id, self.item.id])
+
+    def test_repeated_checks_skip_membership_query(self):
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('anything_org_organizationmember' in q['sql'] for q in queries.captured_queries))
+
+    def test_removed_member_loses_access(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        OrganizationMember.objects.filter(user=self.user).delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_page_view_resolves_page_in_two_queries(self):
+        url = reverse('apps:render_page', args=[self.app.id, 'home'])
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        # Session and user lookups, then the page (with app and role) and its context queries
+        self.assertEqual(len(queries), 4)
+
+
+class MemberManagementTests(AppFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse('organizations:members', args=[self.organization.id])
+        self.members = [
+            OrganizationMember.objects.create(
+                organization=self.organization,
+                user=User.objects.create(username=f'member{i}', email=f'member{i}@example.com'),
+                role='VIEWER'
+            )
+            for i in range(3)
+        ]
+
+    def test_bulk_role_change_and_removal(self):
+        owner_membership = OrganizationMember.objects.get(user=self.user)
+        ids = [member.id for member in self.members[:2]] + [owner_membership.id]
+
+        response = self.client.post(
+            self.url, {'action': 'change_role', 'role': 'MEMBER', 'member_ids': ids},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.json()['count'], 2)
+        self.client.post(self.url, {'action': 'remove', 'member_ids': [self.members[0].id]})
+
+        roles = dict(OrganizationMember.objects.values_list('user__username', 'role'))
+        self.assertEqual(roles, {'owner': 'ADMIN', 'member1': 'MEMBER', 'member2': 'VIEWER'})
+
+    def test_search_filters_members(self):
+        response = self.client.get(self.url, {'q': 'member1@'})
+
+        self.assertEqual([member.user.username for member in response.context['page_obj']], ['member1'])
+        self.assertEqual(response.context['member_count'], 4)
+
+    def test_bulk_invite_adds_existing_users(self):
+        newcomer = User.objects.create(username='newcomer', email='new@example.com')
+
+        response = self.client.post(
+            reverse('organizations:member_invite', args=[self.organization.id]),
+            {'email': 'new@example.com, member0@example.com\nnobody@example.com', 'role': 'VIEWER'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+
+        result = response.json()
+        self.assertEqual(result['added'], ['new@example.com'])
+        self.assertEqual(result['existing'], ['member0@example.com'])
+        self.assertEqual(result['pending'], ['nobody@example.com'])
+        self.client.force_login(newcomer)
+        self.assertEqual(self.client.get(reverse('apps:detail', args=[self.app.id])).status_code, 200)
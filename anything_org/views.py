@@ -2,18 +2,27 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from utils.queries import paginate
+from . import members as bulk_members
+from .access import MANAGER_ROLES, org_member_required
 from .models import Organization, OrganizationMember
 from .forms import OrganizationForm
+import re
+
+ORGANIZATIONS_PER_PAGE = 24
+MEMBERS_PER_PAGE = 50
 
 @login_required
 def organization_list(request):
     """View to list user's organizations."""
-    user_organizations = request.user.organizations.all()
-    owned_organizations = request.user.owned_organizations.all()
+    query = request.GET.get('q', '').strip()
+    organizations = Organization.objects.for_user(request.user)
+    if query:
+        organizations = organizations.search(query)
     
     return render(request, 'organizations/list.html', {
-        'user_organizations': user_organizations,
-        'owned_organizations': owned_organizations
+        **paginate(request, organizations, ORGANIZATIONS_PER_PAGE),
+        'query': query
     })
 
 @login_required
@@ -34,30 +43,44 @@ def organization_create(request):
             )
             
             messages.success(request, 'Organization created successfully!')
-            return redirect('organization_detail', org_id=organization.id)
+            return redirect('organizations:detail', org_id=organization.id)
     else:
         form = OrganizationForm()
     
     return render(request, 'organizations/create.html', {'form': form})
 
 @login_required
-def organization_detail(request, org_id):
+@org_member_required()
+def organization_detail(request, organization):
     """View to show organization details."""
-    organization = get_object_or_404(Organization, id=org_id)
-    user_member = organization.organizationmember_set.filter(user=request.user).first()
-    
-    if not user_member:
-        messages.error(request, 'You do not have access to this organization.')
-        return redirect('organization_list')
-    
-    members = organization.organizationmember_set.select_related('user').all()
-    
     return render(request, 'organizations/detail.html', {
         'organization': organization,
-        'members': members,
-        'user_role': user_member.role
+        **_member_page(request, organization),
+        'user_role': request.membership_role
     })
 
+def _member_page(request, organization) -> dict:
+    """One page of an organization's members, filtered by the ``q`` and ``role`` parameters."""
+    query = request.GET.get('q', '').strip()
+    role = request.GET.get('role', '')
+    members = organization.organizationmember_set.select_related('user')
+    member_count = members.count()
+    if query:
+        members = members.search(query)
+    if role:
+        members = members.filter(role=role)
+    return {
+        **paginate(request, members, MEMBERS_PER_PAGE),
+        'member_count': member_count,
+        'query': query,
+        'role': role
+    }
+
+def _member_ids(request) -> list:
+    """Selected members from ``member_ids`` (repeated) or a single ``member_id``."""
+    ids = request.POST.getlist('member_ids') or [request.POST.get('member_id', '')]
+    return [int(member_id) for member_id in ids if member_id.isdigit()]
+
 @login_required
 def organization_update(request, org_id):
     """View to update organization details."""
@@ -65,14 +88,14 @@ def organization_update(request, org_id):
     
     if organization.owner != request.user:
         messages.error(request, 'Only the organization owner can update details.')
-        return redirect('organization_detail', org_id=org_id)
+        return redirect('organizations:detail', org_id=org_id)
     
     if request.method == 'POST':
         form = OrganizationForm(request.POST, instance=organization)
         if form.is_valid():
             form.save()
             messages.success(request, 'Organization updated successfully!')
-            return redirect('organization_detail', org_id=org_id)
+            return redirect('organizations:detail', org_id=org_id)
     else:
         form = OrganizationForm(instance=organization)
     
@@ -82,59 +105,67 @@ def organization_update(request, org_id):
     })
 
 @login_required
-def member_manage(request, org_id):
+@org_member_required(roles=MANAGER_ROLES, message='You do not have permission to manage members.')
+def member_manage(request, organization):
     """View to manage organization members."""
-    organization = get_object_or_404(Organization, id=org_id)
-    user_member = organization.organizationmember_set.filter(user=request.user).first()
-    
-    if not user_member or user_member.role not in ['ADMIN', 'OWNER']:
-        messages.error(request, 'You do not have permission to manage members.')
-        return redirect('organization_detail', org_id=org_id)
-    
     if request.method == 'POST':
         action = request.POST.get('action')
-        member_id = request.POST.get('member_id')
+        member_ids = _member_ids(request)
+        result = {'error': 'Select at least one member and an action'}
         
-        if action and member_id:
-            member = get_object_or_404(OrganizationMember, id=member_id)
-            
-            if action == 'remove':
-                member.delete()
-                messages.success(request, 'Member removed successfully!')
-            elif action == 'change_role':
-                new_role = request.POST.get('role')
-                if new_role in ['ADMIN', 'MEMBER', 'VIEWER']:
-                    member.role = new_role
-                    member.save()
-                    messages.success(request, 'Member role updated successfully!')
+        # The decorator's single permission check covers the whole selection
+        if action == 'remove' and member_ids:
+            count = bulk_members.remove(organization, member_ids)
+            result = {'success': True, 'count': count, 'message': f'Removed {count} member(s).'}
+        elif action == 'change_role' and member_ids:
+            try:
+                count = bulk_members.change_roles(organization, member_ids, request.POST.get('role'))
+                result = {'success': True, 'count': count, 'message': f'Updated the role of {count} member(s).'}
+            except ValueError as e:
+                result = {'error': str(e)}
         
-        return redirect('member_manage', org_id=org_id)
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse(result, status=200 if result.get('success') else 400)
+        if result.get('success'):
+            messages.success(request, result['message'])
+        else:
+            messages.error(request, result['error'])
+        return redirect('organizations:members', org_id=organization.id)
     
-    members = organization.organizationmember_set.select_related('user').all()
     return render(request, 'organizations/members.html', {
         'organization': organization,
-        'members': members,
-        'user_role': user_member.role
+        **_member_page(request, organization),
+        'roles': OrganizationMember.ROLE_CHOICES,
+        'user_role': request.membership_role
     })
 
 @login_required
-def member_invite(request, org_id):
+@org_member_required(roles=MANAGER_ROLES, api=True)
+def member_invite(request, organization):
     """View to invite new members to the organization."""
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        organization = get_object_or_404(Organization, id=org_id)
-        user_member = organization.organizationmember_set.filter(user=request.user).first()
-        
-        if not user_member or user_member.role not in ['ADMIN', 'OWNER']:
-            return JsonResponse({'error': 'Permission denied'}, status=403)
-        
-        email = request.POST.get('email')
+        # One address per field, or several separated by commas or whitespace
+        emails = [
+            email
+            for value in request.POST.getlist('email')
+            for email in re.split(r'[\s,;]+', value)
+            if email
+        ]
         role = request.POST.get('role', 'MEMBER')
+        if not emails:
+            return JsonResponse({'error': 'Enter at least one email address'}, status=400)
+        
+        try:
+            result = bulk_members.invite(organization, emails, role)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        # Here you would typically send an invitation email
-        # For MVP, we'll just return success
+        # Users without an account would get an invitation email here;
+        # for MVP they are only reported back as pending
         return JsonResponse({
             'success': True,
-            'message': f'Invitation sent to {email}'
+            'message': f"Added {len(result['added'])} member(s), {len(result['pending'])} invitation(s) pending",
+            **result
         })
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
@@ -1,29 +1,20 @@
 from django.core.management.base import BaseCommand
-from django.contrib.auth import get_user_model
-from users.models import UserProfile
-
-User = get_user_model()
+from users.provisioning import DEFAULT_BATCH_SIZE, ensure_profiles
 
 class Command(BaseCommand):
     help = 'Ensures all users have associated profiles'
 
-    def handle(self, *args, **kwargs):
-        users = User.objects.all()
-        created_count = 0
-        
-        for user in users:
-            _, created = UserProfile.objects.get_or_create(
-                user=user,
-                defaults={
-                    'token_count': 0,
-                    'bio': '',
-                }
-            )
-            if created:
-                created_count += 1
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Profiles created per query')
+
+    def handle(self, *args, **options):
+        created_count = ensure_profiles(
+            batch_size=options['batch_size'],
+            progress=lambda done: self.stdout.write(f'Created {done} profiles...')
+        )
         
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully processed all users. Created {created_count} new profiles.'
             )
-        ) 
\ No newline at end of file
+        )
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from users.provisioning import DEFAULT_BATCH_SIZE, batches, grant_tokens
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Adds tokens to many users at once: everyone, an organization, or usernames listed in a file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('amount', type=int, help='Tokens to add to each profile')
+        parser.add_argument('--organization', type=int, help='Only members of this organization id')
+        parser.add_argument('--usernames', help='File with one username per line')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Profiles updated per query')
+
+    def handle(self, *args, **options):
+        if options['amount'] <= 0:
+            raise CommandError('The amount must be positive')
+
+        users = User.objects.all()
+        if options['organization']:
+            users = users.filter(organizationmember__organization_id=options['organization'])
+
+        granted = 0
+        if options['usernames']:
+            try:
+                with open(options['usernames'], encoding='utf-8') as f:
+                    # Streamed in batches so the file never has to fit in memory
+                    for names in batches((line.strip() for line in f if line.strip()), options['batch_size']):
+                        granted += grant_tokens(
+                            options['amount'], users.filter(username__in=names), batch_size=options['batch_size']
+                        )
+                        self._progress(granted)
+            except OSError as e:
+                raise CommandError(f"Cannot read {options['usernames']}: {e}")
+        else:
+            granted = grant_tokens(options['amount'], users, batch_size=options['batch_size'], progress=self._progress)
+
+        self.stdout.write(self.style.SUCCESS(f"Granted {options['amount']} tokens to {granted} users."))
+
+    def _progress(self, done):
+        self.stdout.write(f'Granted tokens to {done} users...')
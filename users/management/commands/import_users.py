@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from users.provisioning import DEFAULT_BATCH_SIZE, ROLES, import_users
+import csv
+import sys
+
+class Command(BaseCommand):
+    help = (
+        'Imports users and organization memberships from a CSV file with a header row: '
+        'username, and optionally email, organization_id and role'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file to import, or '-' for standard input")
+        parser.add_argument('--default-role', default='MEMBER', choices=ROLES, help='Role for rows without one')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows imported per transaction')
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            self._import(sys.stdin, options)
+            return
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as f:
+                self._import(f, options)
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+
+    def _import(self, f, options):
+        reader = csv.DictReader(f)
+        if not reader.fieldnames or 'username' not in reader.fieldnames:
+            raise CommandError("The CSV needs a header row with a 'username' column")
+
+        totals = import_users(
+            reader,
+            default_role=options['default_role'],
+            batch_size=options['batch_size'],
+            progress=lambda done: self.stdout.write(f'Processed {done} rows...')
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['rows']} rows: {totals['users_created']} users created, "
+            f"{totals['memberships_created']} memberships created, "
+            f"{totals['memberships_updated']} roles updated, {totals['skipped']} skipped."
+        ))
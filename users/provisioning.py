@@ -0,0 +1,166 @@
+"""
+Batched user provisioning for the management commands.
+
+Every operation works through its input in chunks of ``batch_size`` rows,
+with one transaction and a constant number of queries per chunk, so run
+time grows linearly with the number of users and memory stays flat. Input
+is consumed as an iterator, so CSV files are streamed rather than loaded.
+``progress``, when given, is called with the running total after each
+chunk.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import F
+from itertools import islice
+from anything_org.members import memberships_changed
+from anything_org.models import Organization, OrganizationMember
+from .models import UserProfile
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 1000
+
+ROLES = [role for role, _ in OrganizationMember.ROLE_CHOICES]
+
+
+def batches(iterable, size: int):
+    """Yield lists of up to ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _keyset(queryset, batch_size: int):
+    """Yield id batches of ``queryset`` in id order, without OFFSET or a long-lived cursor."""
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def ensure_profiles(batch_size: int = DEFAULT_BATCH_SIZE, progress=None) -> int:
+    """Create missing profiles; returns how many were created."""
+    created = 0
+    for user_ids in _keyset(User.objects.filter(profile__isnull=True), batch_size):
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=user_id, token_count=0, bio='') for user_id in user_ids],
+            ignore_conflicts=True
+        )
+        created += len(user_ids)
+        if progress:
+            progress(created)
+    return created
+
+
+def import_users(rows, default_role: str = 'MEMBER', batch_size: int = DEFAULT_BATCH_SIZE, progress=None) -> dict:
+    """
+    Create users and organization memberships from ``rows``.
+
+    Each row is a mapping with ``username`` and optional ``email``,
+    ``organization_id`` and ``role`` keys, e.g. from ``csv.DictReader``.
+    Existing users are left as they are; existing memberships get the
+    row's role. Imported users get an unusable password.
+    """
+    totals = {'rows': 0, 'users_created': 0, 'memberships_created': 0, 'memberships_updated': 0, 'skipped': 0}
+    for batch in batches(rows, batch_size):
+        with transaction.atomic():
+            counts = _import_batch(batch, default_role)
+        for key, value in counts.items():
+            totals[key] += value
+        totals['rows'] += len(batch)
+        if progress:
+            progress(totals['rows'])
+    return totals
+
+
+def _import_batch(batch: list, default_role: str) -> dict:
+    counts = {'users_created': 0, 'memberships_created': 0, 'memberships_updated': 0, 'skipped': 0}
+    rows = []
+    for row in batch:
+        username = (row.get('username') or '').strip()
+        role = (row.get('role') or default_role).strip().upper()
+        organization_id = (row.get('organization_id') or '').strip()
+        if not username or role not in ROLES or (organization_id and not organization_id.isdigit()):
+            counts['skipped'] += 1
+            continue
+        rows.append((username, (row.get('email') or '').strip(), int(organization_id) if organization_id else None, role))
+
+    usernames = {username for username, _, _, _ in rows}
+    existing_users = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    new_users = {
+        username: User(username=username, email=email, password=make_password(None))
+        for username, email, _, _ in rows
+        if username not in existing_users
+    }
+    User.objects.bulk_create(new_users.values(), ignore_conflicts=True)
+    counts['users_created'] = len(new_users)
+
+    # bulk_create sends no post_save, so profiles are created here too
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_ids[username], token_count=0, bio='') for username in new_users if username in user_ids],
+        ignore_conflicts=True
+    )
+
+    wanted = {
+        (organization_id, user_ids[username]): role
+        for username, _, organization_id, role in rows
+        if organization_id and username in user_ids
+    }
+    if not wanted:
+        return counts
+    organizations = set(Organization.objects.filter(
+        id__in={organization_id for organization_id, _ in wanted}
+    ).values_list('id', flat=True))
+    for key in [key for key in wanted if key[0] not in organizations]:
+        del wanted[key]
+        counts['skipped'] += 1
+
+    existing = {
+        (member.organization_id, member.user_id): member
+        for member in OrganizationMember.objects.filter(
+            organization_id__in=organizations, user_id__in={user_id for _, user_id in wanted}
+        )
+        if (member.organization_id, member.user_id) in wanted
+    }
+    changed = []
+    for key, member in existing.items():
+        if member.role != wanted[key]:
+            member.role = wanted[key]
+            changed.append(member)
+    OrganizationMember.objects.bulk_update(changed, ['role'])
+    OrganizationMember.objects.bulk_create(
+        [
+            OrganizationMember(organization_id=organization_id, user_id=user_id, role=role)
+            for (organization_id, user_id), role in wanted.items()
+            if (organization_id, user_id) not in existing
+        ],
+        ignore_conflicts=True
+    )
+    counts['memberships_created'] = len(wanted) - len(existing)
+    counts['memberships_updated'] = len(changed)
+
+    affected = list({user_id for _, user_id in wanted})
+    transaction.on_commit(lambda: memberships_changed(affected))
+    return counts
+
+
+def grant_tokens(amount: int, users=None, batch_size: int = DEFAULT_BATCH_SIZE, progress=None) -> int:
+    """
+    Add ``amount`` tokens to the profiles of ``users`` (a User queryset,
+    default all users); returns how many profiles were updated.
+    """
+    users = User.objects.all() if users is None else users
+    granted = 0
+    for user_ids in _keyset(users, batch_size):
+        with transaction.atomic():
+            granted += UserProfile.objects.filter(user_id__in=user_ids).update(
+                token_count=F('token_count') + amount
+            )
+        if progress:
+            progress(granted)
+    return granted
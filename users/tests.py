@@ -1,3 +1,42 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from anything_apps.tests import AppFixtureMixin
+from .models import UserProfile
+
+
+class ProvisioningTests(AppFixtureMixin, TestCase):
+    def test_import_users_and_memberships_from_csv(self):
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / 'users.csv'
+        path.write_text(
+            'username,email,organization_id,role\n'
+            f'alice,alice@example.com,{self.organization.id},viewer\n'
+            f'owner,,{self.organization.id},member\n'
+            'bob,bob@example.com,,\n'
+            f'carol,,{self.organization.id},superuser\n'
+        )
+
+        call_command('import_users', str(path), batch_size=2, stdout=StringIO())
+
+        roles = dict(self.organization.organizationmember_set.values_list('user__username', 'role'))
+        self.assertEqual(roles, {'owner': 'MEMBER', 'alice': 'VIEWER'})
+        self.assertTrue(UserProfile.objects.filter(user__username='bob').exists())
+        self.assertFalse(User.objects.filter(username='carol').exists())
+        self.assertFalse(User.objects.get(username='alice').has_usable_password())
+
+    def test_profiles_and_token_grants_in_batches(self):
+        User.objects.bulk_create([User(username=f'bulk{i}') for i in range(5)])
+        output = StringIO()
+
+        call_command('ensure_user_profiles', batch_size=2, stdout=output)
+        call_command('grant_tokens', 7, organization=self.organization.id, stdout=output)
+
+        self.assertIn('Created 5 new profiles', output.getvalue())
+        self.assertEqual(UserProfile.objects.count(), 6)
+        self.assertEqual(UserProfile.objects.get(user=self.user).token_count, 7)
+        self.assertEqual(UserProfile.objects.filter(token_count=0).count(), 5)
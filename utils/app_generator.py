@@ -1,8 +1,17 @@
-import anthropic
 from django.conf import settings
-from anything_apps.models import App, AppPage, DataStore, ContextQuery, Prompt
+from anything_apps.models import App, AppPage, DataStore, ContextQuery, Prompt, compile_template
 from anything_org.models import Organization
+from utils.assets import minify_html
+from utils.cache import app_namespace, invalidate
+from utils.llm import LLMBackend, LLMResponse, estimate_tokens, get_llm_backend
+from utils.rate_limiter import RateLimiter
+from utils.schemas import STEP_SCHEMAS, SchemaValidationError, repair_prompt, validate
 from django.contrib.staticfiles.finders import find
+from django.db import transaction
+from django.db.models import Q
+from django.template import TemplateSyntaxError
+from django.utils import timezone
+from datetime import timedelta
 import json
 import logging
 import os
@@ -17,6 +26,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# A page left GENERATING this long was abandoned by its worker
+PAGE_GENERATION_TIMEOUT = timedelta(seconds=settings.Q_CLUSTER.get('timeout', 600) * 2)
+
+# Output budgets of the generation steps, shared with batch generation
+APP_SKELETON_MAX_TOKENS = 3000
+PAGE_TEMPLATE_MAX_TOKENS = 2000
+PAGE_JS_MAX_TOKENS = 4096
+PAGE_QUERIES_MAX_TOKENS = 2000
+
 # Get DEBUG setting, defaulting to False if not set
 DEBUG = getattr(settings, 'DEBUG', False)
 
@@ -39,18 +57,89 @@ def debug_log(message: str, extra: dict = None) -> None:
 debug_log("AppGenerator module initialized", {"debug_enabled": DEBUG})
 
 class AppGenerator:
-    def __init__(self, organization: Organization, prompt: Prompt):
+    def __init__(self, organization: Organization, prompt: Prompt, llm: LLMBackend = None,
+                 rate_limiter: RateLimiter = None, fused_skeleton: bool = None, lazy_pages: bool = None):
         debug_log("Initializing AppGenerator", {
             "organization_id": str(organization.id),  # Convert UUID to string
             "prompt_id": str(prompt.id)
         })
         self.organization = organization
         self.prompt = prompt
-        self.claude = anthropic.Client(
-            api_key=settings.ANTHROPIC_API_KEY
-        )
+        self.llm = llm or get_llm_backend()
+        self.rate_limiter = rate_limiter
+        self.fused_skeleton = getattr(settings, 'LLM_FUSED_SKELETON', True) if fused_skeleton is None else fused_skeleton
+        if lazy_pages is None:
+            lazy_pages = getattr(settings, 'PAGE_GENERATION', 'eager') != 'eager'
+        self.lazy_pages = lazy_pages
+        if self.rate_limiter is None and settings.LLM_RATE_LIMIT.get('enabled'):
+            self.rate_limiter = RateLimiter()
         self.base_prompt_path = os.path.join(settings.BASE_DIR, 'static', 'prompts')
-        debug_log("AppGenerator initialized successfully")
+        debug_log("AppGenerator initialized successfully", {
+            "llm_backend": self.llm.name
+        })
+
+    def _call_llm(self, step: str, prompt: str, max_tokens: int, temperature: float = 0.7,
+                  schema: dict = None) -> LLMResponse:
+        """
+        Send a single-turn prompt for a generation step to the configured LLM
+        backend. With ``schema`` the response is requested as structured
+        output and parsed into ``response.data``.
+        """
+        debug_log(f"Calling LLM for step {step}", {
+            "model": self.llm.model(step),
+            "prompt_length": len(prompt),
+            "structured": schema is not None
+        })
+
+        def send():
+            if schema is None:
+                return self.llm.call(step, prompt, max_tokens=max_tokens, temperature=temperature)
+            return self.llm.call_structured(step, prompt, schema, max_tokens=max_tokens, temperature=temperature)
+
+        if not self.rate_limiter:
+            return send()
+
+        # Reserve the worst case up front and hand back the unused part afterwards
+        estimated_tokens = estimate_tokens(prompt) + max_tokens
+        if schema is not None:
+            estimated_tokens += estimate_tokens(json.dumps(schema))
+        reservation = self.rate_limiter.acquire(self.organization.id, estimated_tokens=estimated_tokens)
+        used_tokens = 0
+        try:
+            response = send()
+            used_tokens = response.input_tokens + response.output_tokens
+            return response
+        finally:
+            # A failed call gives its whole reservation back
+            self.rate_limiter.reconcile(reservation, used_tokens)
+
+    def _call_structured(self, step: str, prompt: str, max_tokens: int, temperature: float = 0.7) -> dict:
+        """
+        Run a structured step and return its output, checked against the
+        step's schema. An output that does not match gets one repair call
+        listing the problems; if that still does not match,
+        ``SchemaValidationError`` is raised.
+        """
+        schema = STEP_SCHEMAS[step]
+
+        def check(response):
+            if response.data is None:
+                return ['the output is not valid JSON']
+            return validate(response.data, schema)
+
+        response = self._call_llm(step, prompt, max_tokens, temperature, schema=schema)
+        errors = check(response)
+        if not errors:
+            return response.data
+
+        logger.warning(f"Output of step {step} does not match its schema, requesting a repair: {'; '.join(errors)}")
+        response = self._call_llm(
+            step, repair_prompt(schema, response.text, errors), max_tokens, temperature=0, schema=schema
+        )
+        errors = check(response)
+        if errors:
+            raise SchemaValidationError(step, errors)
+        return response.data
 
     def _load_prompt_template(self, template_name: str) -> str:
         """Load a prompt template using Django's static file finders."""
@@ -85,473 +174,96 @@ class AppGenerator:
             })
             raise
 
-    def _clean_json_response(self, response_text: str) -> str:
-        """Clean the response text to extract only the JSON part and handle control characters."""
-        try:
-            # First try to parse the entire response as JSON
-            try:
-                json.loads(response_text)
-                return response_text
-            except json.JSONDecodeError:
-                pass
-
-            # Try to find JSON object or array
-            obj_start = response_text.find('{')
-            arr_start = response_text.find('[')
-            
-            # Determine if we're dealing with an object or array
-            if obj_start >= 0 and (arr_start < 0 or obj_start < arr_start):
-                start = obj_start
-                end = response_text.rindex('}') + 1
-            elif arr_start >= 0:
-                start = arr_start
-                end = response_text.rindex(']') + 1
-            else:
-                return response_text
-            
-            if start >= 0 and end > start:
-                json_text = response_text[start:end]
-                
-                # Remove any leading/trailing whitespace
-                json_text = json_text.strip()
-                
-                # Try to parse the extracted JSON
-                try:
-                    json.loads(json_text)
-                    return json_text
-                except json.JSONDecodeError:
-                    # First normalize all newlines
-                    cleaned_text = json_text.replace('\r\n', '\n').replace('\r', '\n')
-                    
-                    # Handle HTML attributes with double quotes
-                    cleaned_text = cleaned_text.replace('class="', 'class=\\"')
-                    cleaned_text = cleaned_text.replace('" ', '\\" ')
-                    
-                    # Handle data attributes
-                    cleaned_text = cleaned_text.replace('data-action="', 'data-action=\\"')
-                    cleaned_text = cleaned_text.replace('data-target="', 'data-target=\\"')
-                    
-                    # Handle template variables
-                    cleaned_text = cleaned_text.replace('{{', '\\{\\{').replace('}}', '\\}\\}')
-                    cleaned_text = cleaned_text.replace('{%', '\\{\\%').replace('%}', '\\%\\}')
-                    
-                    # Escape newlines
-                    cleaned_text = cleaned_text.replace('\n', '\\n')
-                    
-                    # Remove extra spaces
-                    cleaned_text = ' '.join(line.strip() for line in cleaned_text.split('\n'))
-                    
-                    try:
-                        json.loads(cleaned_text)
-                        return cleaned_text
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Failed to clean JSON: {cleaned_text}")
-                        logger.error(f"JSON error: {str(e)}")
-                        raise
-                        
-            return response_text
-        except Exception as e:
-            logger.error(f"Error cleaning JSON response: {str(e)}")
-            return response_text
-
-    def _get_page_css(self, page_name: str, theme: dict) -> str:
-        """Generate detailed CSS for a page."""
-        try:
-            # Load and format the base styling prompt
-            css_template = self._load_prompt_template('base_styling')
-            formatted_prompt = css_template.replace('{{ theme.primaryColor }}', theme.get('primaryColor', 'hsl(215, 90%, 50%)'))
-            formatted_prompt = formatted_prompt.replace('{{ theme.accentColor }}', theme.get('accentColor', 'hsl(280, 90%, 50%)'))
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": formatted_prompt}]
-                    }
-                ]
-            )
-            
-            return message.content[0].text.strip()
-                
-        except Exception as e:
-            logger.error(f"Error generating CSS for page {page_name}: {str(e)}")
-            raise
-
-    def _escape_json_string(self, s: str) -> str:
-        """Properly escape a string for JSON inclusion."""
-        # First normalize newlines
-        s = s.replace('\r\n', '\n').replace('\r', '\n')
-        
-        # Handle HTML attributes with double quotes
-        s = s.replace('class="', 'class=\\"')
-        s = s.replace('" ', '\\" ')
-        s = s.replace('data-action="', 'data-action=\\"')
-        s = s.replace('data-target="', 'data-target=\\"')
-        
-        # Handle template variables
-        s = s.replace('{{', '\\{\\{').replace('}}', '\\}\\}')
-        s = s.replace('{%', '\\{\\%').replace('%}', '\\%\\}')
-        
-        # Escape remaining quotes and backslashes
-        s = s.replace('\\', '\\\\')
-        s = s.replace('"', '\\"')
-        
-        # Finally escape newlines
-        s = s.replace('\n', '\\n')
-        
-        return s
-
-    def _get_app_structure(self):
-        """Get the high-level app structure and page definitions."""
-        try:
-            logger.info(f"Requesting initial app structure from Claude for prompt {self.prompt.id}")
-            
-            # First, get the base CSS that will be used across all pages
-            base_css = self._get_component_styles(self.prompt.content)
-            
-            # Load and format the app structure prompt
-            prompt_template = self._load_prompt_template('app_structure')
-            formatted_prompt = prompt_template.replace('{prompt_content}', self.prompt.content)
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": formatted_prompt}]
-                    }
-                ]
-            )
-            
-            try:
-                # Parse the initial structure
-                response_text = self._clean_json_response(message.content[0].text.strip())
-                logger.info(f"Attempting to parse initial structure: {response_text}")
-                initial_structure = json.loads(response_text)
-                initial_structure['base_css'] = base_css
-                logger.info(f"Successfully parsed initial app structure for prompt {self.prompt.id}")
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse initial structure: {str(e)}")
-                logger.error(f"Raw text that failed to parse: {response_text}")
-                raise
-            
-            # Now generate detailed page structures one by one
-            detailed_pages = []
-            for page in initial_structure['pages']:
-                logger.info(f"Generating detailed structure for page: {page['name']}")
-                page_structure = self._get_page_structure(page, initial_structure)
-                detailed_pages.append(page_structure)
-                
-            # Update the initial structure with detailed pages
-            initial_structure['pages'] = detailed_pages
-            
-            # Add initial message tokens
-            self.prompt.tokens_used += message.usage.output_tokens
-            self.prompt.save()
-            
-            return initial_structure
-                
-        except Exception as e:
-            logger.error(f"Error getting app structure from Claude for prompt {self.prompt.id}: {str(e)}")
-            self.prompt.status = 'FAILED'
-            self.prompt.error_message = str(e)
-            self.prompt.save()
-            raise
-
-    def _convert_template_delimiters(self, template: str) -> str:
-        """Convert special template delimiters back to Django syntax."""
-        # Replace template variable delimiters
-        template = template.replace('((', '{{').replace('))', '}}')
-        
-        # Replace template tag delimiters
-        template = template.replace('(%', '{%').replace('%)', '%}')
-        
-        # Replace quote delimiters in HTML attributes
-        # Use regex to handle multi-line attributes properly
-        template = re.sub(r'=\|\|([^|]+)\|\|', r'="\1"', template)
-        
-        return template
-
-    def _parse_llm_response(self, response_text: str) -> dict:
-        """Parse the LLM response that contains separated sections."""
-        try:
-            sections = {}
-            current_section = None
-            current_content = []
-            
-            # Split response into lines and process each line
-            for line in response_text.split('\n'):
-                # Check for section markers
-                if line.strip().startswith('---') and line.strip().endswith('---'):
-                    if current_section:
-                        # Save the previous section
-                        sections[current_section] = '\n'.join(current_content).strip()
-                        current_content = []
-                    # Set new section (remove dashes and whitespace)
-                    current_section = line.strip().replace('-', '').strip()
-                else:
-                    if current_section:
-                        current_content.append(line)
-            
-            # Save the last section
-            if current_section and current_content:
-                sections[current_section] = '\n'.join(current_content).strip()
-            
-            # Convert template delimiters if TEMPLATE section exists
-            if 'TEMPLATE' in sections:
-                sections['TEMPLATE'] = self._convert_template_delimiters(sections['TEMPLATE'])
-            
-            # Parse the METADATA section as JSON
-            if 'METADATA' in sections:
-                sections['METADATA'] = json.loads(sections['METADATA'])
-            
-            return sections
-            
-        except Exception as e:
-            logger.error(f"Error parsing LLM response: {str(e)}")
-            logger.error(f"Response text: {response_text}")
-            raise
-
-    def _get_page_structure(self, page: dict, app_structure: dict) -> dict:
-        """Generate page structure without CSS."""
-        try:
-            # Load and format the page structure prompt
-            page_prompt_template = self._load_prompt_template('page_structure')
-            formatted_page_prompt = page_prompt_template.replace('{page_name}', page['name'])
-            formatted_page_prompt = formatted_page_prompt.replace('{page_description}', page['description'])
-            formatted_page_prompt = formatted_page_prompt.replace('{page_slug}', page['slug'])
-            formatted_page_prompt = formatted_page_prompt.replace('{data_structure}', json.dumps(app_structure['data_structure'], indent=2))
-            
-            page_message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": formatted_page_prompt}]
-                    }
-                ]
-            )
-            
-            try:
-                # Parse the response into sections
-                sections = self._parse_llm_response(page_message.content[0].text.strip())
-                
-                # Get the base template
-                template = sections['TEMPLATE']
-                metadata = sections['METADATA']
-                
-                # Now generate the page logic based on the template
-                logic = self._get_page_logic(page['name'], template, app_structure['base_css'])
-                
-                # Construct the final page structure
-                page_structure = metadata
-                page_structure['template'] = template
-                page_structure['js'] = logic
-                
-                logger.info(f"Successfully parsed structure for page: {page['name']}")
-                return page_structure
-                
-            except Exception as e:
-                logger.error(f"Failed to parse page structure for {page['name']}: {str(e)}")
-                logger.error(f"Raw text that failed to parse: {page_message.content[0].text.strip()}")
-                raise
-                
-        except Exception as e:
-            logger.error(f"Error generating page structure: {str(e)}")
-            raise
-
     def _setup_data_structure(self, app: App, data_structure: list):
-        """Set up the initial data structure for the app."""
+        """Set up the data structure for the app, creating only missing columns."""
         try:
             logger.info(f"Setting up data structure for app {app.id}")
-            for data_def in data_structure:
-                # Each data_def should now include table_name
-                DataStore.objects.create(
-                    app=app,
-                    table_name=data_def['table_name'],
-                    key=data_def['key'],
-                    value='',  # Empty initial value
-                    value_type=data_def['value_type']
-                )
+            self._apply_schema_diff(app, add=data_structure, remove=[])
             logger.info(f"Successfully set up data structure for app {app.id}")
         except Exception as e:
             logger.error(f"Error setting up data structure for app {app.id}: {str(e)}")
             raise
 
-    def _create_pages(self, app: App, pages_data: list):
-        """Create pages with templates and contexts."""
-        try:
-            logger.info(f"Creating pages for app {app.id}")
-            for page_data in pages_data:
-                # Get page template
-                template = self._get_page_template(
-                    page_data['name'],
-                    page_data.get('description', ''),
-                    self._get_component_styles(self.prompt.content)
-                )
-                
-                # Get page context
-                context = self._get_page_context(page_data['name'], template)
-                
-                # Get page logic
-                js_logic = self._get_page_logic(
-                    page_data['name'],
-                    page_data['description'],
-                    template,
-                    self._get_component_styles(self.prompt.content)
-                )
-                
-                # Create the page
-                page = AppPage.objects.create(
-                    app=app,
-                    name=page_data['name'],
-                    slug=page_data['slug'],
-                    template_content=template,
-                    js_content=js_logic
-                )
-                
-                # Create or update context queries for the page
-                for ctx in context:
-                    ContextQuery.objects.update_or_create(
-                        page=page,
-                        context_key=ctx['key'],
-                        defaults={
-                            'query_content': ctx['query'],
-                            'query_type': 'orm'  # Default to ORM queries
-                        }
-                    )
-            logger.info(f"Successfully created pages for app {app.id}")
-        except Exception as e:
-            logger.error(f"Error creating pages for app {app.id}: {str(e)}")
-            raise
-
-    def _get_component_styles(self, prompt_content: str) -> str:
-        """Generate app-wide CSS based on theme and requirements."""
-        try:
-            style_prompt = self._load_prompt_template('base_styling')
-            formatted_prompt = style_prompt.replace('{prompt_content}', prompt_content)
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": formatted_prompt}]
-                    }
-                ]
-            )
-            
-            return message.content[0].text.strip()
-        except Exception as e:
-            logger.error(f"Error generating component styles: {str(e)}")
-            raise
+    def _get_app_tables(self, app: App) -> list[dict]:
+        """Build the table/column structure of an existing app from its DataStore rows."""
+        tables = {}
+        for table_name, key, value_type in app.data_store.columns():
+            table = tables.setdefault(table_name, {'table_name': table_name, 'columns': []})
+            if not any(column['key'] == key for column in table['columns']):
+                table['columns'].append({'key': key, 'value_type': value_type})
+        return list(tables.values())
+
+    def _apply_schema_diff(self, app: App, add: list, remove: list) -> dict:
+        """
+        Apply a column-level schema diff to the app's DataStore.
+
+        Columns in ``add`` that already exist are skipped, so re-applying a
+        structure never creates duplicate definition rows. Columns in
+        ``remove`` only lose their empty definition rows; stored values are
+        left untouched.
+        """
+        existing = set(app.data_store.values_list('table_name', 'key').distinct())
+
+        new_rows = []
+        for column in add:
+            column_id = (column['table_name'], column['key'])
+            if column_id in existing:
+                continue
+            existing.add(column_id)
+            new_rows.append(DataStore(
+                app=app,
+                table_name=column['table_name'],
+                key=column['key'],
+                value='',  # Empty initial value
+                value_type=column['value_type']
+            ))
+        if new_rows:
+            DataStore.objects.bulk_create(new_rows)
+            invalidate(app_namespace(app.id))
+
+        removed = 0
+        for column in remove:
+            deleted, _ = app.data_store.filter(
+                table_name=column['table_name'],
+                key=column['key'],
+                value=''
+            ).delete()
+            removed += deleted
+
+        debug_log(f"Applied schema diff to app {app.id}", {
+            "added": len(new_rows),
+            "removed": removed
+        })
+        return {'added': len(new_rows), 'removed': removed}
 
     def generate_app(self) -> App:
         """Generate the complete app."""
+        app = None
         try:
             debug_log(f"Starting app generation for prompt {self.prompt.id}")
             self.prompt.status = 'PROCESSING'
             self.prompt.save()
 
-            # Get app name and description
-            debug_log("Getting app name and description")
-            name, description = self._get_app_name_and_description()
-            debug_log("Got app name and description", {
+            # Get app name, description, tables and pages
+            debug_log("Getting app skeleton")
+            name, description, tables, pages = self._get_skeleton()
+            debug_log("Got app skeleton", {
                 "name": name,
-                "description": description
+                "description": description,
+                "tables": len(tables),
+                "pages": len(pages)
             })
             
-            # Create the app
-            debug_log("Creating app instance")
-            app = App.objects.create(
-                organization=self.organization,
-                name=name,
-                description=description,
-                initial_prompt=self.prompt,
-                status='ACTIVE'
-            )
-            debug_log(f"Created app instance with ID: {app.id}")
+            app = self._create_app(name, description, tables)
 
-            # Get data structure
-            debug_log("Getting data tables structure")
-            tables = self._get_data_tables()
-            debug_log(f"Got {len(tables)} data tables")
-            
-            # Set up data structure
-            debug_log("Setting up data structure")
-            for table in tables:
-                debug_log(f"Processing table: {table['table_name']}")
-                for column in table['columns']:
-                    DataStore.objects.create(
-                        app=app,
-                        table_name=table['table_name'],
-                        key=column['key'],
-                        value='',  # Empty initial value
-                        value_type=column['value_type']
-                    )
-                debug_log(f"Completed setup for table: {table['table_name']}")
+            # Create pages; in lazy mode only the landing page is generated now
+            for index, page_data in enumerate(pages):
+                if self.lazy_pages and index > 0:
+                    self._stub_page(app, page_data)
+                else:
+                    self._create_page(app, page_data, tables)
 
-            # Get pages
-            debug_log("Getting page list")
-            pages = self._get_page_list()
-            debug_log(f"Got {len(pages)} pages")
-            
-            # Create pages
-            for page_data in pages:
-                debug_log(f"Processing page: {page_data['name']}")
-                
-                # Get page template
-                debug_log(f"Getting template for page: {page_data['name']}")
-                template = self._get_page_template(
-                    page_data['name'],
-                    page_data['description'],
-                    tables
-                )
-                
-                # Get page JavaScript
-                debug_log(f"Getting JavaScript for page: {page_data['name']}")
-                js_logic = self._get_page_js(
-                    page_data['name'],
-                    template
-                )
-                
-                # Get page queries
-                debug_log(f"Getting queries for page: {page_data['name']}")
-                queries = self._get_page_queries(
-                    page_data['name'],
-                    template,
-                    tables
-                )
-                
-                # Create the page
-                debug_log(f"Creating page instance: {page_data['name']}")
-                page = AppPage.objects.create(
-                    app=app,
-                    name=page_data['name'],
-                    slug=page_data['slug'],
-                    template_content=template,
-                    js_content=js_logic
-                )
-                
-                # Create context queries
-                debug_log(f"Creating context queries for page: {page_data['name']}")
-                for query in queries:
-                    ContextQuery.objects.create(
-                        page=page,
-                        context_key=query['key'],
-                        query_content=query['query'],
-                        query_type='orm'
-                    )
-                debug_log(f"Completed processing page: {page_data['name']}")
+            self._warm_pages(app)
 
             self.prompt.status = 'COMPLETED'
             self.prompt.save()
@@ -573,26 +285,221 @@ class AppGenerator:
                 
             raise
 
+    def _create_app(self, name: str, description: str, tables: list[dict]) -> App:
+        """Create the app and the column definitions of its tables."""
+        debug_log("Creating app instance")
+        app = App.objects.create(
+            organization=self.organization,
+            name=name,
+            description=description,
+            initial_prompt=self.prompt,
+            status='ACTIVE'
+        )
+        debug_log(f"Created app instance with ID: {app.id}")
+        self._setup_data_structure(app, self._table_columns(tables))
+        return app
+
+    @staticmethod
+    def _table_columns(tables: list[dict]) -> list[dict]:
+        return [
+            {'table_name': table['table_name'], 'key': column['key'], 'value_type': column['value_type']}
+            for table in tables
+            for column in table['columns']
+        ]
+
+    def _create_page(self, app: App, page_data: dict, tables: list[dict]) -> AppPage:
+        """Generate the template, JavaScript and queries for a page and store it."""
+        debug_log(f"Processing page: {page_data['name']}")
+        template, js_logic, queries = self._generate_page_content(
+            page_data['name'],
+            page_data.get('description', ''),
+            tables
+        )
+        return self._store_page(app, page_data, template, js_logic, queries)
+
+    def _store_page(self, app: App, page_data: dict, template: str, js_logic: str, queries: list[dict]) -> AppPage:
+        # Create the page
+        debug_log(f"Creating page instance: {page_data['name']}")
+        page = AppPage.objects.create(
+            app=app,
+            name=page_data['name'],
+            slug=page_data['slug'],
+            description=page_data.get('description', ''),
+            # Stored minified; the raw template was only needed for the prompts
+            template_content=self._validated_template(page_data['name'], template),
+            js_content=js_logic
+        )
+
+        # Create context queries
+        debug_log(f"Creating context queries for page: {page_data['name']}")
+        self._replace_page_queries(page, queries)
+        debug_log(f"Completed processing page: {page_data['name']}")
+        return page
+
+    def assemble_app(self, skeleton: dict, pages: list[dict], app: App = None) -> App:
+        """
+        Store an app whose content was generated elsewhere, as batch
+        generation does. ``pages`` are the skeleton's pages, each with its
+        generated ``template``, ``js`` and ``queries``.
+
+        With ``app`` that app is regenerated in place instead: its pages are
+        replaced, missing columns are added and stored data is kept.
+        """
+        with transaction.atomic():
+            name, description = skeleton['name'].strip(), skeleton['description'].strip()
+            if app is None:
+                app = self._create_app(name, description, skeleton['tables'])
+            else:
+                app.name = name
+                app.description = description
+                app.status = 'ACTIVE'
+                app.version += 1
+                app.save()
+                self._setup_data_structure(app, self._table_columns(skeleton['tables']))
+                app.pages.all().delete()
+            for page_data in pages:
+                self._store_page(app, page_data, page_data['template'], page_data['js'], page_data['queries'])
+        self._warm_pages(app)
+        return app
+
+    def _generate_page_content(self, name: str, description: str, tables: list[dict]) -> tuple[str, str, list[dict]]:
+        """Get the template, JavaScript and context queries of a page."""
+        # Get page template
+        debug_log(f"Getting template for page: {name}")
+        template = self._get_page_template(name, description, tables)
+
+        # Get page JavaScript
+        debug_log(f"Getting JavaScript for page: {name}")
+        js_logic = self._get_page_js(name, template)
+
+        # Get page queries
+        debug_log(f"Getting queries for page: {name}")
+        queries = self._get_page_queries(name, template, tables)
+        return template, js_logic, queries
+
+    def _stub_page(self, app: App, page_data: dict) -> AppPage:
+        """Store a page without content, to be generated by ``generate_page`` later."""
+        debug_log(f"Stubbing page: {page_data['name']}")
+        return AppPage.objects.create(
+            app=app,
+            name=page_data['name'],
+            slug=page_data['slug'],
+            description=page_data.get('description', ''),
+            template_content='',
+            status='PENDING'
+        )
+
+    def generate_page(self, page: AppPage) -> bool:
+        """
+        Generate the content of a stubbed page.
+
+        The page is claimed first with a conditional update, so when several
+        workers pick up the same page only one generates it. Returns False
+        if the page was ready or claimed by another worker.
+        """
+        now = timezone.now()
+        claimable = Q(status__in=['PENDING', 'QUEUED', 'FAILED']) | Q(
+            status='GENERATING', updated_at__lt=now - PAGE_GENERATION_TIMEOUT
+        )
+        if not AppPage.objects.filter(claimable, id=page.id).update(status='GENERATING', updated_at=now):
+            debug_log(f"Page {page.id} is ready or already being generated")
+            return False
+
+        try:
+            template, js_logic, queries = self._generate_page_content(
+                page.name, page.description, self._get_app_tables(page.app)
+            )
+            self._replace_page_queries(page, queries)
+            page.template_content = self._validated_template(page.name, template)
+            page.js_content = js_logic
+            page.status = 'READY'
+            page.save()
+        except Exception as e:
+            logger.error(f"Error generating page {page.id}: {str(e)}")
+            AppPage.objects.filter(id=page.id).update(status='FAILED', updated_at=timezone.now())
+            raise
+        logger.info(f"Generated page {page.id} of app {page.app_id}")
+        return True
+
+    def _validated_template(self, page_name: str, template: str) -> str:
+        """
+        Minify a generated template and compile it, so syntax errors fail the
+        generation instead of the first page view. Compiling also caches the
+        parsed template for this process.
+        """
+        template = minify_html(template)
+        try:
+            compile_template(template)
+        except TemplateSyntaxError as e:
+            raise ValueError(f"Generated template for page '{page_name}' is invalid: {e}") from e
+        return template
+
+    def _warm_pages(self, app: App):
+        """Render every ready page for the prompt's user once all writes are done."""
+        for page in app.pages.filter(status='READY').select_related('app').prefetch_related('context_queries'):
+            try:
+                page.warm(self.prompt.user)
+            except Exception as e:
+                # A cold cache only costs latency; never fail the generation
+                logger.warning(f"Could not warm page {page.id}: {str(e)}")
+
+    def _replace_page_queries(self, page: AppPage, queries: list[dict]):
+        """Replace all context queries of a page with the given definitions."""
+        page.context_queries.all().delete()
+        ContextQuery.objects.bulk_create([
+            ContextQuery(
+                page=page,
+                context_key=query['key'],
+                query_content=query['query'],
+                query_type='orm',
+                order=index
+            )
+            for index, query in enumerate(queries)
+            if query.get('key') and query.get('query')
+        ])
+        # bulk_create sends no post_save signals
+        invalidate(app_namespace(page.app_id))
+
+    def _get_skeleton(self) -> tuple[str, str, list[dict], list[dict]]:
+        """
+        Get the app name, description, data tables and page list, in one
+        fused call if enabled, otherwise (or if that fails) in three.
+        """
+        if self.fused_skeleton:
+            try:
+                skeleton = self._get_app_skeleton()
+                return skeleton['name'].strip(), skeleton['description'].strip(), skeleton['tables'], skeleton['pages']
+            except Exception as e:
+                logger.warning(f"Fused skeleton step failed for prompt {self.prompt.id}, using separate steps: {str(e)}")
+
+        name, description = self._get_app_name_and_description()
+        return name, description, self._get_data_tables(), self._get_page_list()
+
+    def _get_app_skeleton(self) -> dict:
+        """Get the app name, description, data tables and page list in a single call."""
+        debug_log("Getting app skeleton from Claude")
+        return self._call_structured('app_skeleton', self._app_skeleton_prompt(), max_tokens=APP_SKELETON_MAX_TOKENS)
+
+    def _app_skeleton_prompt(self) -> str:
+        prompt = """You are an expert app architect. Based on this app idea, design the app:
+        1. A concise name (max 3-4 words) and description (1-2 sentences)
+        2. The tables needed, each with a clear name and its columns: name, type (str, int, float, bool, json, date, datetime) and a brief description
+        3. The pages needed, each with a clear, concise name, a URL-friendly slug and a brief description of its purpose
+
+        App idea: {prompt}"""
+        return prompt.format(prompt=self.prompt.content)
+
     def _get_app_name_and_description(self) -> tuple[str, str]:
         """Get the app name and description."""
         debug_log("Getting app name and description from Claude")
         prompt = """You are an expert app architect. Based on this app idea, provide a concise name (max 3-4 words) and description (1-2 sentences).
-        Respond in this exact format:
-        NAME: [app name]
-        DESCRIPTION: [app description]
 
         App idea: {prompt}"""
         
-        message = self.claude.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=1000,
-            temperature=0.7,
-            messages=[{"role": "user", "content": prompt.format(prompt=self.prompt.content)}]
-        )
+        response = self._call_structured('name_description', prompt.format(prompt=self.prompt.content), max_tokens=1000)
         
-        response = message.content[0].text.strip()
-        name = response.split('NAME: ')[1].split('\n')[0].strip()
-        description = response.split('DESCRIPTION: ')[1].strip()
+        name = response['name'].strip()
+        description = response['description'].strip()
         
         debug_log("Got app name and description", {
             "name": name,
@@ -608,46 +515,11 @@ class AppGenerator:
         1. A clear table name
         2. Each column with its name and type (str, int, float, bool, json, date, datetime)
         3. A brief description of what the column represents
-
-        Format each table like this:
-        TABLE: [table name]
-        COLUMNS:
-        [column name] | [type] | [description]
         
         App idea: {prompt}"""
         
-        message = self.claude.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=2000,
-            temperature=0.7,
-            messages=[{"role": "user", "content": prompt.format(prompt=self.prompt.content)}]
-        )
-        
-        response = message.content[0].text.strip()
-        tables = []
-        current_table = None
-        
-        debug_log("Parsing data table response")
-        for line in response.split('\n'):
-            line = line.strip()
-            if line.startswith('TABLE: '):
-                if current_table:
-                    tables.append(current_table)
-                    debug_log(f"Added table: {current_table['table_name']}")
-                current_table = {'table_name': line[7:].strip(), 'columns': []}
-            elif line and '|' in line and current_table:
-                col_parts = [p.strip() for p in line.split('|')]
-                if len(col_parts) == 3:
-                    current_table['columns'].append({
-                        'key': col_parts[0],
-                        'value_type': col_parts[1],
-                        'description': col_parts[2]
-                    })
-                    debug_log(f"Added column {col_parts[0]} to table {current_table['table_name']}")
-        
-        if current_table:
-            tables.append(current_table)
-            debug_log(f"Added final table: {current_table['table_name']}")
+        response = self._call_structured('data_tables', prompt.format(prompt=self.prompt.content), max_tokens=2000)
+        tables = response['tables']
         
         debug_log(f"Completed data table structure with {len(tables)} tables")
         return tables
@@ -660,41 +532,11 @@ class AppGenerator:
         1. A clear, concise name
         2. A URL-friendly slug
         3. A brief description of the page's purpose
-
-        Format each page like this:
-        PAGE: [page name]
-        SLUG: [url-friendly-slug]
-        PURPOSE: [brief description]
         
         App idea: {prompt}"""
         
-        message = self.claude.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=2000,
-            temperature=0.7,
-            messages=[{"role": "user", "content": prompt.format(prompt=self.prompt.content)}]
-        )
-        
-        response = message.content[0].text.strip()
-        pages = []
-        current_page = None
-        
-        debug_log("Parsing page list response")
-        for line in response.split('\n'):
-            line = line.strip()
-            if line.startswith('PAGE: '):
-                if current_page:
-                    pages.append(current_page)
-                    debug_log(f"Added page: {current_page['name']}")
-                current_page = {'name': line[6:].strip()}
-            elif line.startswith('SLUG: ') and current_page:
-                current_page['slug'] = line[6:].strip()
-            elif line.startswith('PURPOSE: ') and current_page:
-                current_page['description'] = line[9:].strip()
-        
-        if current_page:
-            pages.append(current_page)
-            debug_log(f"Added final page: {current_page['name']}")
+        response = self._call_structured('page_list', prompt.format(prompt=self.prompt.content), max_tokens=2000)
+        pages = response['pages']
         
         debug_log(f"Completed page list with {len(pages)} pages")
         return pages
@@ -703,24 +545,13 @@ class AppGenerator:
         """Get the HTML template for a specific page."""
         try:
             debug_log(f"Getting template for page {page_name}")
-            template_prompt = self._load_prompt_template('page_template')
-            formatted_prompt = template_prompt.replace('{page_name}', page_name)
-            formatted_prompt = formatted_prompt.replace('{page_description}', page_description)
-            formatted_prompt = formatted_prompt.replace('{tables}', json.dumps(tables, indent=2))
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=2000,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user", 
-                        "content": [{"type": "text", "text": formatted_prompt}]
-                    }
-                ]
+            message = self._call_llm(
+                'page_template',
+                self._page_template_prompt(page_name, page_description, tables),
+                max_tokens=PAGE_TEMPLATE_MAX_TOKENS
             )
             
-            template_content = message.content[0].text.strip()
+            template_content = message.text.strip()
             debug_log(f"Generated template for page {page_name}", {
                 "template_length": len(template_content)
             })
@@ -732,10 +563,23 @@ class AppGenerator:
             })
             raise
 
+    def _page_template_prompt(self, page_name: str, page_description: str, tables: list[dict]) -> str:
+        template_prompt = self._load_prompt_template('page_template')
+        formatted_prompt = template_prompt.replace('{page_name}', page_name)
+        formatted_prompt = formatted_prompt.replace('{page_description}', page_description)
+        return formatted_prompt.replace('{tables}', json.dumps(tables, indent=2))
+
     def _get_page_js(self, page_name: str, template: str) -> str:
         """Get the JavaScript logic for a specific page."""
         debug_log(f"Getting JavaScript for page {page_name}")
-        
+        message = self._call_llm('page_js', self._page_js_prompt(page_name, template), max_tokens=PAGE_JS_MAX_TOKENS)
+        js_content = self._extract_js(message.text)
+        debug_log(f"Generated JavaScript for page {page_name}", {
+            "js_length": len(js_content)
+        })
+        return js_content
+
+    def _page_js_prompt(self, page_name: str, template: str) -> str:
         # Load the page_logic prompt template
         prompt_template = self._load_prompt_template('page_logic')
         
@@ -755,38 +599,34 @@ class AppGenerator:
         formatted_prompt = prompt_template.replace('{page_name}', page_name)
         formatted_prompt = formatted_prompt.replace('{page_template}', template)
         formatted_prompt = formatted_prompt.replace('{page_purpose}', page_purpose)
-        formatted_prompt = formatted_prompt.replace('{app_css}', app_css)
-        
-        message = self.claude.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=4096,
-            temperature=0.7,
-            messages=[{
-                "role": "user", 
-                "content": formatted_prompt
-            }]
-        )
-        
-        # Extract only the JavaScript code, removing any explanatory text
-        js_content = message.content[0].text.strip()
+        return formatted_prompt.replace('{app_css}', app_css)
+
+    @staticmethod
+    def _extract_js(text: str) -> str:
+        """Keep only the JavaScript code of a page_js response, removing any explanatory text."""
+        js_content = text.strip()
         
         # If the response contains markdown code blocks, extract only the code
         if '```' in js_content:
             js_blocks = re.findall(r'```(?:javascript|js)?\n(.*?)```', js_content, re.DOTALL)
             if js_blocks:
                 js_content = js_blocks[0].strip()
-        
-        debug_log(f"Generated JavaScript for page {page_name}", {
-            "js_length": len(js_content),
-            "has_purpose": bool(page_purpose),
-            "has_css": bool(app_css)
-        })
         return js_content
 
     def _get_page_queries(self, page_name: str, template: str, tables: list[dict]) -> list[dict]:
         """Get the context queries needed for a page."""
         debug_log(f"Getting queries for page {page_name}")
+        response = self._call_structured(
+            'page_queries',
+            self._page_queries_prompt(page_name, template, tables),
+            max_tokens=PAGE_QUERIES_MAX_TOKENS
+        )
+        queries = response['queries']
         
+        debug_log(f"Completed queries for page {page_name} with {len(queries)} queries")
+        return queries
+
+    def _page_queries_prompt(self, page_name: str, template: str, tables: list[dict]) -> str:
         # Get DataStore model information using inspect
         datastore_info = {
             "fields": [field.name for field in DataStore._meta.get_fields()],
@@ -799,59 +639,7 @@ class AppGenerator:
         formatted_prompt = prompt_template.replace('{page_name}', page_name)
         formatted_prompt = formatted_prompt.replace('{template}', template)
         formatted_prompt = formatted_prompt.replace('{datastore_model}', datastore_info['model_source'])
-        formatted_prompt = formatted_prompt.replace('{tables}', json.dumps(tables, indent=2))
-        
-        message = self.claude.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=2000,
-            temperature=0.7,
-            messages=[{
-                "role": "user", 
-                "content": formatted_prompt
-            }]
-        )
-        
-        try:
-            # Parse the JSON response directly
-            response = message.content[0].text.strip()
-            
-            # If the response contains markdown code blocks, extract only the code
-            if '```' in response:
-                json_blocks = re.findall(r'```(?:json)?\n(.*?)```', response, re.DOTALL)
-                if json_blocks:
-                    response = json_blocks[0].strip()
-            
-            queries = json.loads(response)
-            
-            debug_log(f"Successfully parsed {len(queries)} queries for page {page_name}")
-            return queries
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse queries response: {str(e)}")
-            debug_log("Attempting to parse non-JSON response")
-            
-            # Fallback parsing for non-JSON responses
-            queries = []
-            current_query = None
-            
-            for line in response.split('\n'):
-                line = line.strip()
-                if line.startswith('QUERY NAME: '):
-                    if current_query:
-                        queries.append(current_query)
-                        debug_log(f"Added query: {current_query['key']}")
-                    current_query = {'key': line[12:].strip()}
-                elif line.startswith('QUERY: ') and current_query:
-                    current_query['query'] = line[7:].strip()
-                elif line.startswith('PURPOSE: ') and current_query:
-                    current_query['description'] = line[9:].strip()
-            
-            if current_query:
-                queries.append(current_query)
-                debug_log(f"Added final query: {current_query['key']}")
-            
-            debug_log(f"Completed queries for page {page_name} with {len(queries)} queries")
-            return queries
+        return formatted_prompt.replace('{tables}', json.dumps(tables, indent=2))
 
     def _get_page_update(self, page: AppPage, update_prompt: str) -> dict:
         """Generate an updated page structure based on the update prompt."""
@@ -910,7 +698,7 @@ class AppGenerator:
                     "value_type": ds.value_type,
                     "value": ds.value
                 }
-                for ds in page.app.datastore_set.all()
+                for ds in page.app.data_store.filter(value='')
             ]
             
             # Load and format the page update prompt
@@ -924,28 +712,9 @@ class AppGenerator:
             formatted_prompt = formatted_prompt.replace('{update_prompt}', update_prompt)
             formatted_prompt = formatted_prompt.replace('{datastore_model}', datastore_model)
             
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": formatted_prompt}]
-                    }
-                ]
-            )
-            
-            try:
-                response_text = self._clean_json_response(message.content[0].text.strip())
-                logger.info(f"Attempting to parse page update: {response_text}")
-                page_update = json.loads(response_text)
-                logger.info(f"Successfully parsed update for page: {page.name}")
-                return page_update
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse page update: {str(e)}")
-                logger.error(f"Raw text that failed to parse: {response_text}")
-                raise
+            page_update = self._call_structured('page_update', formatted_prompt, max_tokens=4096)
+            logger.info(f"Got update for page: {page.name}")
+            return page_update
                 
         except Exception as e:
             logger.error(f"Error getting page update from Claude: {str(e)}")
@@ -967,12 +736,14 @@ class AppGenerator:
             
             # Update the page
             debug_log(f"Updating page content for {page.name}")
-            page.template_content = page_update['template']
+            page.template_content = self._validated_template(page.name, page_update['template'])
             page.js_content = page_update.get('js', '')
+            # A stub from lazy generation is complete once updated
+            page.status = 'READY'
             page.save()
             
             # Update or create context queries
-            existing_contexts = {ctx.context_key: ctx for ctx in page.contextquery_set.all()}
+            existing_contexts = {ctx.context_key: ctx for ctx in page.context_queries.all()}
             
             debug_log(f"Updating context queries for page {page.name}")
             for ctx_data in page_update.get('contexts', []):
@@ -1001,78 +772,143 @@ class AppGenerator:
             debug_log(f"Page update failed: {str(e)}")
             raise
 
+    def _get_update_plan(self, app: App, update_content: str) -> dict:
+        """Ask Claude which pages, tables and queries an update request touches."""
+        try:
+            debug_log(f"Getting update plan for app {app.id}")
+            pages = [
+                {
+                    "slug": page.slug,
+                    "name": page.name,
+                    "context_keys": [query.context_key for query in page.context_queries.all()]
+                }
+                for page in app.pages.prefetch_related('context_queries')
+            ]
+
+            prompt_template = self._load_prompt_template('update_plan')
+            formatted_prompt = prompt_template.replace('{app_name}', app.name)
+            formatted_prompt = formatted_prompt.replace('{app_description}', app.description)
+            formatted_prompt = formatted_prompt.replace('{data_structure}', json.dumps(self._get_app_tables(app), indent=2))
+            formatted_prompt = formatted_prompt.replace('{pages}', json.dumps(pages, indent=2))
+            formatted_prompt = formatted_prompt.replace('{update_content}', update_content)
+
+            plan = self._call_structured('update_plan', formatted_prompt, max_tokens=2000, temperature=0.2)
+            return self._normalize_update_plan(plan, {page['slug'] for page in pages})
+
+        except Exception as e:
+            logger.error(f"Error getting update plan for app {app.id}: {str(e)}")
+            raise
+
+    def _normalize_update_plan(self, plan: dict, existing_slugs: set) -> dict:
+        """Fill in missing plan sections and drop references to unknown pages."""
+        tables = plan.get('tables') or {}
+        pages = plan.get('pages') or {}
+
+        remove = [slug for slug in pages.get('remove') or [] if slug in existing_slugs]
+        update = [slug for slug in pages.get('update') or [] if slug in existing_slugs and slug not in remove]
+        queries = [
+            slug for slug in pages.get('queries') or []
+            if slug in existing_slugs and slug not in remove and slug not in update
+        ]
+        create = [
+            page for page in pages.get('create') or []
+            if page.get('name') and page.get('slug') and page['slug'] not in existing_slugs
+        ]
+
+        return {
+            'name': plan.get('name') or None,
+            'description': plan.get('description') or None,
+            'tables': {
+                'add': [
+                    column for column in tables.get('add') or []
+                    if column.get('table_name') and column.get('key') and column.get('value_type')
+                ],
+                'remove': [
+                    column for column in tables.get('remove') or []
+                    if column.get('table_name') and column.get('key')
+                ],
+            },
+            'pages': {
+                'update': update,
+                'queries': queries,
+                'create': create,
+                'remove': remove,
+            },
+        }
+
     def update_app(self, app: App, update_content: str) -> App:
-        """Update an existing app based on the update prompt."""
+        """
+        Update an existing app based on the update prompt.
+
+        Only the pages, tables and queries named in the update plan are
+        touched; everything else is left as it is.
+        """
         try:
             debug_log(f"Starting app update for app {app.id}")
             self.prompt.status = 'PROCESSING'
             self.prompt.save()
 
-            # Get app intent and requirements
-            debug_log("Getting updated app intent")
-            intent = self._get_app_intent(existing_app=app)
-            debug_log("Got app intent", {
-                "has_purpose": bool(intent.get('PURPOSE')),
-                "has_ui_requirements": bool(intent.get('UI_REQUIREMENTS')),
-                "has_data": bool(intent.get('DATA')),
-                "has_pages": bool(intent.get('PAGES'))
+            # Work out what the update touches
+            plan = self._get_update_plan(app, update_content)
+            debug_log("Got update plan", {
+                "tables_added": len(plan['tables']['add']),
+                "tables_removed": len(plan['tables']['remove']),
+                "pages_updated": plan['pages']['update'],
+                "queries_updated": plan['pages']['queries'],
+                "pages_created": [page['slug'] for page in plan['pages']['create']],
+                "pages_removed": plan['pages']['remove']
             })
-            
+
             # Update app details if needed
-            if intent['PURPOSE'].strip() != app.description:
-                debug_log("Updating app details and generating new CSS")
-                # Generate new CSS if purpose/requirements changed
-                app_css = self._get_app_css(
-                    app_purpose=intent['PURPOSE'],
-                    ui_requirements=intent['UI_REQUIREMENTS']
-                )
-                
-                app.name = intent['PURPOSE'].split('\n')[0]  # First line as name
-                app.description = intent['PURPOSE']
-                app.css_content = app_css
-                app.save()
-                debug_log("Updated app details")
-            
-            # Update data structure
-            debug_log("Updating data structure")
-            self._setup_data_structure(app, intent['DATA'])
-            
-            # Update pages
-            debug_log("Updating pages")
-            for page_info in intent['PAGES'].split('\n'):
-                if ':' in page_info:
-                    page_name, page_purpose = page_info.split(':', 1)
-                    page_name = page_name.strip()
-                    page_purpose = page_purpose.strip()
-                    
-                    debug_log(f"Processing page update: {page_name}")
-                    # Generate page components
-                    template = self._get_page_template(
-                        page_name=page_name,
-                        page_purpose=page_purpose,
-                        app_css=app.css_content
-                    )
-                    
-                    js_logic = self._get_page_logic(
-                        page_name=page_name,
-                        page_purpose=page_purpose,
-                        template=template,
-                        app_css=app.css_content
-                    )
-                    
-                    # Create or update page
-                    debug_log(f"Creating/updating page: {page_name}")
-                    page, created = AppPage.objects.update_or_create(
-                        app=app,
-                        name=page_name,
-                        defaults={
-                            'template_content': template,
-                            'js_content': js_logic,
-                            'slug': page_name.lower().replace(' ', '-')
-                        }
-                    )
-                    debug_log(f"{'Created' if created else 'Updated'} page: {page_name}")
-            
+            changed_fields = []
+            if plan['name'] and plan['name'] != app.name:
+                app.name = plan['name'][:100]
+                changed_fields.append('name')
+            if plan['description'] and plan['description'] != app.description:
+                app.description = plan['description']
+                changed_fields.append('description')
+            if changed_fields:
+                app.save(update_fields=changed_fields + ['updated_at'])
+                debug_log("Updated app details", {"fields": changed_fields})
+
+            # Apply schema changes as a diff
+            if plan['tables']['add'] or plan['tables']['remove']:
+                debug_log("Applying data structure diff")
+                self._apply_schema_diff(app, plan['tables']['add'], plan['tables']['remove'])
+
+            # Remove pages that are no longer needed
+            if plan['pages']['remove']:
+                debug_log("Removing pages", {"slugs": plan['pages']['remove']})
+                app.pages.filter(slug__in=plan['pages']['remove']).delete()
+
+            pages = {
+                page.slug: page
+                for page in app.pages.filter(slug__in=plan['pages']['update'] + plan['pages']['queries'])
+            }
+            tables = None
+            if plan['pages']['queries'] or plan['pages']['create']:
+                tables = self._get_app_tables(app)
+
+            # Regenerate only the affected pages
+            for slug in plan['pages']['update']:
+                debug_log(f"Updating page: {slug}")
+                self.update_page(pages[slug], update_content)
+
+            for slug in plan['pages']['queries']:
+                page = pages[slug]
+                if page.status != 'READY':
+                    # Its queries are generated together with the page
+                    continue
+                debug_log(f"Regenerating queries for page: {slug}")
+                queries = self._get_page_queries(page.name, page.template_content, tables)
+                self._replace_page_queries(page, queries)
+
+            for page_data in plan['pages']['create']:
+                debug_log(f"Creating page: {page_data['slug']}")
+                self._create_page(app, page_data, tables)
+
+            self._warm_pages(app)
+
             self.prompt.status = 'COMPLETED'
             self.prompt.save()
             debug_log(f"Successfully updated app {app.id}")
@@ -1087,273 +923,3 @@ class AppGenerator:
             self.prompt.error_message = str(e)
             self.prompt.save()
             raise
-
-    def _get_app_intent(self, existing_app: App = None) -> dict:
-        """Determine user intent and app requirements."""
-        try:
-            debug_log("Getting app intent", {
-                "has_existing_app": existing_app is not None
-            })
-            # Load and format the intent prompt
-            intent_template = self._load_prompt_template('app_intent')
-            
-            # Format app info if it exists
-            app_info = "None" if not existing_app else f"""
-            Name: {existing_app.name}
-            Description: {existing_app.description}
-            Pages: {', '.join(p.name for p in existing_app.pages.all())}
-            Data: {', '.join(f'{d.key} ({d.value_type})' for d in existing_app.data_store.all())}
-            """
-            
-            formatted_prompt = intent_template.replace('{app_info}', app_info)
-            formatted_prompt = formatted_prompt.replace('{user_prompt}', self.prompt.content)
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=1000,
-                temperature=0.7,
-                messages=[{"role": "user", "content": formatted_prompt}]
-            )
-            
-            # Parse the structured response
-            debug_log("Parsing app intent response")
-            response = message.content[0].text.strip()
-            sections = {}
-            current_section = None
-            current_content = []
-            
-            for line in response.split('\n'):
-                if ':' in line and line.split(':')[0].isupper():
-                    if current_section:
-                        sections[current_section] = '\n'.join(current_content).strip()
-                        debug_log(f"Added section: {current_section}")
-                        current_content = []
-                    current_section = line.split(':')[0].strip()
-                else:
-                    current_content.append(line)
-            
-            if current_section:
-                sections[current_section] = '\n'.join(current_content).strip()
-                debug_log(f"Added final section: {current_section}")
-            
-            debug_log("Completed parsing app intent", {
-                "section_count": len(sections),
-                "sections": list(sections.keys())
-            })
-            return sections
-            
-        except Exception as e:
-            error_msg = f"Error getting app intent: {str(e)}"
-            logger.error(error_msg)
-            debug_log(f"App intent failed: {str(e)}")
-            raise
-
-    def _get_app_css(self, app_purpose: str, ui_requirements: str) -> str:
-        """Generate app-wide CSS."""
-        try:
-            debug_log("Generating app-wide CSS")
-            css_template = self._load_prompt_template('app_styling')
-            formatted_prompt = css_template.replace('{app_purpose}', app_purpose)
-            formatted_prompt = formatted_prompt.replace('{ui_requirements}', ui_requirements)
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                messages=[{"role": "user", "content": formatted_prompt}]
-            )
-            
-            css_content = message.content[0].text.strip()
-            debug_log("Generated app-wide CSS", {
-                "css_length": len(css_content)
-            })
-            return css_content
-            
-        except Exception as e:
-            error_msg = f"Error generating app CSS: {str(e)}"
-            logger.error(error_msg)
-            debug_log(f"CSS generation failed: {str(e)}")
-            raise
-
-    def _get_page_logic(self, page_name: str, page_purpose: str, template: str, app_css: str) -> str:
-        """Generate JavaScript logic for a page."""
-        try:
-            logic_prompt = self._load_prompt_template('page_logic')
-            formatted_prompt = logic_prompt.replace('{page_name}', page_name)
-            formatted_prompt = formatted_prompt.replace('{page_purpose}', page_purpose)
-            formatted_prompt = formatted_prompt.replace('{page_template}', template)
-            formatted_prompt = formatted_prompt.replace('{app_css}', app_css)
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                messages=[{"role": "user", "content": formatted_prompt}]
-            )
-            
-            return message.content[0].text.strip()
-            
-        except Exception as e:
-            logger.error(f"Error generating page logic: {str(e)}")
-            raise
-
-    def generate_app_v2(self) -> App:
-        """Generate an app using the split prompting approach for better reliability."""
-        try:
-            # Step 1: Get app metadata
-            app_metadata = self._get_app_metadata()
-            
-            # Create the app
-            app = App.objects.create(
-                organization=self.organization,
-                name=app_metadata['name'],
-                description=app_metadata.get('description', ''),
-                initial_prompt=self.prompt,
-                status='ACTIVE'
-            )
-            
-            # Step 2: Get pages structure
-            pages_structure = self._get_app_pages_structure(app_metadata)
-            
-            # Step 3: Generate each page with split concerns
-            self._create_pages(app, pages_structure)
-            
-            # Step 4: Set up initial data structure if defined
-            if 'data_structure' in app_metadata:
-                self._setup_data_structure(app, app_metadata['data_structure'])
-            
-            return app
-
-        except Exception as e:
-            logger.error(f"Error in generate_app_v2: {str(e)}")
-            raise 
-
-    def _get_app_metadata(self) -> dict:
-        """Get basic app metadata including name, description, and theme."""
-        try:
-            metadata_template = self._load_prompt_template('app_metadata')
-            formatted_prompt = metadata_template.replace('{prompt_content}', self.prompt.content)
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=1000,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": formatted_prompt}]
-                    }
-                ]
-            )
-            
-            response_text = self._clean_json_response(message.content[0].text.strip())
-            return json.loads(response_text)
-        except Exception as e:
-            logger.error(f"Error getting app metadata: {str(e)}")
-            raise
-
-    def _get_app_pages_structure(self, app_metadata: dict) -> list:
-        """Get the structure of pages for the app."""
-        try:
-            pages_template = self._load_prompt_template('app_pages')
-            formatted_prompt = pages_template.replace('{prompt_content}', self.prompt.content)
-            formatted_prompt = formatted_prompt.replace('{app_metadata}', json.dumps(app_metadata))
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=2000,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": formatted_prompt}]
-                    }
-                ]
-            )
-            
-            response_text = self._clean_json_response(message.content[0].text.strip())
-            return json.loads(response_text)
-        except Exception as e:
-            logger.error(f"Error getting app pages structure: {str(e)}")
-            raise
-
-    def _get_page_context(self, page_name: str, template: str) -> list:
-        """Get the context variables needed for a page template."""
-        try:
-            context_prompt = self._load_prompt_template('page_context')
-            formatted_prompt = context_prompt.replace('{page_name}', page_name)
-            formatted_prompt = formatted_prompt.replace('{template}', template)
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=1000,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": formatted_prompt}]
-                    }
-                ]
-            )
-            
-            response_text = self._clean_json_response(message.content[0].text.strip())
-            return json.loads(response_text)
-        except Exception as e:
-            logger.error(f"Error getting page context for {page_name}: {str(e)}")
-            raise
-
-    def _get_page_logic(self, page_name: str, template: str, base_css: str) -> str:
-        """Get the JavaScript logic for a specific page."""
-        try:
-            logic_prompt = self._load_prompt_template('page_logic')
-            formatted_prompt = logic_prompt.replace('{page_name}', page_name)
-            formatted_prompt = formatted_prompt.replace('{template}', template)
-            formatted_prompt = formatted_prompt.replace('{base_css}', base_css)
-            
-            message = self.claude.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": formatted_prompt}]
-                    }
-                ]
-            )
-            
-            return message.content[0].text.strip()
-        except Exception as e:
-            logger.error(f"Error getting page logic for {page_name}: {str(e)}")
-            raise
-
-    def generate_app_v2(self) -> App:
-        """Generate an app using the split prompting approach for better reliability."""
-        try:
-            # Step 1: Get app metadata
-            app_metadata = self._get_app_metadata()
-            
-            # Create the app
-            app = App.objects.create(
-                organization=self.organization,
-                name=app_metadata['name'],
-                description=app_metadata.get('description', ''),
-                initial_prompt=self.prompt,
-                status='ACTIVE'
-            )
-            
-            # Step 2: Get pages structure
-            pages_structure = self._get_app_pages_structure(app_metadata)
-            
-            # Step 3: Generate each page with split concerns
-            self._create_pages(app, pages_structure)
-            
-            # Step 4: Set up initial data structure if defined
-            if 'data_structure' in app_metadata:
-                self._setup_data_structure(app, app_metadata['data_structure'])
-            
-            return app
-
-        except Exception as e:
-            logger.error(f"Error in generate_app_v2: {str(e)}")
-            raise 
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+Minification and precompression of generated HTML, CSS and JS.
+
+Generated stylesheets and scripts are served as content-addressed assets
+(see ``AppAsset``): each distinct minified body is stored once together
+with its gzip and, when the ``brotli`` package is installed, brotli
+encodings, so requests never compress on the fly. Generated page
+templates are whitespace-collapsed before they are stored.
+"""
+import gzip
+import hashlib
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CONTENT_TYPES = {
+    'css': 'text/css; charset=utf-8',
+    'js': 'application/javascript; charset=utf-8',
+}
+
+
+ACCEPTS_BROTLI = re.compile(r'\bbr\b')
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+def negotiate_encoding(accept_encoding: str, brotli_available: bool = True):
+    """Pick 'br', 'gzip' or None for a request's Accept-Encoding header."""
+    if brotli_available and ACCEPTS_BROTLI.search(accept_encoding):
+        return 'br'
+    if ACCEPTS_GZIP.search(accept_encoding):
+        return 'gzip'
+    return None
+
+
+def minify_css(css: str) -> str:
+    """Strip comments and redundant whitespace from a stylesheet."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    # Keep the space in "a :hover" style selectors but not after property names
+    css = re.sub(r'\s*:\s*(?=[^{]*[;}])', ':', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+
+# Elements whose whitespace is significant, plus conditional comments
+PRESERVED_HTML = re.compile(
+    r'(<(pre|textarea|script|style)\b.*?</\2\s*>|<!--\[if.*?<!\[endif\]-->)',
+    re.DOTALL | re.IGNORECASE
+)
+
+
+def minify_html(html: str) -> str:
+    """
+    Collapse whitespace and drop comments in an HTML (or Django) template.
+
+    Whitespace runs become a single newline or space, which browsers render
+    identically; ``pre``, ``textarea``, ``script`` and ``style`` contents
+    are left untouched.
+    """
+    parts = []
+    position = 0
+    for match in PRESERVED_HTML.finditer(html):
+        parts.append(_collapse_html(html[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_collapse_html(html[position:]))
+    return ''.join(parts).strip()
+
+
+def _collapse_html(html: str) -> str:
+    html = re.sub(r'<!--.*?-->', '', html, flags=re.DOTALL)
+    html = re.sub(r'\s*\n\s*', '\n', html)
+    return re.sub(r'[ \t\r\f\v]+', ' ', html)
+
+
+def minify_js(js: str) -> str:
+    """
+    Drop indentation and blank lines from a script.
+
+    Deliberately conservative: without a parser, removing comments or
+    joining lines could change what strings or regular expressions match.
+    """
+    lines = (line.strip() for line in js.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+MINIFIERS = {
+    'css': minify_css,
+    'js': minify_js,
+}
+
+
+def digest(content: str) -> str:
+    """Short content hash used in asset URLs."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:20]
+
+
+def compress(content: str) -> tuple[bytes, bytes]:
+    """Return the gzip and brotli encodings (brotli is None if unavailable)."""
+    raw = content.encode('utf-8')
+    # mtime=0 keeps the output deterministic for identical content
+    gzipped = gzip.compress(raw, compresslevel=9, mtime=0)
+    brotlied = brotli.compress(raw, quality=11) if brotli else None
+    return gzipped, brotlied
@@ -0,0 +1,473 @@
+"""
+Offline bulk generation through the Message Batches API.
+
+Non-interactive workloads, such as seeding template galleries or
+regenerating every app after a change to ``static/prompts/``, do not need
+answers within seconds. ``start_batch_generation`` runs them as a
+``GenerationBatch`` instead of one ``generate_app_async`` task per app.
+Each pipeline stage collects its requests across all apps into one provider
+batch:
+
+- ``SKELETON``: the fused ``app_skeleton`` step for every app
+- ``TEMPLATES``: ``page_template`` for every page
+- ``PAGES``: ``page_js`` and ``page_queries`` for every page
+
+``poll_generation_batch`` runs as a django_q task that reschedules itself
+until the stage's batch has ended. It then applies the results and submits
+the next stage; after the last stage the apps are stored. Batched requests
+skip the shared rate limiter. An item whose request fails or whose output
+does not match its schema fails on its own, without a repair call, and the
+rest of the batch carries on.
+
+``BatchClient`` talks to the API over plain HTTP. With the ``local``
+backend, ``LocalBatchTransport`` serves the same endpoints in process from
+ReplayBackend recordings, for tests and offline runs.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_q.tasks import schedule
+from datetime import timedelta
+from anything_apps.models import GenerationBatch, GenerationBatchItem, Prompt
+from users.models import UserProfile
+from utils import rollups
+from utils.app_generator import (
+    APP_SKELETON_MAX_TOKENS, PAGE_JS_MAX_TOKENS, PAGE_QUERIES_MAX_TOKENS, PAGE_TEMPLATE_MAX_TOKENS, AppGenerator
+)
+from utils.llm import LLMBackend, LLMBackendError, LLMResponse, ReplayBackend, estimate_tokens
+from utils.schemas import STEP_SCHEMAS, SchemaValidationError, validate
+from utils.tasks import prompt_token_cost
+import httpx
+import itertools
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+BATCHES_PATH = '/v1/messages/batches'
+API_VERSION = '2023-06-01'
+BATCHES_BETA = 'message-batches-2024-09-24'
+# Provider limit on the number of requests in one batch
+MAX_BATCH_REQUESTS = 100000
+
+STAGES = ['SKELETON', 'TEMPLATES', 'PAGES', 'DONE']
+
+
+def _config() -> dict:
+    return getattr(settings, 'LLM_BATCH', {})
+
+
+class BatchError(LLMBackendError):
+    """Raised when the batch endpoint rejects a request or cannot be reached."""
+
+
+class BatchClient:
+    """Minimal client for the Message Batches endpoints."""
+
+    def __init__(self, api_key: str = None, base_url: str = None, transport: httpx.BaseTransport = None):
+        self.http = httpx.Client(
+            base_url=base_url or _config().get('base_url', 'https://api.anthropic.com'),
+            headers={
+                'x-api-key': api_key or settings.ANTHROPIC_API_KEY,
+                'anthropic-version': API_VERSION,
+                'anthropic-beta': BATCHES_BETA,
+            },
+            transport=transport,
+            timeout=60
+        )
+
+    def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        try:
+            response = self.http.request(method, url, **kwargs)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise BatchError(f"Batch request {method} {url} failed: {e}") from e
+        return response
+
+    def create(self, requests: list[dict]) -> dict:
+        """Submit ``requests`` (``custom_id`` and Messages API ``params``) as one batch."""
+        return self._request('POST', BATCHES_PATH, json={'requests': requests}).json()
+
+    def retrieve(self, batch_id: str) -> dict:
+        return self._request('GET', f"{BATCHES_PATH}/{batch_id}").json()
+
+    def results(self, batch: dict) -> dict:
+        """Results of an ended batch, by ``custom_id``."""
+        url = batch.get('results_url') or f"{BATCHES_PATH}/{batch['id']}/results"
+        results = {}
+        for line in self._request('GET', url).text.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                results[entry['custom_id']] = entry['result']
+        return results
+
+
+class LocalBatchTransport(httpx.BaseTransport):
+    """
+    Serves the Message Batches endpoints in process.
+
+    Each request is answered by a ReplayBackend for the step named in its
+    ``custom_id`` (see ``request_id``); structured steps answer with a
+    ``tool_use`` block like the live API. A batch reports
+    ``in_progress`` for its first ``polls`` retrievals and has ended after
+    that.
+    """
+
+    def __init__(self, backend: LLMBackend = None, polls: int = 0):
+        self.backend = backend or ReplayBackend()
+        self.polls = polls
+        self.batches = {}
+        self._ids = itertools.count(1)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.method == 'POST' and path == BATCHES_PATH:
+            return self._create(json.loads(request.content))
+        match = re.fullmatch(rf"{BATCHES_PATH}/([\w-]+)(/results)?", path)
+        if request.method == 'GET' and match and match.group(1) in self.batches:
+            batch = self.batches[match.group(1)]
+            if match.group(2):
+                lines = [json.dumps({'custom_id': custom_id, 'result': result}) for custom_id, result in batch['results']]
+                return httpx.Response(200, text='\n'.join(lines))
+            response = httpx.Response(200, json=self._batch_object(batch['id']))
+            batch['polls'] = max(batch['polls'] - 1, 0)
+            return response
+        return httpx.Response(404, json={'type': 'error', 'error': {'type': 'not_found_error', 'message': path}})
+
+    def _create(self, body: dict) -> httpx.Response:
+        batch_id = f"msgbatch_local_{next(self._ids)}"
+        self.batches[batch_id] = {
+            'id': batch_id,
+            'polls': self.polls,
+            'results': [(entry['custom_id'], self._answer(entry)) for entry in body['requests']],
+        }
+        return httpx.Response(200, json=self._batch_object(batch_id))
+
+    def _answer(self, entry: dict) -> dict:
+        params = entry['params']
+        step = entry['custom_id'].split('-')[1]
+        prompt = params['messages'][0]['content']
+        try:
+            response = self.backend.call(step, prompt, max_tokens=params['max_tokens'])
+        except LLMBackendError as e:
+            return {'type': 'errored', 'error': {'type': 'invalid_request_error', 'message': str(e)}}
+        content = [{'type': 'text', 'text': response.text}]
+        if params.get('tools'):
+            try:
+                content = [{'type': 'tool_use', 'id': f"toolu_{entry['custom_id']}",
+                            'name': params['tools'][0]['name'], 'input': json.loads(response.text)}]
+            except json.JSONDecodeError:
+                pass
+        return {'type': 'succeeded', 'message': {
+            'id': f"msg_{entry['custom_id']}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': params['model'],
+            'content': content,
+            'stop_reason': 'tool_use' if content[0]['type'] == 'tool_use' else 'end_turn',
+            'usage': {'input_tokens': response.input_tokens, 'output_tokens': response.output_tokens},
+        }}
+
+    def _batch_object(self, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        ended = batch['polls'] == 0
+        succeeded = sum(1 for _, result in batch['results'] if result['type'] == 'succeeded')
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {
+                'processing': 0 if ended else len(batch['results']),
+                'succeeded': succeeded if ended else 0,
+                'errored': len(batch['results']) - succeeded if ended else 0,
+                'canceled': 0,
+                'expired': 0,
+            },
+            'results_url': f"{BATCHES_PATH}/{batch_id}/results" if ended else None,
+        }
+
+
+_local_transport = None
+
+
+def get_batch_client() -> BatchClient:
+    """The batch client for ``LLM_BATCH['backend']``: ``anthropic`` or ``local``."""
+    global _local_transport
+    if _config().get('backend', 'anthropic') == 'local':
+        # Shared so batches submitted earlier in this process can be polled
+        if _local_transport is None:
+            _local_transport = LocalBatchTransport()
+        return BatchClient(api_key='local', base_url='http://batches.local', transport=_local_transport)
+    return BatchClient()
+
+
+def request_id(item_id: int, step: str, index: int = 0) -> str:
+    """The ``custom_id`` of a step's request for a batch item (and page index)."""
+    return f"{item_id}-{step}-{index}"
+
+
+def _request(custom_id: str, step: str, prompt: str, max_tokens: int, models: LLMBackend) -> dict:
+    params = {
+        'model': models.model(step),
+        'max_tokens': max_tokens,
+        'temperature': 0.7,
+        'messages': [{'role': 'user', 'content': prompt}],
+    }
+    schema = STEP_SCHEMAS.get(step)
+    if schema is not None:
+        # Same forced tool call as AnthropicBackend._call_structured
+        params['tools'] = [{'name': step, 'description': schema.get('description', ''), 'input_schema': schema}]
+        params['tool_choice'] = {'type': 'tool', 'name': step}
+    return {'custom_id': custom_id, 'params': params}
+
+
+def _response(results: dict, custom_id: str, step: str) -> LLMResponse:
+    """The response for one request, with structured output checked against the step schema."""
+    result = results.get(custom_id)
+    if result is None:
+        raise BatchError(f"No result for request {custom_id}")
+    if result['type'] != 'succeeded':
+        error = result.get('error', {}).get('message', result['type'])
+        raise BatchError(f"Request {custom_id} {result['type']}: {error}")
+
+    message = result['message']
+    data = next((block['input'] for block in message['content'] if block['type'] == 'tool_use'), None)
+    text = json.dumps(data) if data is not None else ''.join(
+        block['text'] for block in message['content'] if block['type'] == 'text'
+    )
+    schema = STEP_SCHEMAS.get(step)
+    if schema is not None:
+        errors = ['the output is not valid JSON'] if data is None else validate(data, schema)
+        if errors:
+            raise SchemaValidationError(step, errors)
+    usage = message.get('usage', {})
+    return LLMResponse(
+        text,
+        message.get('model', ''),
+        input_tokens=usage.get('input_tokens', 0),
+        output_tokens=usage.get('output_tokens', estimate_tokens(text)),
+        data=data
+    )
+
+
+def _stage_requests(stage: str, item: GenerationBatchItem, generator: AppGenerator) -> list[dict]:
+    models = generator.llm
+    if stage == 'SKELETON':
+        return [_request(
+            request_id(item.id, 'app_skeleton'), 'app_skeleton',
+            generator._app_skeleton_prompt(), APP_SKELETON_MAX_TOKENS, models
+        )]
+
+    tables = item.skeleton['tables']
+    requests = []
+    for index, page in enumerate(item.pages):
+        if stage == 'TEMPLATES':
+            requests.append(_request(
+                request_id(item.id, 'page_template', index), 'page_template',
+                generator._page_template_prompt(page['name'], page['description'], tables),
+                PAGE_TEMPLATE_MAX_TOKENS, models
+            ))
+        elif stage == 'PAGES':
+            requests.append(_request(
+                request_id(item.id, 'page_js', index), 'page_js',
+                generator._page_js_prompt(page['name'], page['template']), PAGE_JS_MAX_TOKENS, models
+            ))
+            requests.append(_request(
+                request_id(item.id, 'page_queries', index), 'page_queries',
+                generator._page_queries_prompt(page['name'], page['template'], tables),
+                PAGE_QUERIES_MAX_TOKENS, models
+            ))
+    return requests
+
+
+def _apply_results(stage: str, item: GenerationBatchItem, results: dict):
+    if stage == 'SKELETON':
+        skeleton = _response(results, request_id(item.id, 'app_skeleton'), 'app_skeleton').data
+        item.skeleton = skeleton
+        item.pages = [
+            {'name': page['name'], 'slug': page['slug'], 'description': page.get('description', '')}
+            for page in skeleton['pages']
+        ]
+        return
+
+    for index, page in enumerate(item.pages):
+        if stage == 'TEMPLATES':
+            page['template'] = _response(results, request_id(item.id, 'page_template', index), 'page_template').text.strip()
+        elif stage == 'PAGES':
+            js = _response(results, request_id(item.id, 'page_js', index), 'page_js').text
+            page['js'] = AppGenerator._extract_js(js)
+            page['queries'] = _response(results, request_id(item.id, 'page_queries', index), 'page_queries').data['queries']
+
+
+def _generator(batch: GenerationBatch, item: GenerationBatchItem) -> AppGenerator:
+    # The backend is only used to resolve the model of each step
+    return AppGenerator(batch.organization, item.prompt, llm=LLMBackend())
+
+
+def _fail_item(item: GenerationBatchItem, error: str):
+    logger.warning(f"Batch {item.batch_id} item {item.id} failed: {error}")
+    item.status = 'FAILED'
+    item.error_message = error
+    item.save(update_fields=['status', 'error_message'])
+    # A regeneration's prompt belongs to an app that is still working
+    if item.app_id is None:
+        item.prompt.status = 'FAILED'
+        item.prompt.error_message = error
+        item.prompt.save()
+
+
+def _fail_batch(batch: GenerationBatch, error: str):
+    for item in _pending_items(batch):
+        _fail_item(item, error)
+    batch.status = 'FAILED'
+    batch.error_message = error
+    batch.finished_at = timezone.now()
+    batch.save(update_fields=['status', 'error_message', 'finished_at', 'updated_at'])
+
+
+def _pending_items(batch: GenerationBatch) -> list[GenerationBatchItem]:
+    return list(batch.items.filter(status='PENDING').select_related('prompt', 'app'))
+
+
+def _submit_stage(batch: GenerationBatch, client: BatchClient):
+    """Submit the current stage's requests for all pending items, or finish the batch."""
+    requests = []
+    for item in _pending_items(batch):
+        try:
+            requests.extend(_stage_requests(batch.stage, item, _generator(batch, item)))
+        except Exception as e:
+            _fail_item(item, str(e))
+    if not requests:
+        _finish(batch)
+        return
+    if len(requests) > MAX_BATCH_REQUESTS:
+        raise BatchError(f"Stage {batch.stage} has {len(requests)} requests, more than {MAX_BATCH_REQUESTS}")
+
+    provider_batch = client.create(requests)
+    batch.provider_batch_id = provider_batch['id']
+    batch.save(update_fields=['provider_batch_id', 'updated_at'])
+    logger.info(f"Submitted stage {batch.stage} of batch {batch.id} as {batch.provider_batch_id} ({len(requests)} requests)")
+    _schedule_poll(batch)
+
+
+def _schedule_poll(batch: GenerationBatch):
+    schedule(
+        'utils.batches.poll_generation_batch', batch.id,
+        next_run=timezone.now() + timedelta(seconds=_config().get('poll_interval', 60))
+    )
+
+
+def _finish(batch: GenerationBatch):
+    """Store the apps of all items that made it through every stage."""
+    for item in _pending_items(batch):
+        try:
+            app = _generator(batch, item).assemble_app(item.skeleton, item.pages, app=item.app)
+        except Exception as e:
+            _fail_item(item, str(e))
+            continue
+        item.app = app
+        item.status = 'DONE'
+        item.save(update_fields=['app', 'status'])
+        item.prompt.status = 'COMPLETED'
+        item.prompt.save()
+
+    batch.stage = 'DONE'
+    batch.status = 'DONE'
+    batch.finished_at = timezone.now()
+    batch.save(update_fields=['stage', 'status', 'finished_at', 'updated_at'])
+    logger.info(f"Finished generation batch {batch.id}")
+
+
+def start_batch_generation(organization, user, contents=(), apps=(), client: BatchClient = None) -> GenerationBatch:
+    """
+    Start generating an app for each prompt in ``contents``, and regenerating
+    each app in ``apps`` in place from its initial prompt, as one batch.
+
+    New prompts are charged like ``generate_app_async`` up front, all
+    together; regenerations are not charged. Raises ``ValueError`` if the
+    user does not have enough tokens. If the first stage cannot be
+    submitted, the batch fails, the tokens are refunded and the error is
+    raised.
+    """
+    contents = [content.strip() for content in contents if content.strip()]
+    costs = [prompt_token_cost(content) for content in contents]
+    with transaction.atomic():
+        if costs and not UserProfile.get_or_create_profile(user).deduct_tokens(sum(costs)):
+            raise ValueError('Insufficient tokens')
+        batch = GenerationBatch.objects.create(organization=organization, user=user)
+        prompts = Prompt.objects.bulk_create([
+            Prompt(content=content, user=user, organization=organization, tokens_used=cost, status='PROCESSING')
+            for content, cost in zip(contents, costs)
+        ])
+        GenerationBatchItem.objects.bulk_create(
+            [GenerationBatchItem(batch=batch, prompt=prompt) for prompt in prompts]
+            + [GenerationBatchItem(batch=batch, prompt_id=app.initial_prompt_id, app=app) for app in apps]
+        )
+    if costs:
+        rollups.record_tokens_used(user.id, sum(costs))
+
+    try:
+        _submit_stage(batch, client or get_batch_client())
+    except Exception as e:
+        logger.exception(f"Could not submit generation batch {batch.id}: {str(e)}")
+        _fail_batch(batch, str(e))
+        if costs:
+            UserProfile.get_or_create_profile(user).add_tokens(sum(costs))
+            rollups.record_tokens_used(user.id, -sum(costs))
+        raise
+    return batch
+
+
+def poll_generation_batch(batch_id: int, client: BatchClient = None):
+    """
+    django_q task: check the current stage's provider batch and, once it
+    has ended, apply its results and move on to the next stage.
+    """
+    try:
+        batch = GenerationBatch.objects.select_related('organization').get(id=batch_id)
+    except GenerationBatch.DoesNotExist:
+        logger.error(f"Generation batch {batch_id} not found")
+        return {'error': 'Batch not found'}
+    if batch.status != 'RUNNING' or not batch.provider_batch_id:
+        return {'skipped': True, 'stage': batch.stage}
+
+    client = client or get_batch_client()
+    try:
+        provider_batch = client.retrieve(batch.provider_batch_id)
+    except BatchError as e:
+        # Transient errors must not strand the batch; try again later
+        logger.warning(f"Could not poll generation batch {batch.id}: {str(e)}")
+        _schedule_poll(batch)
+        return {'error': str(e), 'stage': batch.stage}
+    if provider_batch['processing_status'] != 'ended':
+        _schedule_poll(batch)
+        return {'stage': batch.stage, 'processing_status': provider_batch['processing_status']}
+
+    # Claimed with a conditional update so overlapping polls advance a stage only once
+    if not GenerationBatch.objects.filter(id=batch.id, provider_batch_id=provider_batch['id']).update(provider_batch_id=''):
+        return {'skipped': True, 'stage': batch.stage}
+
+    try:
+        results = client.results(provider_batch)
+        for item in _pending_items(batch):
+            try:
+                _apply_results(batch.stage, item, results)
+            except Exception as e:
+                _fail_item(item, str(e))
+                continue
+            item.save(update_fields=['skeleton', 'pages'])
+
+        batch.stage = STAGES[STAGES.index(batch.stage) + 1]
+        batch.provider_batch_id = ''
+        batch.save(update_fields=['stage', 'provider_batch_id', 'updated_at'])
+        if batch.stage == 'DONE':
+            _finish(batch)
+        else:
+            _submit_stage(batch, client)
+    except Exception as e:
+        logger.exception(f"Generation batch {batch.id} failed in stage {batch.stage}: {str(e)}")
+        _fail_batch(batch, str(e))
+        return {'error': str(e), 'stage': batch.stage}
+
+    return {'stage': batch.stage, 'status': batch.status}
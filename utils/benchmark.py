@@ -0,0 +1,576 @@
+"""
+Offline benchmark harness for the generator and request paths.
+
+Scenarios run against a seeded database and a ``ReplayBackend`` serving
+recorded responses, so they need no network access. Each scenario reports
+wall time, LLM call count and input tokens, DB query count and peak Python
+memory.
+"""
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models.signals import post_save
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django_q.brokers.orm import ORM
+from django_q.brokers.redis_broker import Redis
+from django_q.cluster import Cluster
+from django_q.models import Task
+from django_q.tasks import async_task
+from anything_apps.models import App, AppPage, DataStore, GenerationJob, Prompt
+from anything_org.models import Organization, OrganizationMember
+from utils.app_generator import AppGenerator
+from utils.assets import brotli, minify_html
+from utils.llm import ReplayBackend
+from users.models import UserProfile
+from utils.brokers import LocalBroker
+from utils.rate_limiter import RateLimiter
+import json
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+RECORDINGS_PATH = os.path.join(settings.BASE_DIR, 'utils', 'recordings', 'generation.json')
+
+SCENARIOS = {}
+
+# Scenarios that only run when named explicitly
+OPT_IN_SCENARIOS = set()
+
+
+def scenario(name: str, default: bool = True):
+    """Register a benchmark scenario under ``name``."""
+    def register(func):
+        SCENARIOS[name] = func
+        if not default:
+            OPT_IN_SCENARIOS.add(name)
+        return func
+    return register
+
+
+class BenchmarkResult:
+    """Measurements collected for one scenario."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_times = []
+        self.llm_calls = []
+        self.llm_input_tokens = []
+        self.queries = []
+        self.peak_memory = 0
+        self.extra = {}
+
+    def as_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'iterations': len(self.wall_times),
+            'wall_time_ms': _summarize(self.wall_times) if self.wall_times else None,
+            'llm_calls': round(statistics.mean(self.llm_calls), 2) if self.llm_calls else None,
+            'llm_input_tokens': round(statistics.mean(self.llm_input_tokens), 2) if self.llm_input_tokens else None,
+            'db_queries': round(statistics.mean(self.queries), 2) if self.queries else None,
+            'peak_memory_kb': round(self.peak_memory / 1024, 1),
+            **self.extra,
+        }
+
+
+def _summarize(seconds: list) -> dict:
+    return {
+        'mean': round(statistics.mean(seconds) * 1000, 2),
+        'median': round(statistics.median(seconds) * 1000, 2),
+        'max': round(max(seconds) * 1000, 2),
+    }
+
+
+class BenchmarkContext:
+    """Objects shared by all scenarios of a run."""
+
+    def __init__(self, user, organization, app, llm, rate_limiter, rows: int):
+        self.user = user
+        self.organization = organization
+        self.app = app
+        self.llm = llm
+        self.rate_limiter = rate_limiter
+        self.rows = rows
+        self.client = Client()
+        self.client.force_login(user)
+        self.request_factory = RequestFactory()
+
+
+def measure(name: str, func, context: BenchmarkContext, iterations: int, setup=None) -> BenchmarkResult:
+    """
+    Run ``func`` ``iterations`` times and collect its measurements.
+
+    ``setup`` is called before every run and its return value is passed to
+    ``func``; its cost is not measured. Peak memory comes from one extra run
+    under tracemalloc so tracing overhead does not skew the timings.
+    """
+    result = BenchmarkResult(name)
+
+    for _ in range(iterations):
+        args = setup() if setup else ()
+        calls_before = context.llm.usage['calls']
+        input_tokens_before = context.llm.usage['input_tokens']
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            func(*args)
+            result.wall_times.append(time.perf_counter() - start)
+        result.queries.append(len(queries))
+        result.llm_calls.append(context.llm.usage['calls'] - calls_before)
+        result.llm_input_tokens.append(context.llm.usage['input_tokens'] - input_tokens_before)
+
+    args = setup() if setup else ()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, result.peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result
+
+
+def benchmark_rate_limiter() -> RateLimiter:
+    """
+    A limiter whose budget is never exhausted.
+
+    The limiter's bookkeeping queries are still measured, but replayed calls
+    are never throttled into sleeping.
+    """
+    return RateLimiter(requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12)
+
+
+def seed_database(rows: int, llm) -> BenchmarkContext:
+    """Create a user, organization and generated app with ``rows`` DataStore rows."""
+    user = User.objects.create_user('benchmark', 'benchmark@example.com', 'benchmark')
+    organization = Organization.objects.create(name='Benchmark Org', owner=user)
+    OrganizationMember.objects.create(organization=organization, user=user, role='ADMIN')
+    prompt = Prompt.objects.create(
+        content='A task tracker with a summary page',
+        user=user,
+        organization=organization,
+        tokens_used=0
+    )
+    rate_limiter = benchmark_rate_limiter()
+    app = AppGenerator(organization, prompt, llm=llm, rate_limiter=rate_limiter).generate_app()
+
+    keys = [('title', 'str'), ('done', 'bool'), ('due', 'date'), ('priority', 'int')]
+    DataStore.objects.bulk_create([
+        DataStore(
+            app=app,
+            table_name='tasks',
+            key=keys[i % len(keys)][0],
+            value=_sample_value(keys[i % len(keys)][1], i),
+            value_type=keys[i % len(keys)][1]
+        )
+        for i in range(rows)
+    ], batch_size=1000)
+
+    return BenchmarkContext(user, organization, app, llm, rate_limiter, rows)
+
+
+def _sample_value(value_type: str, i: int) -> str:
+    if value_type == 'bool':
+        return 'true' if i % 3 == 0 else 'false'
+    if value_type == 'date':
+        return f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}"
+    if value_type == 'int':
+        return str(i % 5 + 1)
+    return f"Task number {i}"
+
+
+def _bench_generation(name: str, context: BenchmarkContext, iterations: int, fused_skeleton: bool,
+                      lazy_pages: bool = False) -> BenchmarkResult:
+    """Time full generations, and separately the time until the first page is stored."""
+    first_page_times = []
+
+    def setup():
+        prompt = Prompt.objects.create(
+            content='A task tracker with a summary page',
+            user=context.user,
+            organization=context.organization,
+            tokens_used=0
+        )
+        return (prompt,)
+
+    def run(prompt):
+        start = time.perf_counter()
+        first_page = []
+
+        def page_created(sender, created=False, **kwargs):
+            if created and not first_page:
+                first_page.append(time.perf_counter() - start)
+
+        post_save.connect(page_created, sender=AppPage, weak=False)
+        try:
+            AppGenerator(
+                context.organization, prompt,
+                llm=context.llm, rate_limiter=context.rate_limiter,
+                fused_skeleton=fused_skeleton, lazy_pages=lazy_pages
+            ).generate_app()
+        finally:
+            post_save.disconnect(page_created, sender=AppPage)
+        first_page_times.extend(first_page)
+
+    result = measure(name, run, context, iterations, setup=setup)
+    # The last run is the traced one used for peak memory
+    if first_page_times[:iterations]:
+        result.extra['first_page_ms'] = _summarize(first_page_times[:iterations])
+    return result
+
+
+@scenario('generate_app')
+def bench_generate_app(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    return _bench_generation('generate_app', context, iterations, fused_skeleton=True)
+
+
+@scenario('generate_app_split')
+def bench_generate_app_split(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    """Generation with separate name, table and page list calls, for comparison."""
+    return _bench_generation('generate_app_split', context, iterations, fused_skeleton=False)
+
+
+@scenario('generate_app_lazy')
+def bench_generate_app_lazy(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    """Generation with only the landing page generated and the other pages stubbed."""
+    return _bench_generation('generate_app_lazy', context, iterations, fused_skeleton=True, lazy_pages=True)
+
+
+@scenario('update_app')
+def bench_update_app(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    def run():
+        generator = AppGenerator(
+            context.organization,
+            context.app.initial_prompt,
+            llm=context.llm,
+            rate_limiter=context.rate_limiter
+        )
+        generator.update_app(context.app, 'Add a clear button to the tasks page')
+
+    return measure('update_app', run, context, iterations)
+
+
+@scenario('page_render')
+def bench_page_render(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    def setup():
+        request = context.request_factory.get('/')
+        request.user = context.user
+        return (AppPage.objects.get(app=context.app, slug='tasks'), request)
+
+    def run(page, request):
+        page.render(request)
+
+    return measure('page_render', run, context, iterations, setup=setup)
+
+
+@scenario('render_app_page')
+def bench_render_app_page(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    url = reverse('apps:render_page', args=[context.app.id, 'tasks'])
+
+    def run():
+        response = context.client.get(url)
+        assert response.status_code == 200, response.status_code
+
+    return measure('render_app_page', run, context, iterations)
+
+
+@scenario('page_compression')
+def bench_page_compression(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    """
+    Bytes and latency of a generated page per encoding.
+
+    Minification is measured on the recorded page templates (what the
+    generator stores); the page itself is fetched with each
+    Accept-Encoding the middleware negotiates.
+    """
+    templates = context.llm.recordings.get('page_template', [])
+    raw = sum(len(template.encode('utf-8')) for template in templates)
+    minified = sum(len(minify_html(template).encode('utf-8')) for template in templates)
+
+    url = reverse('apps:render_page', args=[context.app.id, 'tasks'])
+    encodings = {'identity': 'identity', 'gzip': 'gzip'}
+    if brotli:
+        encodings['br'] = 'br, gzip'
+
+    result = BenchmarkResult('page_compression')
+    result.extra['template_bytes'] = {
+        'raw': raw,
+        'minified': minified,
+        'saved_pct': round(100 * (raw - minified) / raw, 1) if raw else None,
+    }
+    for label, accept_encoding in encodings.items():
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = context.client.get(url, HTTP_ACCEPT_ENCODING=accept_encoding)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+        result.extra[label] = {
+            'bytes': len(response.content),
+            'encoding': response.get('Content-Encoding', '-'),
+            **_summarize(timings),
+        }
+    return result
+
+
+@scenario('data_store_list')
+def bench_data_store_list(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    url = reverse('apps:data_store_list', args=[context.app.id])
+
+    def run():
+        response = context.client.get(url, {'table_name': 'tasks', 'per_page': 50, 'page': 2})
+        assert response.status_code == 200, response.status_code
+
+    return measure('data_store_list', run, context, iterations)
+
+
+@scenario('data_store_detail')
+def bench_data_store_detail(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    item = context.app.data_store.exclude(value='').first()
+    url = reverse('apps:data_store_detail', args=[context.app.id, item.id])
+
+    def run():
+        response = context.client.get(url)
+        assert response.status_code == 200, response.status_code
+
+    return measure('data_store_detail', run, context, iterations)
+
+
+@scenario('data_store_create')
+def bench_data_store_create(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    url = reverse('apps:data_store_create', args=[context.app.id])
+    body = json.dumps({'table_name': 'tasks', 'key': 'title', 'value': 'Benchmark task', 'value_type': 'str'})
+
+    def run():
+        response = context.client.post(url, body, content_type='application/json')
+        assert response.status_code == 201, response.status_code
+
+    return measure('data_store_create', run, context, iterations)
+
+
+@scenario('write_concurrency', default=False)
+def bench_write_concurrency(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    """
+    Four worker threads write while two web clients list and create rows.
+
+    Workers mimic django_q tasks: they poll for queued jobs like the ORM
+    broker and insert DataStore rows in transactions. Each profile runs for
+    ``iterations`` seconds. On SQLite the load runs once with the default
+    rollback journal and once with ``SQLITE_PRAGMAS``; wall times are the
+    web request latencies of the last profile.
+    """
+    profiles = {'configured': settings.SQLITE_PRAGMAS}
+    if connection.vendor == 'sqlite':
+        if connection.is_in_memory_db():
+            raise RuntimeError("write_concurrency needs a file database; run it through the benchmark command")
+        profiles = {'rollback_journal': {'journal_mode': 'DELETE'}, 'tuned': settings.SQLITE_PRAGMAS}
+
+    result = BenchmarkResult('write_concurrency')
+    for label, pragmas in profiles.items():
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            # Reconnect so the main thread also picks up the profile
+            connection.close()
+            stats, latencies = _run_concurrent_load(context, duration=max(iterations, 1))
+        result.extra[label] = stats
+        result.wall_times = latencies or [0]
+    connection.close()
+    return result
+
+
+def _run_concurrent_load(context: BenchmarkContext, duration: float, workers: int = 4,
+                         web_clients: int = 2) -> tuple[dict, list]:
+    deadline = time.monotonic() + duration
+    lock = threading.Lock()
+    stats = {'worker_writes': 0, 'worker_lock_errors': 0, 'web_requests': 0, 'web_errors': 0}
+    latencies = []
+
+    def count(**increments):
+        with lock:
+            for key, value in increments.items():
+                stats[key] += value
+
+    def worker(index):
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    GenerationJob.objects.filter(status='QUEUED').exists()
+                    with transaction.atomic():
+                        DataStore.objects.bulk_create([
+                            DataStore(app=context.app, table_name='tasks', key='title',
+                                      value=f'Worker {index} row {i}', value_type='str')
+                            for i in range(5)
+                        ])
+                        App.objects.filter(id=context.app.id).update(updated_at=timezone.now())
+                    count(worker_writes=1)
+                except OperationalError:
+                    count(worker_lock_errors=1)
+        finally:
+            connection.close()
+
+    def web_client():
+        list_url = reverse('apps:data_store_list', args=[context.app.id])
+        create_url = reverse('apps:data_store_create', args=[context.app.id])
+        body = json.dumps({'table_name': 'tasks', 'key': 'title', 'value': 'Web task', 'value_type': 'str'})
+        client = Client()
+        try:
+            client.force_login(context.user)
+            requests = 0
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                if requests % 2:
+                    response = client.post(create_url, body, content_type='application/json')
+                else:
+                    response = client.get(list_url, {'table_name': 'tasks', 'per_page': 20})
+                elapsed = time.perf_counter() - start
+                requests += 1
+                with lock:
+                    latencies.append(elapsed)
+                count(web_requests=1, web_errors=int(response.status_code >= 500))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    threads += [threading.Thread(target=web_client) for _ in range(web_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'worker_writes_per_second': round(stats['worker_writes'] / duration, 1),
+        'worker_lock_errors': stats['worker_lock_errors'],
+        'web_requests_per_second': round(stats['web_requests'] / duration, 1),
+        'web_errors': stats['web_errors'],
+        'web_p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else None,
+    }, latencies
+
+
+@scenario('task_latency', default=False)
+def bench_task_latency(context: BenchmarkContext, iterations: int) -> BenchmarkResult:
+    """
+    Enqueue-to-start latency of ``generate_app_async`` per django_q broker.
+
+    For the ORM broker, the local stand-in and Redis (when reachable) a
+    cluster is started in-process, ``iterations`` generations are enqueued
+    half a second apart, and latency is measured up to the moment a worker
+    starts running the task.
+    """
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        raise RuntimeError("task_latency needs a file database; run it through the benchmark command")
+
+    UserProfile.get_or_create_profile(context.user).add_tokens(10 ** 6)
+    brokers = {'orm': ORM(), 'local': LocalBroker(), 'redis': Redis()}
+
+    result = BenchmarkResult('task_latency')
+    for label, broker in brokers.items():
+        try:
+            broker.ping()
+        except Exception as e:
+            result.extra[label] = {'skipped': f"broker unavailable ({e.__class__.__name__})"}
+            continue
+        latencies = _measure_task_latency(context, broker, iterations)
+        result.extra[label] = _summarize(latencies) if latencies else {'skipped': 'no task started'}
+    return result
+
+
+def _measure_task_latency(context: BenchmarkContext, broker, iterations: int,
+                          spacing: float = 0.5, timeout: float = 120) -> list:
+    # Forked workers inherit these settings, so they generate from recordings
+    worker_settings = override_settings(
+        LLM_BACKEND='replay',
+        LLM_REPLAY_PATH=RECORDINGS_PATH,
+        LLM_RATE_LIMIT={'enabled': False}
+    )
+    with worker_settings:
+        # Workers must not share the parent's database connections
+        connections.close_all()
+        cluster = Cluster(broker)
+        cluster.start()
+        try:
+            enqueued = {}
+            for _ in range(iterations):
+                prompt = Prompt.objects.create(
+                    content='A task tracker with a summary page',
+                    user=context.user,
+                    organization=context.organization,
+                    tokens_used=0
+                )
+                enqueued_at = time.time()
+                task_id = async_task(
+                    'utils.benchmark.run_timed',
+                    'utils.tasks.generate_app_async',
+                    context.organization.id,
+                    prompt.id,
+                    context.user.id,
+                    q_options={'broker': broker}
+                )
+                enqueued[task_id] = enqueued_at
+                time.sleep(spacing)
+
+            deadline = time.monotonic() + timeout
+            while True:
+                results = dict(Task.objects.filter(id__in=enqueued).values_list('id', 'result'))
+                if len(results) == len(enqueued) or time.monotonic() > deadline:
+                    break
+                time.sleep(0.2)
+        finally:
+            cluster.stop()
+
+    return [
+        results[task_id]['started'] - enqueued[task_id]
+        for task_id in results
+        if isinstance(results[task_id], dict) and 'started' in results[task_id]
+    ]
+
+
+def run_timed(func_path: str, *args, **kwargs) -> dict:
+    """django_q entry point recording when a worker picked the task up."""
+    started = time.time()
+    return {'started': started, 'result': import_string(func_path)(*args, **kwargs)}
+
+
+def run_benchmarks(names: list = None, rows: int = 1000, iterations: int = 5,
+                   recordings_path: str = None, latency: float = 0) -> list[BenchmarkResult]:
+    """Seed the database and run the selected scenarios (all but opt-in ones by default)."""
+    llm = ReplayBackend(path=recordings_path or RECORDINGS_PATH, latency=latency)
+    context = seed_database(rows, llm)
+
+    results = []
+    for name in names or [name for name in SCENARIOS if name not in OPT_IN_SCENARIOS]:
+        logger.info(f"Running benchmark scenario {name}")
+        results.append(SCENARIOS[name](context, iterations))
+    return results
+
+
+@contextmanager
+def isolated_database():
+    """
+    Run the enclosed block against a throwaway test database.
+
+    The configured database is never written to; the test database is
+    destroyed on exit just like under the test runner. SQLite test databases
+    are files rather than in-memory, so journaling and locking behave as
+    they do when deployed.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'anything_benchmark_{os.getpid()}.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,66 @@
+"""
+Additional django_q brokers.
+
+``LocalBroker`` is an in-process stand-in for the Redis broker. Select it
+with ``Q_BROKER=local``; deployments use ``redis`` or the ORM fallback.
+"""
+from django_q.brokers import Broker
+from django_q.conf import Conf
+import multiprocessing
+import queue
+import threading
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+class LocalBroker(Broker):
+    """
+    Broker backed by ``multiprocessing`` queues.
+
+    Queues are shared with processes forked after they are created, so a
+    cluster started from the enqueuing process (tests, benchmarks) consumes
+    tasks without a round trip through Redis or the database. Separate
+    processes such as a standalone ``qcluster`` cannot reach them.
+    """
+
+    def enqueue(self, task):
+        self.connection.put(task)
+
+    def dequeue(self):
+        try:
+            # Block briefly like Redis' BLPOP so the pusher does not spin
+            task = self.connection.get(timeout=1)
+        except queue.Empty:
+            return None
+        return [(None, task)]
+
+    def queue_size(self) -> int:
+        return self.connection.qsize()
+
+    def delete_queue(self):
+        self.purge_queue()
+
+    def purge_queue(self):
+        while True:
+            try:
+                # Puts reach the queue through a feeder thread, so allow
+                # recently enqueued tasks a moment to arrive
+                self.connection.get(timeout=0.1)
+            except queue.Empty:
+                return
+
+    def ping(self) -> bool:
+        return True
+
+    def info(self) -> str:
+        if not self._info:
+            self._info = 'Local'
+        return self._info
+
+    @staticmethod
+    def get_connection(list_key: str = Conf.PREFIX):
+        with _queues_lock:
+            if list_key not in _queues:
+                _queues[list_key] = multiprocessing.Queue()
+            return _queues[list_key]
@@ -0,0 +1,116 @@
+"""
+Namespaced, versioned caching on top of Django's cache framework.
+
+Entries are grouped into namespaces such as ``app:<id>`` or ``user:<id>``.
+Every namespace has a version number stored in the cache and embedded in
+its keys, so ``invalidate`` drops everything in a namespace with a single
+increment instead of tracking individual keys. Hits and misses are counted
+per kind of entry (``page``, ``data_store_list`` ...) for ``stats``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+import hashlib
+import threading
+import time
+
+DEFAULT_TTL = 60
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def app_namespace(app_id: int) -> str:
+    return f'app:{app_id}'
+
+
+def org_namespace(organization_id: int) -> str:
+    return f'org:{organization_id}'
+
+
+def user_namespace(user_id: int) -> str:
+    return f'user:{user_id}'
+
+
+def ttl(kind: str) -> int:
+    """Timeout in seconds for a kind of entry, from ``settings.CACHE_TTLS``."""
+    return getattr(settings, 'CACHE_TTLS', {}).get(kind, DEFAULT_TTL)
+
+
+def _version_key(namespace: str) -> str:
+    return f'version:{namespace}'
+
+
+def namespace_version(namespace: str) -> int:
+    """Current version of a namespace, initializing it on first use."""
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 1 so an evicted version never
+        # brings back entries written under an earlier one
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def make_key(namespace: str, kind: str, *parts) -> str:
+    """Build a versioned key; long or unsafe parts are hashed."""
+    suffix = ':'.join(str(part) for part in parts)
+    if len(suffix) > 100 or any(char.isspace() for char in suffix):
+        suffix = hashlib.sha1(suffix.encode('utf-8')).hexdigest()
+    return f'{namespace}:v{namespace_version(namespace)}:{kind}:{suffix}'
+
+
+def get(namespace: str, kind: str, *parts, default=None):
+    """Read an entry, counting the hit or miss."""
+    value = cache.get(make_key(namespace, kind, *parts))
+    _record(kind, hit=value is not None)
+    return default if value is None else value
+
+
+def set(namespace: str, kind: str, *parts, value, timeout: int = None):
+    cache.set(make_key(namespace, kind, *parts), value, ttl(kind) if timeout is None else timeout)
+
+
+def get_or_set(namespace: str, kind: str, *parts, producer, timeout: int = None):
+    """Return the cached entry, computing and storing it with ``producer`` on a miss."""
+    key = make_key(namespace, kind, *parts)
+    value = cache.get(key)
+    _record(kind, hit=value is not None)
+    if value is None:
+        value = producer()
+        cache.set(key, value, ttl(kind) if timeout is None else timeout)
+    return value
+
+
+def invalidate(*namespaces: str):
+    """Drop every entry in the given namespaces by bumping their versions."""
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Not initialized yet, so nothing is cached under it either
+            namespace_version(namespace)
+
+
+def _record(kind: str, hit: bool):
+    with _stats_lock:
+        counts = _stats.setdefault(kind, {'hits': 0, 'misses': 0})
+        counts['hits' if hit else 'misses'] += 1
+
+
+def stats() -> dict:
+    """Hits, misses and hit rate per kind of entry, for this process."""
+    with _stats_lock:
+        return {
+            kind: {
+                **counts,
+                'hit_rate': round(counts['hits'] / (counts['hits'] + counts['misses']), 3),
+            }
+            for kind, counts in _stats.items()
+        }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,75 @@
+"""
+Bulk copies of existing apps.
+
+``clone_app`` copies an app's pages, their context queries, its table
+columns and its models in a constant number of queries, however large
+the app is. Accepting a near-duplicate match (``utils.similarity``) this
+way replaces a full generation pipeline with a database copy. Stored data
+rows are not copied; only the empty column definitions are.
+"""
+from django.db import transaction
+from anything_apps.models import App, AppModel, AppPage, ContextQuery, DataStore, Prompt
+
+
+def clone_app(source: App, organization, user, content: str) -> App:
+    """
+    Copy ``source`` into ``organization`` as a new app for ``user``. The
+    clone gets a completed prompt with ``content`` as its initial prompt,
+    so later updates and matches work as for a generated app.
+    """
+    with transaction.atomic():
+        prompt = Prompt.objects.create(
+            content=content,
+            user=user,
+            organization=organization,
+            tokens_used=0,
+            status='COMPLETED'
+        )
+        app = App.objects.create(
+            organization=organization,
+            name=source.name,
+            description=source.description,
+            initial_prompt=prompt,
+            css_content=source.css_content,
+            status='ACTIVE'
+        )
+
+        DataStore.objects.bulk_create([
+            DataStore(app=app, table_name=table_name, key=key, value='', value_type=value_type)
+            for table_name, key, value_type in source.data_store.columns()
+        ])
+        AppModel.objects.bulk_create([
+            AppModel(app=app, name=model.name, fields=model.fields, relationships=model.relationships)
+            for model in source.models.all()
+        ])
+
+        source_pages = list(source.pages.prefetch_related('context_queries'))
+        # bulk_create skips AppPage.save, so the digests are copied too; the
+        # content is identical and the JS asset is already stored
+        pages = AppPage.objects.bulk_create([
+            AppPage(
+                app=app,
+                name=page.name,
+                slug=page.slug,
+                description=page.description,
+                # Pages the source has not generated yet are generated afresh for the clone
+                status='READY' if page.status == 'READY' else 'PENDING',
+                template_content=page.template_content,
+                template_version=page.template_version,
+                js_content=page.js_content,
+                js_digest=page.js_digest
+            )
+            for page in source_pages
+        ])
+        ContextQuery.objects.bulk_create([
+            ContextQuery(
+                page=page,
+                context_key=query.context_key,
+                query_type=query.query_type,
+                query_content=query.query_content,
+                order=query.order
+            )
+            for source_page, page in zip(source_pages, pages)
+            for query in source_page.context_queries.all()
+        ])
+    return app
@@ -0,0 +1,13 @@
+"""
+Helpers for HTTP conditional requests.
+
+Views pair these with Django's ``condition`` decorator: validators are
+derived from ``updated_at`` timestamps and the app's cache namespace
+version, which changes whenever any of the app's pages or data change.
+"""
+import hashlib
+
+
+def make_etag(*parts) -> str:
+    """Opaque validator built from the parts that determine a response."""
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
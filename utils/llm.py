@@ -0,0 +1,299 @@
+"""
+LLM backends used by the app generator.
+
+Every generation step calls the model through an ``LLMBackend`` so the
+provider, the model used for each step and the transport can be swapped
+without touching the generator. ``AnthropicBackend`` talks to the live API;
+``ReplayBackend`` serves recorded responses locally for tests and load tests.
+
+Steps that return data rather than code use ``call_structured`` with the
+step's JSON schema (see ``utils.schemas``); the parsed result is on
+``LLMResponse.data`` and ``text`` holds it serialized as JSON.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+import anthropic
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'claude-3-sonnet-20240229'
+
+
+class LLMBackendError(Exception):
+    """Raised when a backend cannot produce a response for a step."""
+
+
+class LLMResponse:
+    """Text, structured data (if requested) and token usage of a single model call."""
+
+    def __init__(self, text: str, model: str, input_tokens: int = 0, output_tokens: int = 0, data=None):
+        self.text = text
+        self.model = model
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.data = data
+
+    def __repr__(self):
+        return f"LLMResponse(model={self.model!r}, output_tokens={self.output_tokens})"
+
+
+class LLMBackend:
+    """
+    Base class for LLM backends.
+
+    Subclasses implement ``_call`` and optionally ``_stream`` and
+    ``_call_structured``. Callers use ``call``/``stream``/``call_structured``,
+    which resolve the model for the step and keep the running ``usage``
+    totals.
+    """
+
+    name = None
+
+    def __init__(self, models: dict = None):
+        self.models = dict(getattr(settings, 'LLM_MODELS', {}))
+        self.models.update(models or {})
+        self.usage = {'calls': 0, 'input_tokens': 0, 'output_tokens': 0}
+        self._usage_lock = threading.Lock()
+
+    def model(self, step: str) -> str:
+        """Return the model configured for a generation step."""
+        return self.models.get(step) or self.models.get('default') or DEFAULT_MODEL
+
+    def call(self, step: str, prompt: str, max_tokens: int, temperature: float = 0.7) -> LLMResponse:
+        """Run a single-turn completion for ``step`` and return the full response."""
+        response = self._call(step, self.model(step), prompt, max_tokens, temperature)
+        self._record_usage(response)
+        return response
+
+    def call_structured(self, step: str, prompt: str, schema: dict, max_tokens: int,
+                        temperature: float = 0.7) -> LLMResponse:
+        """
+        Run a completion for ``step`` whose output should match ``schema``.
+
+        ``data`` on the response is the parsed output, or None if it was not
+        JSON at all; checking it against the schema is up to the caller.
+        """
+        response = self._call_structured(step, self.model(step), prompt, schema, max_tokens, temperature)
+        self._record_usage(response)
+        return response
+
+    def stream(self, step: str, prompt: str, max_tokens: int, temperature: float = 0.7):
+        """Yield the response text for ``step`` in chunks as it is produced."""
+        chunks = []
+        for chunk in self._stream(step, self.model(step), prompt, max_tokens, temperature):
+            chunks.append(chunk)
+            yield chunk
+        text = ''.join(chunks)
+        self._record_usage(LLMResponse(
+            text,
+            self.model(step),
+            input_tokens=estimate_tokens(prompt),
+            output_tokens=estimate_tokens(text)
+        ))
+
+    def _call(self, step, model, prompt, max_tokens, temperature) -> LLMResponse:
+        raise NotImplementedError
+
+    def _stream(self, step, model, prompt, max_tokens, temperature):
+        # Backends without native streaming yield the whole response at once
+        yield self._call(step, model, prompt, max_tokens, temperature).text
+
+    def _call_structured(self, step, model, prompt, schema, max_tokens, temperature) -> LLMResponse:
+        # Backends without tool use are expected to answer with plain JSON
+        response = self._call(step, model, prompt, max_tokens, temperature)
+        try:
+            response.data = json.loads(response.text)
+        except json.JSONDecodeError:
+            response.data = None
+        return response
+
+    def _record_usage(self, response: LLMResponse):
+        with self._usage_lock:
+            self.usage['calls'] += 1
+            self.usage['input_tokens'] += response.input_tokens
+            self.usage['output_tokens'] += response.output_tokens
+
+
+class AnthropicBackend(LLMBackend):
+    """Backend for the Anthropic Messages API."""
+
+    name = 'anthropic'
+
+    def __init__(self, models: dict = None, api_key: str = None):
+        super().__init__(models)
+        self.client = anthropic.Client(api_key=api_key or settings.ANTHROPIC_API_KEY)
+
+    def _call(self, step, model, prompt, max_tokens, temperature) -> LLMResponse:
+        message = self.client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return LLMResponse(
+            message.content[0].text,
+            model,
+            input_tokens=message.usage.input_tokens,
+            output_tokens=message.usage.output_tokens
+        )
+
+    def _call_structured(self, step, model, prompt, schema, max_tokens, temperature) -> LLMResponse:
+        # The model has to answer by calling a tool whose input is the step
+        # schema, so the output arrives as parsed JSON. This SDK version has
+        # no tool_choice argument yet; the API accepts it in the body.
+        message = self.client.beta.tools.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            tools=[{
+                "name": step,
+                "description": schema.get('description', ''),
+                "input_schema": schema
+            }],
+            extra_body={"tool_choice": {"type": "tool", "name": step}},
+            messages=[{"role": "user", "content": prompt}]
+        )
+        data = next((block.input for block in message.content if block.type == 'tool_use'), None)
+        if data is not None:
+            text = json.dumps(data)
+        else:
+            text = ''.join(block.text for block in message.content if block.type == 'text')
+        return LLMResponse(
+            text,
+            model,
+            input_tokens=message.usage.input_tokens,
+            output_tokens=message.usage.output_tokens,
+            data=data
+        )
+
+    def stream(self, step: str, prompt: str, max_tokens: int, temperature: float = 0.7):
+        model = self.model(step)
+        with self.client.messages.stream(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}]
+        ) as stream:
+            yield from stream.text_stream
+            message = stream.get_final_message()
+        self._record_usage(LLMResponse(
+            message.content[0].text,
+            model,
+            input_tokens=message.usage.input_tokens,
+            output_tokens=message.usage.output_tokens
+        ))
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Deterministic local backend serving recorded responses.
+
+    Recordings map a step name to a list of response texts, either passed in
+    directly or loaded from a JSON file. Each step replays its responses in
+    order and wraps around when it runs out, so a single recording can drive
+    any number of generations. ``latency`` (seconds) is slept before each
+    response to approximate real provider timings.
+    """
+
+    name = 'replay'
+
+    def __init__(self, models: dict = None, recordings: dict = None, path: str = None, latency: float = None):
+        super().__init__(models)
+        if recordings is None:
+            path = path or getattr(settings, 'LLM_REPLAY_PATH', None)
+            if not path:
+                raise LLMBackendError("ReplayBackend needs recordings or LLM_REPLAY_PATH")
+            with open(path, 'r', encoding='utf-8') as f:
+                recordings = json.load(f)
+        self.recordings = {step: list(responses) for step, responses in recordings.items()}
+        self.latency = latency if latency is not None else getattr(settings, 'LLM_REPLAY_LATENCY', 0)
+        self._cursors = {}
+        self._cursor_lock = threading.Lock()
+
+    def _call(self, step, model, prompt, max_tokens, temperature) -> LLMResponse:
+        responses = self.recordings.get(step)
+        if not responses:
+            raise LLMBackendError(f"No recorded response for step '{step}'")
+
+        with self._cursor_lock:
+            index = self._cursors.get(step, 0)
+            self._cursors[step] = index + 1
+        text = responses[index % len(responses)]
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        return LLMResponse(
+            text,
+            model,
+            input_tokens=estimate_tokens(prompt),
+            output_tokens=estimate_tokens(text)
+        )
+
+
+class RecordingBackend(LLMBackend):
+    """
+    Wraps another backend and records every response per step.
+
+    ``save`` writes the recordings in the format ``ReplayBackend`` reads, so a
+    live run can be captured once and replayed offline afterwards.
+    """
+
+    name = 'record'
+
+    def __init__(self, backend: LLMBackend = None, models: dict = None):
+        super().__init__(models)
+        self.backend = backend or AnthropicBackend(models=models)
+        self.recordings = {}
+
+    def model(self, step: str) -> str:
+        return self.backend.model(step)
+
+    def _call(self, step, model, prompt, max_tokens, temperature) -> LLMResponse:
+        response = self.backend.call(step, prompt, max_tokens=max_tokens, temperature=temperature)
+        self.recordings.setdefault(step, []).append(response.text)
+        return response
+
+    def _call_structured(self, step, model, prompt, schema, max_tokens, temperature) -> LLMResponse:
+        # Recorded as JSON text, which ReplayBackend parses back
+        response = self.backend.call_structured(step, prompt, schema, max_tokens=max_tokens, temperature=temperature)
+        self.recordings.setdefault(step, []).append(response.text)
+        return response
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.recordings, f, indent=2)
+
+
+BACKENDS = {
+    AnthropicBackend.name: AnthropicBackend,
+    ReplayBackend.name: ReplayBackend,
+    RecordingBackend.name: RecordingBackend,
+}
+
+
+def get_llm_backend(name: str = None, **kwargs) -> LLMBackend:
+    """
+    Instantiate the configured LLM backend.
+
+    ``name`` defaults to ``settings.LLM_BACKEND`` and may be a registered
+    backend name or a dotted path to an ``LLMBackend`` subclass.
+    """
+    name = name or getattr(settings, 'LLM_BACKEND', AnthropicBackend.name)
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        try:
+            backend_class = import_string(name)
+        except ImportError as e:
+            raise LLMBackendError(f"Unknown LLM backend '{name}'") from e
+    logger.debug(f"Using LLM backend {name}")
+    return backend_class(**kwargs)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token)."""
+    return max(1, len(text) // 4) if text else 0
@@ -0,0 +1,69 @@
+"""
+Change tracking for model saves.
+
+``DirtyFieldsMixin`` remembers the field values an instance was loaded (or
+last saved) with. Saving an existing row then writes only the fields that
+differ, plus ``auto_now`` timestamps, and a save with nothing changed does
+not touch the database or send ``pre_save``/``post_save`` at all. Passing
+``update_fields`` explicitly, or saving a new row, behaves as usual.
+"""
+import copy
+
+
+class DirtyFieldsMixin:
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._remember(fields)
+
+    def _loaded_fields(self):
+        # Deferred fields are missing from __dict__ until they are loaded
+        return [
+            field for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname in self.__dict__
+        ]
+
+    def _remember(self, fields=None):
+        if not hasattr(self, '_saved_values'):
+            self._saved_values = {}
+        for field in self._loaded_fields():
+            if fields is None or field.name in fields or field.attname in fields:
+                # Copied so that in-place edits of JSON values are noticed
+                self._saved_values[field.attname] = copy.deepcopy(getattr(self, field.attname))
+
+    def get_dirty_fields(self) -> list:
+        """Names of the fields that differ from the values last loaded or saved."""
+        saved = getattr(self, '_saved_values', {})
+        return [
+            field.name for field in self._loaded_fields()
+            if field.attname not in saved or saved[field.attname] != getattr(self, field.attname)
+        ]
+
+    def is_dirty(self) -> bool:
+        return bool(self.get_dirty_fields())
+
+    def save(self, *args, **kwargs):
+        # Rows created here or in bulk were never loaded, so there is
+        # nothing to compare against and every field is written
+        tracked = (
+            not self._state.adding
+            and hasattr(self, '_saved_values')
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        )
+        if tracked:
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            kwargs['update_fields'] = dirty + [
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False) and field.name not in dirty
+            ]
+        super().save(*args, **kwargs)
+        self._remember(kwargs.get('update_fields'))
@@ -0,0 +1,34 @@
+"""
+Queryset helpers shared by list views.
+"""
+from django.core.paginator import Paginator
+from django.db.models import F, Func, IntegerField, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset):
+    """
+    Correlated ``COUNT`` of ``queryset`` for use in ``annotate``.
+
+    Unlike ``Count`` over a relation it adds no join to the outer query, so
+    several counts can be annotated without multiplying rows.
+    """
+    counted = queryset.order_by().annotate(
+        count=Func(F('pk'), function='COUNT')
+    ).values('count')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def paginate(request, queryset, per_page: int) -> dict:
+    """
+    Template context for the requested page of ``queryset``.
+
+    ``page_params`` carries the other query parameters (search terms,
+    filters) so ``includes/pagination.html`` links keep them.
+    """
+    params = request.GET.copy()
+    params.pop('page', None)
+    return {
+        'page_obj': Paginator(queryset, per_page).get_page(request.GET.get('page')),
+        'page_params': params.urlencode(),
+    }
@@ -0,0 +1,152 @@
+"""
+Cluster-wide rate limiting for LLM calls.
+
+Bucket state lives in the database (``RateLimitBucket``), so every django_q
+worker and web process draws from the same requests-per-minute and
+tokens-per-minute budget. Callers wait for capacity instead of failing, and
+each organization is capped at a fair share of the global budget while
+other organizations are active.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta
+from anything_apps.models import RateLimitBucket
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_BUCKET = 'global'
+
+# How long an organization counts as active for fair-share purposes
+ACTIVE_WINDOW = timedelta(seconds=60)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when capacity does not free up within the maximum wait time."""
+
+
+class Reservation:
+    """Capacity taken from the buckets for one call, reconciled afterwards."""
+
+    def __init__(self, buckets: list, estimated_tokens: int):
+        self.buckets = buckets
+        self.estimated_tokens = estimated_tokens
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter shared through the database.
+
+    Buckets hold at most one minute of budget and refill continuously. A
+    call needs one request and its estimated token count from both the
+    global bucket and its organization's bucket; the organization bucket is
+    capped at ``1 / active organizations`` of the global rate.
+    """
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_wait: float = None, fair_share: bool = None):
+        config = getattr(settings, 'LLM_RATE_LIMIT', {})
+        self.requests_per_minute = requests_per_minute or config.get('requests_per_minute', 50)
+        self.tokens_per_minute = tokens_per_minute or config.get('tokens_per_minute', 80000)
+        self.max_wait = max_wait if max_wait is not None else config.get('max_wait', 300)
+        self.fair_share = fair_share if fair_share is not None else config.get('fair_share', True)
+
+    def acquire(self, organization_id: int = None, estimated_tokens: int = 0) -> Reservation:
+        """Block until the call fits in the budget, then reserve it."""
+        # A single call can never need more than a full minute of tokens
+        estimated_tokens = min(estimated_tokens, self.tokens_per_minute)
+        names = [GLOBAL_BUCKET]
+        if self.fair_share and organization_id is not None:
+            names.append(f'org:{organization_id}')
+
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self._try_acquire(names, estimated_tokens)
+            if wait <= 0:
+                return Reservation(names, estimated_tokens)
+
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(
+                    f"LLM rate limit capacity not available within {self.max_wait}s"
+                )
+            logger.info(f"LLM rate limit reached for {names[-1]}, waiting {wait:.1f}s")
+            # Jitter keeps waiting workers from retrying in lockstep
+            time.sleep(wait + random.uniform(0, 0.25))
+
+    def reconcile(self, reservation: Reservation, actual_tokens: int):
+        """Charge the difference between the estimated and actual token usage."""
+        difference = actual_tokens - reservation.estimated_tokens
+        if difference:
+            RateLimitBucket.objects.filter(name__in=reservation.buckets).update(
+                tokens=F('tokens') - difference
+            )
+
+    def _try_acquire(self, names: list, estimated_tokens: int) -> float:
+        """Reserve capacity if available; otherwise return the seconds to wait."""
+        now = timezone.now()
+        with transaction.atomic():
+            buckets = self._lock_buckets(names)
+            if len(buckets) < len(names):
+                # Another worker may create the same bucket at the same time;
+                # conflicts are ignored and the rows locked once they exist
+                RateLimitBucket.objects.bulk_create([
+                    RateLimitBucket(
+                        name=name,
+                        requests=self.requests_per_minute,
+                        tokens=self.tokens_per_minute,
+                        updated_at=now
+                    )
+                    for name in names if name not in buckets
+                ], ignore_conflicts=True)
+                buckets = self._lock_buckets(names)
+
+            share = 1.0
+            if len(names) > 1:
+                share = 1.0 / self._active_organizations(names[1], now)
+
+            wait = 0.0
+            for name in names:
+                bucket = buckets[name]
+                fraction = share if name != GLOBAL_BUCKET else 1.0
+                requests_rate = self.requests_per_minute * fraction / 60
+                tokens_rate = self.tokens_per_minute * fraction / 60
+
+                elapsed = max((now - bucket.updated_at).total_seconds(), 0)
+                bucket.requests = min(bucket.requests + elapsed * requests_rate, self.requests_per_minute * fraction)
+                bucket.tokens = min(bucket.tokens + elapsed * tokens_rate, self.tokens_per_minute * fraction)
+                bucket.updated_at = now
+
+                needed_tokens = min(estimated_tokens, self.tokens_per_minute * fraction)
+                if bucket.requests < 1:
+                    wait = max(wait, (1 - bucket.requests) / requests_rate)
+                if bucket.tokens < needed_tokens:
+                    wait = max(wait, (needed_tokens - bucket.tokens) / tokens_rate)
+
+            if wait <= 0:
+                for name in names:
+                    buckets[name].requests -= 1
+                    buckets[name].tokens -= estimated_tokens
+            for bucket in buckets.values():
+                bucket.save(update_fields=['requests', 'tokens', 'updated_at'])
+
+        return wait
+
+    def _lock_buckets(self, names: list) -> dict:
+        return {
+            bucket.name: bucket
+            for bucket in RateLimitBucket.objects.select_for_update().filter(name__in=names)
+        }
+
+    def _active_organizations(self, own_bucket: str, now) -> int:
+        """Count organizations that used the limiter recently, including the caller."""
+        active = (
+            RateLimitBucket.objects
+            .filter(name__startswith='org:', updated_at__gte=now - ACTIVE_WINDOW)
+            .exclude(name=own_bucket)
+            .count()
+        )
+        return active + 1
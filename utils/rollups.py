@@ -0,0 +1,145 @@
+"""
+Per-user dashboard rollups.
+
+``DashboardSummary`` holds everything the dashboard shows in one row.
+Counters (tokens used this period, DataStore writes, running generations)
+are adjusted in place with ``F`` expressions by the task layer and the
+DataStore API. Changes that affect every member of an organization (apps
+created, renamed or removed, membership changes) only mark the affected
+rows stale; a stale row, or one from an earlier period, is rebuilt from
+scratch the next time it is read.
+"""
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from anything_apps.models import App, DashboardSummary, GenerationJob, Prompt, PromptUpdate
+from anything_org.models import Organization, OrganizationMember
+
+RECENT_APPS = 5
+
+ACTIVE_JOB_STATUSES = ['QUEUED', 'RUNNING']
+
+
+def period_start(now=None):
+    """Counters cover calendar months."""
+    return (now or timezone.now()).date().replace(day=1)
+
+
+def summary_for(user) -> DashboardSummary:
+    """The user's summary, rebuilt first if missing, stale or from an earlier period."""
+    # The profile comes along for the token balance
+    summary = DashboardSummary.objects.filter(user=user).select_related('user__profile').first()
+    if summary is None or summary.stale or summary.period_start != period_start():
+        summary = rebuild(user, previous=summary)
+    return summary
+
+
+def rebuild(user, previous: DashboardSummary = None) -> DashboardSummary:
+    """Recompute a user's summary from the underlying tables."""
+    start = period_start()
+    apps = App.objects.for_user(user)
+    recent_apps = [
+        {
+            'id': app.id,
+            'name': app.name,
+            'organization': app.organization.name,
+            'status': app.status,
+            'created_at': app.created_at.isoformat(),
+        }
+        for app in apps[:RECENT_APPS]
+    ]
+    prompt_tokens = Prompt.objects.filter(
+        user=user, created_at__date__gte=start
+    ).aggregate(total=Sum('tokens_used'))['total']
+    update_tokens = PromptUpdate.objects.filter(
+        jobs__user=user, created_at__date__gte=start
+    ).aggregate(total=Sum('tokens_used'))['total']
+
+    # There is no log of DataStore writes, so the counter carries over
+    # within a period and restarts with the next one
+    data_writes = previous.data_writes if previous and previous.period_start == start else 0
+
+    summary, _ = DashboardSummary.objects.update_or_create(user=user, defaults={
+        'organization_count': OrganizationMember.objects.filter(user=user).count(),
+        'app_count': apps.count(),
+        'recent_apps': recent_apps,
+        'period_start': start,
+        'tokens_used': (prompt_tokens or 0) + (update_tokens or 0),
+        'data_writes': data_writes,
+        'running_generations': GenerationJob.objects.filter(
+            user=user, status__in=ACTIVE_JOB_STATUSES
+        ).count(),
+        'stale': False,
+    })
+    return summary
+
+
+def as_dict(summary: DashboardSummary) -> dict:
+    profile = getattr(summary.user, 'profile', None)
+    return {
+        'organization_count': summary.organization_count,
+        'app_count': summary.app_count,
+        'recent_apps': summary.recent_apps,
+        'period_start': summary.period_start.isoformat(),
+        'tokens_used': summary.tokens_used,
+        'token_balance': profile.token_count if profile else 0,
+        'data_writes': summary.data_writes,
+        'running_generations': summary.running_generations,
+        'updated_at': summary.updated_at.isoformat(),
+    }
+
+
+def _adjust(user_id: int, **deltas):
+    # Rows from an earlier period are left alone; they are rebuilt on read.
+    # Counters never go below zero even if an event was missed.
+    DashboardSummary.objects.filter(user_id=user_id, period_start=period_start()).update(
+        updated_at=timezone.now(),
+        **{field: Greatest(F(field) + delta, 0) for field, delta in deltas.items()}
+    )
+
+
+def record_tokens_used(user_id: int, amount: int):
+    _adjust(user_id, tokens_used=amount)
+
+
+def record_data_write(user_id: int):
+    _adjust(user_id, data_writes=1)
+
+
+def record_job_queued(user_id: int):
+    _adjust(user_id, running_generations=1)
+
+
+def record_job_finished(user_id: int):
+    _adjust(user_id, running_generations=-1)
+
+
+def mark_stale(user_ids=None, organization_id: int = None):
+    """Flag the summaries of the given users, or of an organization's members, for rebuild."""
+    summaries = DashboardSummary.objects.filter(stale=False)
+    if organization_id is not None:
+        summaries = summaries.filter(user__organizationmember__organization_id=organization_id)
+    else:
+        summaries = summaries.filter(user_id__in=user_ids)
+    summaries.update(stale=True)
+
+
+@receiver(post_save, sender=App)
+@receiver(post_delete, sender=App)
+def app_changed(sender, instance, **kwargs):
+    mark_stale(organization_id=instance.organization_id)
+
+
+@receiver(post_save, sender=Organization)
+def organization_changed(sender, instance, created, **kwargs):
+    # Recent apps show the organization name
+    if not created:
+        mark_stale(organization_id=instance.id)
+
+
+@receiver(post_save, sender=OrganizationMember)
+@receiver(post_delete, sender=OrganizationMember)
+def membership_changed(sender, instance, **kwargs):
+    mark_stale(user_ids=[instance.user_id])
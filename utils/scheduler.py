@@ -0,0 +1,296 @@
+"""
+Scheduling layer between the views and the django_q cluster.
+
+Generations and updates are recorded as ``GenerationJob`` rows instead of
+being pushed straight onto the broker. ``dispatch`` hands queued jobs to
+django_q only while worker slots are free, ordered by priority (updates
+before generations) and round-robin across organizations, with a cap on
+how many jobs one organization may run at once. Dispatches are serialized
+on a ``SchedulerLock`` row so concurrent callers never exceed those caps.
+A user's identical pending prompts are collapsed onto the existing job; a
+unique constraint on active jobs makes that hold under concurrent enqueues
+too.
+
+Pages stubbed by lazy page generation are small jobs that go straight to
+django_q through ``enqueue_page_generation``.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django_q.brokers import get_broker
+from django_q.tasks import async_task
+from datetime import timedelta
+from anything_apps.models import AppPage, GenerationJob, Prompt, PromptUpdate, SchedulerLock
+from utils import rollups
+from utils.app_generator import PAGE_GENERATION_TIMEOUT
+from utils.tasks import generate_app_async, update_app_async
+import hashlib
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ['QUEUED', 'RUNNING']
+
+
+def _config() -> dict:
+    return getattr(settings, 'GENERATION_SCHEDULER', {})
+
+
+def prompt_hash(content: str) -> str:
+    """Hash a prompt after normalizing case and whitespace."""
+    normalized = re.sub(r'\s+', ' ', content).strip().lower()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def enqueue_generation(organization, user, content: str) -> tuple[GenerationJob, bool]:
+    """
+    Queue an app generation.
+
+    Returns ``(job, created)``; ``created`` is False when an identical prompt
+    from the same user and organization is already queued or running.
+    """
+    content_hash = prompt_hash(content)
+    active = GenerationJob.objects.filter(
+        kind='GENERATE',
+        organization=organization,
+        user=user,
+        content_hash=content_hash,
+        status__in=ACTIVE_STATUSES
+    )
+    existing = active.first()
+    if not existing:
+        try:
+            with transaction.atomic():
+                prompt = Prompt.objects.create(
+                    content=content,
+                    user=user,
+                    organization=organization,
+                    tokens_used=0,
+                    status='PENDING'
+                )
+                job = GenerationJob.objects.create(
+                    kind='GENERATE',
+                    organization=organization,
+                    user=user,
+                    prompt=prompt,
+                    priority=_config().get('priorities', {}).get('GENERATE', 10),
+                    content_hash=content_hash
+                )
+        except IntegrityError:
+            # A concurrent request queued the same prompt first
+            existing = active.first()
+            if not existing:
+                raise
+    if existing:
+        logger.info(f"Deduplicated generation for user {user.id} in organization {organization.id} onto job {existing.id}")
+        return existing, False
+
+    rollups.record_job_queued(user.id)
+    dispatch()
+    job.refresh_from_db()
+    return job, True
+
+
+def enqueue_update(app, user, content: str) -> tuple[GenerationJob, bool]:
+    """
+    Queue an app update.
+
+    Returns ``(job, created)``; ``created`` is False when the same update is
+    already queued or running for the app.
+    """
+    content_hash = prompt_hash(content)
+    active = GenerationJob.objects.filter(
+        kind='UPDATE',
+        app=app,
+        content_hash=content_hash,
+        status__in=ACTIVE_STATUSES
+    )
+    existing = active.first()
+    if not existing:
+        try:
+            with transaction.atomic():
+                prompt_update = PromptUpdate.objects.create(
+                    original_prompt=app.initial_prompt,
+                    update_content=content,
+                    tokens_used=0,
+                    status='PENDING'
+                )
+                job = GenerationJob.objects.create(
+                    kind='UPDATE',
+                    organization_id=app.organization_id,
+                    user=user,
+                    app=app,
+                    prompt_update=prompt_update,
+                    priority=_config().get('priorities', {}).get('UPDATE', 0),
+                    content_hash=content_hash
+                )
+        except IntegrityError:
+            # A concurrent request queued the same update first
+            existing = active.first()
+            if not existing:
+                raise
+    if existing:
+        logger.info(f"Deduplicated update for app {app.id} onto job {existing.id}")
+        return existing, False
+
+    rollups.record_job_queued(user.id)
+    dispatch()
+    job.refresh_from_db()
+    return job, True
+
+
+def enqueue_page_generation(page, user) -> bool:
+    """
+    Queue generation of a stubbed page.
+
+    Returns False when the page is ready or already queued or generating,
+    so repeated visits queue it once. Failed pages, and pages whose worker
+    went away, are queued again.
+    """
+    now = timezone.now()
+    queueable = Q(status__in=['PENDING', 'FAILED']) | Q(
+        status__in=['QUEUED', 'GENERATING'], updated_at__lt=now - PAGE_GENERATION_TIMEOUT
+    )
+    if not AppPage.objects.filter(queueable, id=page.id).update(status='QUEUED', updated_at=now):
+        return False
+    page.status = 'QUEUED'
+    page.updated_at = now
+    async_task('utils.tasks.generate_page_async', page.id, user.id, q_options={'task_name': f"page-{page.id}"})
+    logger.info(f"Queued generation of page {page.id} of app {page.app_id}")
+    return True
+
+
+def dispatch() -> int:
+    """
+    Send as many queued jobs to django_q as there are free slots.
+
+    Safe to call from any process at any time: slots are counted and jobs
+    claimed while holding the scheduler lock, and the claimed jobs are sent
+    to django_q once it is released.
+    """
+    config = _config()
+    _expire_stale_jobs()
+
+    with transaction.atomic():
+        _lock_scheduler()
+        jobs = _claim_jobs(config.get('max_running', 4), config.get('org_max_running', 2))
+
+    for job in jobs:
+        options = {'task_name': f"{job.kind.lower()}-{job.id}"}
+        queue = config.get('queues', {}).get(job.kind)
+        if queue:
+            options['broker'] = get_broker(list_key=queue)
+        task_id = async_task('utils.scheduler.run_job', job.id, q_options=options)
+        GenerationJob.objects.filter(id=job.id).update(task_id=task_id or '')
+        logger.info(f"Dispatched {job.kind} job {job.id} for organization {job.organization_id}")
+
+    return len(jobs)
+
+
+def _lock_scheduler():
+    lock = SchedulerLock.objects.select_for_update().filter(name='dispatch').first()
+    if lock is None:
+        SchedulerLock.objects.bulk_create([SchedulerLock(name='dispatch')], ignore_conflicts=True)
+        SchedulerLock.objects.select_for_update().get(name='dispatch')
+
+
+def _claim_jobs(max_running: int, org_max_running: int) -> list:
+    """Move the next queued jobs that fit the free slots to RUNNING; the scheduler lock must be held."""
+    running = GenerationJob.objects.filter(status='RUNNING')
+    free_slots = max_running - running.count()
+    if free_slots <= 0:
+        return []
+
+    org_running = dict(
+        running.values('organization_id')
+        .annotate(count=Count('id'))
+        .values_list('organization_id', 'count')
+    )
+
+    # Rank each organization's n-th queued job after every organization's
+    # (n-1)-th job so one busy organization cannot starve the others.
+    # Only each organization's first org_max_running jobs can fit its cap,
+    # so those are read for every organization, however long one's queue is.
+    queued = GenerationJob.objects.filter(status='QUEUED').annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('organization_id')],
+            order_by=[F('priority').asc(), F('created_at').asc()]
+        )
+    ).filter(position__lte=org_max_running).order_by('priority', 'created_at')
+    ordinals = {}
+    candidates = []
+    for job in queued:
+        ordinal = org_running.get(job.organization_id, 0) + ordinals.get(job.organization_id, 0)
+        ordinals[job.organization_id] = ordinals.get(job.organization_id, 0) + 1
+        if ordinal >= org_max_running:
+            continue
+        candidates.append((job.priority, ordinal, job.created_at, job))
+    candidates.sort(key=lambda candidate: candidate[:3])
+
+    claimed = [job for _, _, _, job in candidates[:free_slots]]
+    GenerationJob.objects.filter(id__in=[job.id for job in claimed]).update(
+        status='RUNNING',
+        started_at=timezone.now()
+    )
+    return claimed
+
+
+def run_job(job_id: int) -> dict:
+    """django_q entry point: run a dispatched job, then free its slot."""
+    job = GenerationJob.objects.get(id=job_id)
+    result = {'error': 'Job did not run'}
+    try:
+        if job.kind == 'GENERATE':
+            result = generate_app_async(job.organization_id, job.prompt_id, job.user_id)
+            if result.get('success') and getattr(settings, 'PAGE_GENERATION', 'eager') == 'background':
+                for page in AppPage.objects.filter(app_id=result['app_id'], status='PENDING'):
+                    enqueue_page_generation(page, job.user)
+        else:
+            result = update_app_async(job.app_id, job.prompt_update_id, job.user_id)
+        return result
+    finally:
+        GenerationJob.objects.filter(id=job_id).update(
+            status='FAILED' if not result or result.get('error') else 'DONE',
+            finished_at=timezone.now()
+        )
+        rollups.record_job_finished(job.user_id)
+        dispatch()
+
+
+def queue_metrics() -> dict:
+    """Queue depth, running jobs and wait times per job kind."""
+    now = timezone.now()
+    window_start = now - timedelta(hours=1)
+    metrics = {}
+    for kind, _ in GenerationJob.KIND_CHOICES:
+        jobs = GenerationJob.objects.filter(kind=kind)
+        queued = jobs.filter(status='QUEUED').aggregate(depth=Count('id'), oldest=Min('created_at'))
+        waits = jobs.filter(started_at__gte=window_start).aggregate(
+            average=Avg(ExpressionWrapper(F('started_at') - F('created_at'), output_field=DurationField()))
+        )
+        average_wait = waits['average']
+        metrics[kind.lower()] = {
+            'queued': queued['depth'],
+            'running': jobs.filter(status='RUNNING').count(),
+            'oldest_wait_seconds': (now - queued['oldest']).total_seconds() if queued['oldest'] else 0,
+            'average_wait_seconds_last_hour': average_wait.total_seconds() if average_wait else 0,
+        }
+    return metrics
+
+
+def _expire_stale_jobs():
+    """Fail RUNNING jobs whose worker died without reporting back."""
+    timeout = settings.Q_CLUSTER.get('timeout', 600)
+    stale = GenerationJob.objects.filter(
+        status='RUNNING',
+        started_at__lt=timezone.now() - timedelta(seconds=timeout * 2)
+    )
+    user_ids = list(stale.values_list('user_id', flat=True))
+    if user_ids:
+        stale.update(status='FAILED', finished_at=timezone.now())
+        # Their running counts are recomputed rather than decremented
+        rollups.mark_stale(user_ids=user_ids)
@@ -0,0 +1,215 @@
+"""
+JSON schemas for the structured generation steps.
+
+Each step that returns data rather than code declares the shape of its
+response here. ``LLMBackend.call_structured`` asks the model for output in
+that shape (the Anthropic backend forces a tool call whose input schema is
+the step schema), and the generator checks the result with ``validate``
+before using it. Only the subset of JSON Schema used below is supported:
+``type``, ``properties``, ``required``, ``items``, ``enum`` and
+``minItems``.
+"""
+import json
+
+VALUE_TYPES = ['str', 'int', 'float', 'bool', 'json', 'date', 'datetime']
+
+_PAGE = {
+    'type': 'object',
+    'properties': {
+        'name': {'type': 'string', 'description': 'Clear, concise page name'},
+        'slug': {'type': 'string', 'description': 'URL-friendly slug'},
+        'description': {'type': 'string', 'description': "Brief description of the page's purpose"},
+    },
+    'required': ['name', 'slug', 'description'],
+}
+
+_QUERY = {
+    'type': 'object',
+    'properties': {
+        'key': {'type': 'string', 'description': 'Template variable the query populates'},
+        'query': {'type': 'string', 'description': 'Python code that fetches the value'},
+        'description': {'type': 'string', 'description': 'What the variable provides'},
+    },
+    'required': ['key', 'query'],
+}
+
+_COLUMN = {
+    'type': 'object',
+    'properties': {
+        'table_name': {'type': 'string'},
+        'key': {'type': 'string', 'description': 'Column name'},
+        'value_type': {'type': 'string', 'enum': VALUE_TYPES},
+    },
+    'required': ['table_name', 'key'],
+}
+
+_TABLE = {
+    'type': 'object',
+    'properties': {
+        'table_name': {'type': 'string'},
+        'columns': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'key': {'type': 'string', 'description': 'Column name'},
+                    'value_type': {'type': 'string', 'enum': VALUE_TYPES},
+                    'description': {'type': 'string', 'description': 'What the column represents'},
+                },
+                'required': ['key', 'value_type'],
+            },
+        },
+    },
+    'required': ['table_name', 'columns'],
+}
+
+_NAME = {'type': 'string', 'description': 'Concise app name, at most 3-4 words'}
+_DESCRIPTION = {'type': 'string', 'description': 'App description in 1-2 sentences'}
+
+STEP_SCHEMAS = {
+    'app_skeleton': {
+        'description': 'Record the name, description, data tables and pages of the app.',
+        'type': 'object',
+        'properties': {
+            'name': _NAME,
+            'description': _DESCRIPTION,
+            'tables': {'type': 'array', 'items': _TABLE},
+            'pages': {'type': 'array', 'items': _PAGE, 'minItems': 1},
+        },
+        'required': ['name', 'description', 'tables', 'pages'],
+    },
+    'name_description': {
+        'description': 'Record the name and description of the app.',
+        'type': 'object',
+        'properties': {
+            'name': _NAME,
+            'description': _DESCRIPTION,
+        },
+        'required': ['name', 'description'],
+    },
+    'data_tables': {
+        'description': 'Record the data tables the app needs.',
+        'type': 'object',
+        'properties': {
+            'tables': {'type': 'array', 'items': _TABLE},
+        },
+        'required': ['tables'],
+    },
+    'page_list': {
+        'description': 'Record the pages the app needs.',
+        'type': 'object',
+        'properties': {
+            'pages': {'type': 'array', 'items': _PAGE, 'minItems': 1},
+        },
+        'required': ['pages'],
+    },
+    'page_queries': {
+        'description': 'Record the context queries that populate the page template.',
+        'type': 'object',
+        'properties': {
+            'queries': {'type': 'array', 'items': _QUERY},
+        },
+        'required': ['queries'],
+    },
+    'page_update': {
+        'description': 'Record the updated page.',
+        'type': 'object',
+        'properties': {
+            'template': {'type': 'string', 'description': 'Updated Django template content'},
+            'js': {'type': 'string', 'description': 'Updated JavaScript content in Stimulus format'},
+            'contexts': {'type': 'array', 'items': _QUERY},
+        },
+        'required': ['template', 'js', 'contexts'],
+    },
+    'update_plan': {
+        'description': 'Record which parts of the app the update touches.',
+        'type': 'object',
+        'properties': {
+            'name': {'type': ['string', 'null'], 'description': 'Updated app name, or null if unchanged'},
+            'description': {'type': ['string', 'null'], 'description': 'Updated description, or null if unchanged'},
+            'tables': {
+                'type': 'object',
+                'properties': {
+                    'add': {'type': 'array', 'items': _COLUMN},
+                    'remove': {'type': 'array', 'items': _COLUMN},
+                },
+            },
+            'pages': {
+                'type': 'object',
+                'properties': {
+                    'update': {'type': 'array', 'items': {'type': 'string'}},
+                    'queries': {'type': 'array', 'items': {'type': 'string'}},
+                    'create': {'type': 'array', 'items': _PAGE},
+                    'remove': {'type': 'array', 'items': {'type': 'string'}},
+                },
+            },
+        },
+        'required': ['pages'],
+    },
+}
+
+
+class SchemaValidationError(ValueError):
+    """Raised when a step's output still does not match its schema after repair."""
+
+    def __init__(self, step: str, errors: list):
+        self.step = step
+        self.errors = errors
+        super().__init__(f"Output of step '{step}' does not match its schema: {'; '.join(errors)}")
+
+
+_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool,
+    'null': type(None),
+}
+
+
+def _is_type(value, type_name: str) -> bool:
+    # bool is an int subclass but never a valid number here
+    if isinstance(value, bool) and type_name in ('number', 'integer'):
+        return False
+    return isinstance(value, _TYPES[type_name])
+
+
+def validate(value, schema: dict, path: str = '$') -> list[str]:
+    """Return a list of messages describing where ``value`` does not match ``schema``."""
+    types = schema.get('type')
+    if types:
+        types = [types] if isinstance(types, str) else types
+        if not any(_is_type(value, type_name) for type_name in types):
+            return [f"{path} should be {' or '.join(types)}, not {json.dumps(value)[:40]}"]
+
+    errors = []
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f"{path} should be one of {', '.join(schema['enum'])}")
+    if isinstance(value, dict):
+        for key in schema.get('required', []):
+            if key not in value:
+                errors.append(f"{path}.{key} is missing")
+        for key, subschema in schema.get('properties', {}).items():
+            if key in value:
+                errors.extend(validate(value[key], subschema, f"{path}.{key}"))
+    if isinstance(value, list):
+        if len(value) < schema.get('minItems', 0):
+            errors.append(f"{path} needs at least {schema['minItems']} item(s)")
+        if 'items' in schema:
+            for index, item in enumerate(value):
+                errors.extend(validate(item, schema['items'], f"{path}[{index}]"))
+    return errors
+
+
+def repair_prompt(schema: dict, output: str, errors: list) -> str:
+    """A prompt asking the model to fix only the listed problems in its earlier output."""
+    problems = '\n'.join(f"- {error}" for error in errors)
+    return (
+        "Your previous output did not match the required JSON schema.\n\n"
+        f"Schema:\n{json.dumps(schema, indent=2)}\n\n"
+        f"Previous output:\n{output}\n\n"
+        f"Problems:\n{problems}\n\n"
+        "Return the corrected output. Fix only these problems and keep everything else unchanged."
+    )
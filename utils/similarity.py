@@ -0,0 +1,160 @@
+"""
+Near-duplicate prompt detection.
+
+Many prompts are close variants of earlier ones ("todo app", "a simple todo
+app"). Every completed prompt gets a ``PromptSignature``: the MinHash of
+the set of its normalized words, with filler words dropped and plurals
+folded. The share of positions two signatures agree on estimates the
+Jaccard similarity of their word sets. Each signature is also stored as
+``BANDS`` band hashes (locality-sensitive hashing). A lookup then reads
+only the prompts that share at least one band with the new prompt, through
+an index, and compares just those signatures.
+
+``find_similar`` searches the organization's own completed apps and, if
+``PROMPT_MATCHING['gallery_organization']`` is set, those of the shared
+gallery organization. Signatures are written when a prompt is saved as
+completed; ``index_prompts`` backfills older prompts.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from anything_apps.models import App, Prompt, PromptSignature, PromptSignatureBand
+import hashlib
+import random
+import re
+import zlib
+
+NUM_HASHES = 64
+BANDS = 32
+ROWS_PER_BAND = NUM_HASHES // BANDS
+_PRIME = (1 << 61) - 1
+# Fixed seed: signatures are stored, so the hash functions must never change
+_rng = random.Random(20241018)
+_COEFFICIENTS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'app', 'application', 'for', 'i', 'in', 'is', 'it', 'me', 'my',
+    'of', 'on', 'or', 'that', 'the', 'to', 'want', 'with',
+}
+
+
+def _config() -> dict:
+    return getattr(settings, 'PROMPT_MATCHING', {})
+
+
+def shingles(content: str) -> set:
+    """Normalized words of a prompt: lowercased, without punctuation, filler words or plural ``s``."""
+    words = re.findall(r'[a-z0-9]+', content.lower())
+    return {
+        word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+        for word in words
+        if word not in STOP_WORDS
+    }
+
+
+def minhash(content: str) -> list:
+    """MinHash signature of a prompt, or an empty list if nothing is left after normalizing."""
+    hashed = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(content)]
+    if not hashed:
+        return []
+    return [min((a * value + b) % _PRIME for value in hashed) for a, b in _COEFFICIENTS]
+
+
+def band_keys(signature: list) -> list:
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        keys.append(f"{band}:{hashlib.blake2b(repr(rows).encode('utf-8'), digest_size=8).hexdigest()}")
+    return keys
+
+
+def similarity(first: list, second: list) -> float:
+    """Estimated Jaccard similarity of the prompts behind two signatures."""
+    if not first or len(first) != len(second):
+        return 0.0
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def _signatures(prompts) -> list:
+    return [
+        (PromptSignature(prompt_id=prompt.id, organization_id=prompt.organization_id, signature=signature), signature)
+        for prompt in prompts
+        if (signature := minhash(prompt.content))
+    ]
+
+
+def _store(signatures: list):
+    with transaction.atomic():
+        PromptSignature.objects.bulk_create([row for row, _ in signatures], ignore_conflicts=True)
+        PromptSignatureBand.objects.filter(signature_id__in=[row.prompt_id for row, _ in signatures]).delete()
+        PromptSignatureBand.objects.bulk_create([
+            PromptSignatureBand(signature_id=row.prompt_id, band=key)
+            for row, signature in signatures
+            for key in band_keys(signature)
+        ])
+
+
+def index_prompt(prompt: Prompt):
+    """Store the signature of a completed prompt; does nothing if it is already indexed."""
+    if not PromptSignature.objects.filter(prompt_id=prompt.id).exists():
+        _store(_signatures([prompt]))
+
+
+def index_prompts(batch_size: int = 1000, progress=None) -> int:
+    """Index every completed prompt that has no signature yet; returns how many were indexed."""
+    indexed = 0
+    last_id = 0
+    while True:
+        prompts = list(
+            Prompt.objects.filter(id__gt=last_id, status='COMPLETED', signature__isnull=True)
+            .order_by('id').only('id', 'organization_id', 'content')[:batch_size]
+        )
+        if not prompts:
+            return indexed
+        _store(_signatures(prompts))
+        indexed += len(prompts)
+        last_id = prompts[-1].id
+        if progress:
+            progress(indexed)
+
+
+def find_similar(organization, content: str, limit: int = 3, threshold: float = None) -> list:
+    """
+    Active apps generated from prompts similar to ``content``, as
+    ``(app, similarity)`` pairs, most similar first. Only apps of
+    ``organization`` and the gallery organization are considered.
+    """
+    signature = minhash(content)
+    if not signature:
+        return []
+    threshold = _config().get('threshold', 0.5) if threshold is None else threshold
+    organization_ids = {organization.id}
+    if _config().get('gallery_organization'):
+        organization_ids.add(_config()['gallery_organization'])
+
+    candidates = PromptSignature.objects.filter(
+        organization_id__in=organization_ids,
+        bands__band__in=band_keys(signature)
+    ).distinct().values_list('prompt_id', 'signature')
+    scores = {
+        prompt_id: score
+        for prompt_id, candidate in candidates
+        if (score := similarity(signature, candidate)) >= threshold
+    }
+    if not scores:
+        return []
+
+    # One app per prompt; the most recent if a prompt produced several
+    apps = {}
+    for app in App.objects.filter(initial_prompt_id__in=scores, status='ACTIVE').order_by('created_at'):
+        apps[app.initial_prompt_id] = app
+    matches = sorted(((app, scores[prompt_id]) for prompt_id, app in apps.items()), key=lambda match: -match[1])
+    return matches[:limit]
+
+
+@receiver(post_save, sender=Prompt)
+def prompt_completed(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if instance.status == 'COMPLETED' and (update_fields is None or 'status' in update_fields):
+        index_prompt(instance)
@@ -1,13 +1,19 @@
 from django.contrib.auth import get_user_model
 from anything_org.models import Organization
-from anything_apps.models import Prompt, PromptUpdate, App
+from anything_apps.models import Prompt, PromptUpdate, App, AppPage
 from .app_generator import AppGenerator
 from users.models import UserProfile
+from . import rollups
 import logging
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+def prompt_token_cost(content: str) -> int:
+    """Tokens charged for generating or updating an app from ``content``."""
+    token_cost = len(content.split()) // 4  # Simple example: 1 token per 4 words
+    return max(10, min(token_cost, 100))  # Ensure cost is between 10 and 100 tokens
+
 def generate_app_async(organization_id: int, prompt_id: int, user_id: int):
     """
     Async task to generate app template context based on the prompt.
@@ -36,9 +42,8 @@ def generate_app_async(organization_id: int, prompt_id: int, user_id: int):
         # Get or create user profile and check token balance
         profile = UserProfile.get_or_create_profile(user)
         
-        # Calculate token cost based on prompt length (example calculation)
-        token_cost = len(prompt.content.split()) // 4  # Simple example: 1 token per 4 words
-        token_cost = max(10, min(token_cost, 100))  # Ensure cost is between 10 and 100 tokens
+        # Calculate token cost based on prompt length
+        token_cost = prompt_token_cost(prompt.content)
         
         if not profile.has_sufficient_tokens(token_cost):
             prompt.status = 'FAILED'
@@ -65,6 +70,7 @@ def generate_app_async(organization_id: int, prompt_id: int, user_id: int):
         prompt.tokens_used = token_cost
         prompt.status = 'COMPLETED'
         prompt.save()
+        rollups.record_tokens_used(user.id, token_cost)
 
         return {
             'success': True,
@@ -126,9 +132,8 @@ def update_app_async(app_id: int, prompt_update_id: int, user_id: int):
         # Get or create user profile and check token balance
         profile = UserProfile.get_or_create_profile(user)
         
-        # Calculate token cost based on prompt length (example calculation)
-        token_cost = len(prompt_update.update_content.split()) // 4  # Simple example: 1 token per 4 words
-        token_cost = max(10, min(token_cost, 100))  # Ensure cost is between 10 and 100 tokens
+        # Calculate token cost based on prompt length
+        token_cost = prompt_token_cost(prompt_update.update_content)
         
         if not profile.has_sufficient_tokens(token_cost):
             prompt_update.status = 'FAILED'
@@ -159,6 +164,7 @@ def update_app_async(app_id: int, prompt_update_id: int, user_id: int):
         prompt_update.tokens_used = token_cost
         prompt_update.status = 'COMPLETED'
         prompt_update.save()
+        rollups.record_tokens_used(user.id, token_cost)
 
         # Update app status back to active
         app.status = 'ACTIVE'
@@ -197,4 +203,37 @@ def update_app_async(app_id: int, prompt_update_id: int, user_id: int):
         return {
             'error': str(e),
             'message': 'Failed to update app'
-        } 
\ No newline at end of file
+        } 
+
+
+def generate_page_async(page_id: int, user_id: int):
+    """
+    Async task to generate a page stubbed by lazy page generation.
+
+    Generation was already paid for with the app, so no tokens are charged.
+    Pages that are ready or being generated by another worker are skipped.
+    """
+    logger.info(f"Starting page generation for page {page_id}")
+    try:
+        page = AppPage.objects.select_related('app__organization', 'app__initial_prompt').get(id=page_id)
+        user = User.objects.get(id=user_id)
+    except AppPage.DoesNotExist:
+        logger.error(f"Page {page_id} not found")
+        return {'error': 'Page not found'}
+    except User.DoesNotExist:
+        logger.error(f"User {user_id} not found")
+        return {'error': 'User not found'}
+
+    try:
+        generator = AppGenerator(page.app.organization, page.app.initial_prompt)
+        generated = generator.generate_page(page)
+    except Exception as e:
+        logger.exception(f"Error generating page {page_id}: {str(e)}")
+        return {'error': str(e)}
+
+    if generated:
+        try:
+            page.warm(user)
+        except Exception as e:
+            logger.warning(f"Could not warm page {page_id}: {str(e)}")
+    return {'success': True, 'page_id': page_id, 'generated': generated}